@@ -107,6 +107,7 @@ class ApplicationManager:
             # if we are ready, don't load again
             return
         self.nlp.load()
+        self.question_answerer.load()
 
     async def _load_async(self):
         if self.nlp.ready:
@@ -114,6 +115,7 @@ class ApplicationManager:
             return
         # TODO: make an async nlp
         self.nlp.load()
+        self.question_answerer.load()
 
     def _pre_dm(self, processed_query, context, params, frame, history):
         # We pass in the previous turn's responder's params to the current request
@@ -138,6 +140,10 @@ class ApplicationManager:
                 'America/Los_Angeles', or 'Asia/Kolkata' \
                 See the [tz database](https://www.iana.org/time-zones) for more information.
             params.timestamp (long, optional): A unix time stamp for the request (in seconds).
+            params.stop_at (str, optional): The last stage of the natural language processing \
+                pipeline to run, one of 'domain', 'intent', 'entities' or 'full'
+            params.confidence_threshold (float, optional): The domain or intent confidence \
+                below which the deeper stages of the natural language processing are skipped
             frame (dict, optional): A dictionary specifying the frame of the conversation
             context (dict, optional): A dictionary of app-specific data
             history (list, optional): A list of previous and current responder objects \
@@ -35,6 +35,8 @@ import requests
 from tqdm import tqdm
 from . import markup, path
 from .components import Conversation, QuestionAnswerer
+from .components._elasticsearch_helpers import (DEFAULT_BULK_THREAD_COUNT, DEFAULT_BULK_CHUNK_SIZE,
+                                                DEFAULT_BULK_MAX_CHUNK_BYTES)
 from .exceptions import (KnowledgeBaseConnectionError, KnowledgeBaseError, MindMeldError)
 from .path import QUERY_CACHE_PATH, QUERY_CACHE_TMP_PATH, MODEL_CACHE_PATH
 from ._version import current as __version__
@@ -176,7 +178,9 @@ def build(ctx, incremental):
 @click.pass_context
 @click.option('-v', '--verbose', is_flag=True,
               help='Print the full metrics instead of just accuracy.')
-def evaluate(ctx, verbose):
+@click.option('--compare-full-retrain', is_flag=True, default=False,
+              help='Compare warm started classifiers with classifiers trained from scratch.')
+def evaluate(ctx, verbose, compare_full_retrain):
     """Evaluates the app with default config."""
     try:
         app = ctx.obj.get('app')
@@ -194,7 +198,7 @@ def evaluate(ctx, verbose):
             logger.error("You must build the app before running evaluate. "
                          "Try 'python app.py build'.")
             ctx.exit(1)
-        nlp.evaluate(verbose)
+        nlp.evaluate(verbose, compare_full_retrain=compare_full_retrain)
     except MindMeldError as ex:
         logger.error(ex.message)
         ctx.exit(1)
@@ -325,14 +329,23 @@ def shared_cli():
 @shared_cli.command('load-kb', context_settings=CONTEXT_SETTINGS)
 @click.pass_context
 @click.option('-n', '--es-host', required=False)
+@click.option('--thread-count', type=int, default=DEFAULT_BULK_THREAD_COUNT,
+              help='Number of threads sending bulk requests')
+@click.option('--chunk-size', type=int, default=DEFAULT_BULK_CHUNK_SIZE,
+              help='Maximum number of documents in a bulk request')
+@click.option('--max-chunk-bytes', type=int, default=DEFAULT_BULK_MAX_CHUNK_BYTES,
+              help='Maximum size of a bulk request in bytes')
 @click.argument('app_namespace', required=True)
 @click.argument('index_name', required=True)
 @click.argument('data_file', required=True)
-def load_index(ctx, es_host, app_namespace, index_name, data_file):
+def load_index(ctx, es_host, thread_count, chunk_size, max_chunk_bytes, app_namespace,
+               index_name, data_file):
     """Loads data into a question answerer index."""
 
     try:
-        QuestionAnswerer.load_kb(app_namespace, index_name, data_file, es_host)
+        QuestionAnswerer.load_kb(app_namespace, index_name, data_file, es_host,
+                                 thread_count=thread_count, chunk_size=chunk_size,
+                                 max_chunk_bytes=max_chunk_bytes)
     except (KnowledgeBaseConnectionError, KnowledgeBaseError) as ex:
         logger.error(ex.message)
         ctx.exit(1)
@@ -12,12 +12,17 @@
 # limitations under the License.
 
 """This module contains helper methods for consuming Elasticsearch."""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import functools
 import os
 import logging
+import threading
 
 from elasticsearch5 import (Elasticsearch, ImproperlyConfigured, ElasticsearchException,
                             ConnectionError as EsConnectionError, TransportError)
-from elasticsearch5.helpers import streaming_bulk
+from elasticsearch5.helpers import parallel_bulk
 from tqdm import tqdm
 
 from ._config import DEFAULT_ES_INDEX_TEMPLATE, DEFAULT_ES_INDEX_TEMPLATE_NAME
@@ -29,26 +34,89 @@ logger = logging.getLogger(__name__)
 INDEX_TYPE_SYNONYM = 'syn'
 INDEX_TYPE_KB = 'kb'
 
+# default settings for bulk loading documents into an index
+DEFAULT_BULK_THREAD_COUNT = 4
+DEFAULT_BULK_CHUNK_SIZE = 500
+DEFAULT_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# the number of connections kept open to each Elasticsearch node, which is also the number of
+# requests coroutines can have in flight at once
+DEFAULT_ES_CONNECTION_POOL_SIZE = 25
+# the default timeout of Elasticsearch requests in seconds
+DEFAULT_ES_TIMEOUT = 10
+# the host the Elasticsearch client connects to if none is specified
+DEFAULT_ES_HOST = 'localhost:9200'
+# the interval in seconds at which the nodes of the cluster are sniffed, if sniffing is enabled
+ES_SNIFFER_INTERVAL = 60
+
+# the shared clients of the current process, keyed by host, credentials and settings
+_es_clients = {}
+_es_clients_pid = None
+_es_clients_lock = threading.Lock()
+
+_async_executor = None
+_async_executor_pid = None
+_async_executor_lock = threading.Lock()
+
 
 def get_scoped_index_name(app_namespace, index_name):
     return '{}${}'.format(app_namespace, index_name)
 
 
-def create_es_client(es_host=None, es_user=None, es_pass=None):
-    """Creates a new Elasticsearch client
+def get_es_host(es_host=None):
+    """Returns the Elasticsearch host a client for the given host connects to, taking the
+    ``MM_ES_HOST`` environment variable and the default host into account.
+
+    Args:
+        es_host (str): The Elasticsearch host server
+
+    Returns:
+        str: The resolved host
+    """
+    return es_host or os.environ.get('MM_ES_HOST') or DEFAULT_ES_HOST
+
+
+def _get_es_settings(es_host, es_user, es_pass, pool_size, sniff, timeout):
+    """Fills in the unspecified client settings from the environment and the defaults."""
+    if pool_size is None:
+        pool_size = int(os.environ.get('MM_ES_POOL_SIZE', DEFAULT_ES_CONNECTION_POOL_SIZE))
+    if sniff is None:
+        sniff = os.environ.get('MM_ES_SNIFF', '').lower() in ('1', 'true', 'yes')
+    if timeout is None:
+        timeout = float(os.environ.get('MM_ES_TIMEOUT', DEFAULT_ES_TIMEOUT))
+    return (es_host or os.environ.get('MM_ES_HOST'), es_user or os.environ.get('MM_ES_USERNAME'),
+            es_pass or os.environ.get('MM_ES_PASSWORD'), pool_size, sniff, timeout)
+
+
+def create_es_client(es_host=None, es_user=None, es_pass=None, pool_size=None, sniff=None,
+                     timeout=None):
+    """Creates a new Elasticsearch client. Components should use the shared clients returned
+    by :func:`get_es_client` instead.
+
+    Unspecified settings are read from the ``MM_ES_HOST``, ``MM_ES_USERNAME``,
+    ``MM_ES_PASSWORD``, ``MM_ES_POOL_SIZE``, ``MM_ES_SNIFF`` and ``MM_ES_TIMEOUT`` environment
+    variables.
 
     Args:
         es_host (str): The Elasticsearch host server
         es_user (str): The Elasticsearch username for http auth
         es_pass (str): The Elasticsearch password for http auth
+        pool_size (int): The maximum number of connections kept open to each node
+        sniff (bool): Whether to discover the other nodes of the cluster on startup and when a
+            connection fails
+        timeout (float): The default timeout of requests in seconds
     """
-    es_host = es_host or os.environ.get('MM_ES_HOST')
-    es_user = es_user or os.environ.get('MM_ES_USERNAME')
-    es_pass = es_pass or os.environ.get('MM_ES_PASSWORD')
+    es_host, es_user, es_pass, pool_size, sniff, timeout = _get_es_settings(
+        es_host, es_user, es_pass, pool_size, sniff, timeout)
 
     try:
         http_auth = (es_user, es_pass) if es_user and es_pass else None
-        es_client = Elasticsearch(es_host, http_auth=http_auth)
+        sniff_settings = {}
+        if sniff:
+            sniff_settings = {'sniff_on_start': True, 'sniff_on_connection_fail': True,
+                              'sniffer_timeout': ES_SNIFFER_INTERVAL}
+        es_client = Elasticsearch(es_host, http_auth=http_auth, maxsize=pool_size,
+                                  timeout=timeout, **sniff_settings)
         return es_client
     except ElasticsearchException:
         raise KnowledgeBaseError
@@ -56,16 +124,110 @@ def create_es_client(es_host=None, es_user=None, es_pass=None):
         raise KnowledgeBaseError
 
 
+def get_es_client(es_host=None, es_user=None, es_pass=None, pool_size=None, sniff=None,
+                  timeout=None):
+    """Returns the Elasticsearch client of the current process for the given host, credentials
+    and settings, creating it on first use. All components which connect to the same cluster
+    share the client and its connection pool. Forked processes create their own clients.
+
+    Args:
+        es_host (str): The Elasticsearch host server
+        es_user (str): The Elasticsearch username for http auth
+        es_pass (str): The Elasticsearch password for http auth
+        pool_size (int): The maximum number of connections kept open to each node
+        sniff (bool): Whether to discover the other nodes of the cluster on startup and when a
+            connection fails
+        timeout (float): The default timeout of requests in seconds
+
+    Returns:
+        Elasticsearch: The shared client
+    """
+    global _es_clients_pid  # pylint: disable=global-statement
+    settings = _get_es_settings(es_host, es_user, es_pass, pool_size, sniff, timeout)
+    key = tuple(tuple(value) if isinstance(value, list) else value for value in settings)
+    with _es_clients_lock:
+        if _es_clients_pid != os.getpid():
+            _es_clients.clear()
+            _es_clients_pid = os.getpid()
+        if key not in _es_clients:
+            _es_clients[key] = create_es_client(*settings)
+        return _es_clients[key]
+
+
+def _get_async_executor():
+    """Returns the thread pool which sends Elasticsearch requests on behalf of coroutines. It has
+    one thread per connection of the default connection pool size, which can be raised with the
+    ``MM_ES_POOL_SIZE`` environment variable. A new pool is created in forked processes, as the
+    threads of the parent are not copied.
+    """
+    global _async_executor, _async_executor_pid  # pylint: disable=global-statement
+    with _async_executor_lock:
+        if _async_executor is None or _async_executor_pid != os.getpid():
+            pool_size = _get_es_settings(None, None, None, None, None, None)[3]
+            _async_executor = ThreadPoolExecutor(max_workers=pool_size)
+            _async_executor_pid = os.getpid()
+        return _async_executor
+
+
+async def run_es_request_async(func, *args, **kwargs):
+    """Runs a blocking function which sends requests to Elasticsearch without blocking the event
+    loop. The function runs in a shared thread pool, so concurrent coroutines overlap their
+    requests over the connection pool of the Elasticsearch client.
+
+    Args:
+        func (callable): The function to run
+        *args: The positional arguments of the function
+        **kwargs: The keyword arguments of the function
+
+    Returns:
+        The return value of the function
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_get_async_executor(), functools.partial(func, *args,
+                                                                               **kwargs))
+
+
 def does_index_exist(app_namespace, index_name, es_host=None, es_client=None, connect_timeout=2):
     """Return boolean flag to indicate whether the specified index exists."""
 
-    es_client = es_client or create_es_client(es_host)
+    es_client = es_client or get_es_client(es_host)
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
 
     try:
-        # Confirm ES connection with a shorter timeout
-        es_client.cluster.health(request_timeout=connect_timeout)
-        return es_client.indices.exists(index=scoped_index_name)
+        # the short timeout also confirms the connection to Elasticsearch
+        return es_client.indices.exists(index=scoped_index_name, request_timeout=connect_timeout)
+    except EsConnectionError as e:
+        logger.debug('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
+        raise KnowledgeBaseConnectionError(es_host=es_client.transport.hosts)
+    except TransportError as e:
+        logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
+                     'Status code: %s details: %s', e.error, e.status_code, e.info)
+        raise KnowledgeBaseError
+    except ElasticsearchException:
+        raise KnowledgeBaseError
+
+
+def get_index_names(app_namespace, es_host=None, es_client=None, connect_timeout=2):
+    """Returns the names of all indexes of an app with a single request, so that the existence of
+    many indexes can be checked at once.
+
+    Args:
+        app_namespace (str): The namespace of the app
+        es_host (str): The Elasticsearch host server
+        es_client: The Elasticsearch client
+        connect_timeout (int, optional): The amount of time for a connection to the
+            Elasticsearch host
+
+    Returns:
+        (set): The scoped names of the indexes
+    """
+    es_client = es_client or get_es_client(es_host)
+
+    try:
+        indices = es_client.cat.indices(index=get_scoped_index_name(app_namespace, '*'),
+                                        h='index', format='json',
+                                        request_timeout=connect_timeout)
+        return {index['index'] for index in indices}
     except EsConnectionError as e:
         logger.debug('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
         raise KnowledgeBaseConnectionError(es_host=es_client.transport.hosts)
@@ -80,7 +242,7 @@ def does_index_exist(app_namespace, index_name, es_host=None, es_client=None, co
 def get_field_names(app_namespace, index_name, es_host=None, es_client=None, connect_timeout=2):
     """Return a list of field names available in the specified index."""
 
-    es_client = es_client or create_es_client(es_host)
+    es_client = es_client or get_es_client(es_host)
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
 
     try:
@@ -114,7 +276,7 @@ def create_index(app_namespace, index_name, mapping, es_host=None, es_client=Non
         connect_timeout (int, optional): The amount of time for a connection to the
             Elasticsearch host
     """
-    es_client = es_client or create_es_client(es_host)
+    es_client = es_client or get_es_client(es_host)
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
 
     try:
@@ -151,7 +313,7 @@ def delete_index(app_namespace, index_name, es_host=None, es_client=None, connec
         connect_timeout (int, optional): The amount of time for a connection to the
             Elasticsearch host
     """
-    es_client = es_client or create_es_client(es_host)
+    es_client = es_client or get_es_client(es_host)
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
 
     try:
@@ -172,8 +334,33 @@ def delete_index(app_namespace, index_name, es_host=None, es_client=None, connec
         raise KnowledgeBaseError
 
 
+@contextmanager
+def _disable_refresh(es_client, scoped_index_name):
+    """Disables the periodic refresh of an index while documents are loaded into it. The previous
+    refresh interval is restored and the index is refreshed afterwards.
+
+    Args:
+        es_client (Elasticsearch): The Elasticsearch client
+        scoped_index_name (str): The scoped name of the index
+    """
+    settings = es_client.indices.get_settings(index=scoped_index_name,
+                                              name='index.refresh_interval')
+    refresh_interval = settings.get(scoped_index_name, {}).get('settings', {}).get(
+        'index', {}).get('refresh_interval')
+    es_client.indices.put_settings(index=scoped_index_name,
+                                   body={'index': {'refresh_interval': '-1'}})
+    try:
+        yield
+    finally:
+        # a null value restores the default refresh interval
+        es_client.indices.put_settings(index=scoped_index_name,
+                                       body={'index': {'refresh_interval': refresh_interval}})
+        es_client.indices.refresh(index=scoped_index_name)
+
+
 def load_index(app_namespace, index_name, docs, docs_count, mapping, doc_type, es_host=None,
-               es_client=None, connect_timeout=2):
+               es_client=None, connect_timeout=2, thread_count=DEFAULT_BULK_THREAD_COUNT,
+               chunk_size=DEFAULT_BULK_CHUNK_SIZE, max_chunk_bytes=DEFAULT_BULK_MAX_CHUNK_BYTES):
     """Loads documents from data into the specified index. If an index with the specified name
     doesn't exist, a new index with that name will be created.
 
@@ -182,16 +369,20 @@ def load_index(app_namespace, index_name, docs, docs_count, mapping, doc_type, e
         index_name (str): The name of the new index to be created
         docs (iterable): An iterable which contains a collection of documents in the correct format
                          which should be imported into the index
-        docs_count (int): The number of documents in doc
+        docs_count (int): The number of documents in doc. If None, no progress bar is shown and
+            the caller is expected to report progress.
         mapping (str): The Elasticsearch index mapping to use
         doc_type (str): The document type
         es_host (str): The Elasticsearch host server
         es_client (Elasticsearch): The Elasticsearch client
         connect_timeout (int, optional): The amount of time for a connection to the
             Elasticsearch host
+        thread_count (int, optional): The number of threads sending bulk requests
+        chunk_size (int, optional): The maximum number of documents in a bulk request
+        max_chunk_bytes (int, optional): The maximum size of a bulk request in bytes
     """
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
-    es_client = es_client or create_es_client(es_host)
+    es_client = es_client or get_es_client(es_host)
     try:
         # create index if specified index does not exist
         if does_index_exist(app_namespace, index_name, es_host, es_client, connect_timeout):
@@ -203,21 +394,24 @@ def load_index(app_namespace, index_name, docs, docs_count, mapping, doc_type, e
 
         count = 0
         # create the progess bar with docs count
-        pbar = tqdm(total=docs_count)
-
-        for okay, result in streaming_bulk(es_client, docs,
-                                           index=scoped_index_name, doc_type=doc_type,
-                                           chunk_size=50, raise_on_error=False):
-
-            action, result = result.popitem()
-            doc_id = '/%s/%s/%s' % (index_name, doc_type, result['_id'])
-            # process the information from ES whether the document has been
-            # successfully indexed
-            if not okay:
-                logger.error('Failed to %s document %s: %r', action, doc_id, result)
-            else:
-                count += 1
-            pbar.update(1)
+        pbar = tqdm(total=docs_count, disable=docs_count is None)
+
+        with _disable_refresh(es_client, scoped_index_name):
+            for okay, result in parallel_bulk(es_client, docs,
+                                              index=scoped_index_name, doc_type=doc_type,
+                                              thread_count=thread_count, chunk_size=chunk_size,
+                                              max_chunk_bytes=max_chunk_bytes,
+                                              raise_on_error=False):
+
+                action, result = result.popitem()
+                doc_id = '/%s/%s/%s' % (index_name, doc_type, result['_id'])
+                # process the information from ES whether the document has been
+                # successfully indexed
+                if not okay:
+                    logger.error('Failed to %s document %s: %r', action, doc_id, result)
+                else:
+                    count += 1
+                pbar.update(1)
         # close the progress bar and flush all output
         pbar.close()
         logger.info('Loaded %s document%s', count, '' if count == 1 else 's')
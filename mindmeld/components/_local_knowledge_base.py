@@ -0,0 +1,601 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains an in-memory knowledge base, which keeps small knowledge base indexes in
+process memory and executes the searches of the question answerer without Elasticsearch.
+
+Documents are stored by field: number, date and location fields in NumPy columns, text fields in
+inverted indexes built with the analyzers of the Elasticsearch index template (see
+``_text_relevance_index.py``). Searches are executed by evaluating the subset of the Elasticsearch
+query DSL built by :class:`Search` (``function_score``, ``bool``, ``match``, ``term``, ``range``,
+``nested`` and ``linear`` decay functions, plus ``min`` and ``max`` aggregations), with the same
+BM25 similarity, so both backends return a similar ranking.
+"""
+from collections import OrderedDict
+import copy
+import datetime
+import fnmatch
+import logging
+import math
+import re
+import threading
+
+import numpy as np
+
+from ._text_relevance_index import (_FieldIndex, analyze_char_ngram, analyze_default,
+                                    analyze_keyword, analyze_raw, DEFAULT_SEARCH_SIZE)
+from ..exceptions import KnowledgeBaseError
+
+logger = logging.getLogger(__name__)
+
+SYN_FIELD_SUFFIX = '$whitelist'
+
+# the analyzers of the sub-fields of dynamically mapped text fields, keyed by sub-field name
+TEXT_ANALYZERS = {'': analyze_default, 'raw': analyze_raw, 'normalized_keyword': analyze_keyword,
+                  'char_ngram': analyze_char_ngram}
+KEYWORD_ANALYZERS = {'': lambda text: ([text], 1)}
+
+# fields which are mapped explicitly by the index template and the question answerer mapping
+STATIC_FIELD_TYPES = {'id': 'keyword', 'location': 'geo_point'}
+
+# the decay of the score at the distance 'scale' from the origin, as in Elasticsearch
+DEFAULT_DECAY = 0.5
+EARTH_MEAN_RADIUS = 6371008.7714
+
+DISTANCE_UNITS = OrderedDict([('nmi', 1852.0), ('km', 1000.0), ('mi', 1609.344),
+                              ('yd', 0.9144), ('ft', 0.3048), ('cm', 0.01), ('mm', 0.001),
+                              ('m', 1.0)])
+TIME_UNITS = OrderedDict([('ms', 1.0), ('s', 1000.0), ('m', 60000.0), ('h', 3600000.0),
+                          ('d', 86400000.0)])
+
+# the 'strict_date_optional_time' format used for date detection by Elasticsearch
+_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:T(\d{2})(?::(\d{2})(?::(\d{2})'
+                           r'(?:\.(\d{1,9}))?)?)?(Z|[+-]\d{2}(?::?\d{2})?)?)?$')
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _parse_date(value):
+    """Parses an ISO 8601 date into milliseconds since the epoch.
+
+    Returns:
+        (float): The timestamp, or None if the value is not a date
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _DATE_PATTERN.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    offset = datetime.timedelta()
+    if zone and zone != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        offset = sign * datetime.timedelta(hours=int(digits[:2]), minutes=int(digits[2:] or 0))
+    try:
+        date = datetime.datetime(int(year), int(month), int(day), int(hour or 0),
+                                 int(minute or 0), int(second or 0),
+                                 tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+    millis = (date - offset - _EPOCH).total_seconds() * 1000
+    return millis + (float('0.' + fraction) * 1000 if fraction else 0)
+
+
+def _parse_geo_point(value):
+    """Parses a geo point given as an object, a 'lat,lon' string or a [lon, lat] array.
+
+    Returns:
+        (tuple): The latitude and longitude, or None if the value is not a geo point
+    """
+    try:
+        if isinstance(value, dict):
+            return float(value['lat']), float(value['lon'])
+        if isinstance(value, str):
+            lat, lon = value.split(',')
+            return float(lat), float(lon)
+        if isinstance(value, (list, tuple)) and len(value) == 2:
+            return float(value[1]), float(value[0])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def _parse_amount(value, units):
+    """Parses an amount with an optional unit suffix, e.g. '5km' or '3600000ms'."""
+    if isinstance(value, str):
+        for unit, factor in units.items():
+            if value.endswith(unit):
+                return float(value[:-len(unit)]) * factor
+    return float(value)
+
+
+def _infer_field_type(field, value):
+    """Infers the type of a field from its first value, like the dynamic mapping of the
+    question answerer indexes.
+    """
+    if field in STATIC_FIELD_TYPES:
+        return STATIC_FIELD_TYPES[field]
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'long'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'date' if _parse_date(value) is not None else 'text'
+    if isinstance(value, dict) and field.endswith(SYN_FIELD_SUFFIX):
+        return 'nested'
+    # objects are mapped without a type
+    return None
+
+
+def _values(value):
+    """Returns the non-null values of a possibly multi-valued field."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [item for item in value if item is not None]
+    return [value]
+
+
+def _multi_value_analyzer(analyzer):
+    """Wraps an analyzer so that it analyzes all values of a multi-valued field."""
+    def _analyze(values):
+        tokens, length = [], 0
+        for value in values:
+            value_tokens, value_length = analyzer(str(value))
+            tokens.extend(value_tokens)
+            length += value_length
+        return tokens, length
+    return _analyze
+
+
+def _haversine_distance(lat, lon, origin):
+    """Computes the arc distances in meters between arrays of coordinates and an origin."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    origin_lat, origin_lon = math.radians(origin[0]), math.radians(origin[1])
+    hav = np.sin((lat - origin_lat) / 2) ** 2 + \
+        np.cos(lat) * math.cos(origin_lat) * np.sin((lon - origin_lon) / 2) ** 2
+    return 2 * EARTH_MEAN_RADIUS * np.arcsin(np.sqrt(np.minimum(hav, 1)))
+
+
+class _DocumentSet:
+    """The documents of an index, or the nested documents of a field, stored by field.
+
+    Args:
+        docs (list): The documents
+        prefix (str, optional): The path of the nested field, prepended to field names in queries
+    """
+
+    def __init__(self, docs, prefix=''):
+        self._prefix = prefix
+        self.size = len(docs)
+        self.field_types = OrderedDict()
+        field_values = OrderedDict()
+        for doc_id, doc in enumerate(docs):
+            for field, value in doc.items():
+                values = _values(value)
+                if not values:
+                    continue
+                if field not in self.field_types:
+                    self.field_types[field] = _infer_field_type(field, values[0])
+                    field_values[field] = [None] * len(docs)
+                field_values[field][doc_id] = values
+
+        self._text_values = {}
+        self._columns = {}
+        self._nested = {}
+        for field, field_type in self.field_types.items():
+            values = field_values[field]
+            if field_type in ('text', 'keyword'):
+                self._text_values[field] = values
+            elif field_type in ('long', 'float', 'boolean', 'date'):
+                parse = _parse_date if field_type == 'date' else float
+                self._columns[field] = np.array([self._first_value(doc_values, parse)
+                                                 for doc_values in values], dtype=np.float64)
+            elif field_type == 'geo_point':
+                points = [self._first_value(doc_values, _parse_geo_point) for doc_values in values]
+                self._columns[field] = np.array([point or (np.nan, np.nan) for point in points],
+                                                dtype=np.float64).reshape(-1, 2)
+            elif field_type == 'nested':
+                children, parents = [], []
+                for doc_id, doc_values in enumerate(values):
+                    children.extend(doc_values or [])
+                    parents.extend([doc_id] * len(doc_values or []))
+                self._nested[field] = (_DocumentSet(children, prefix + field + '.'),
+                                       np.array(parents, dtype=np.int64))
+
+        self._text_indexes = {}
+        self._range_indexes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _first_value(values, parse):
+        # multi-valued number, date and location fields are represented by their first value
+        for value in values or []:
+            try:
+                parsed = parse(value)
+            except (TypeError, ValueError):
+                parsed = None
+            if parsed is not None:
+                return parsed
+        return np.nan
+
+    def _resolve_field(self, field):
+        """Splits a field name in a query into the field and the sub-field."""
+        if self._prefix and field.startswith(self._prefix):
+            field = field[len(self._prefix):]
+        if field in self.field_types:
+            return field, ''
+        field, _, subfield = field.rpartition('.')
+        return field, subfield
+
+    def _get_text_index(self, field):
+        """Returns the inverted index of a text field or sub-field, building it on first use.
+
+        Returns:
+            (tuple): The index and the analyzer of the field, or None if the field is not indexed
+        """
+        base_field, subfield = self._resolve_field(field)
+        field_type = self.field_types.get(base_field)
+        analyzers = TEXT_ANALYZERS if field_type == 'text' else KEYWORD_ANALYZERS
+        if field_type not in ('text', 'keyword') or subfield not in analyzers:
+            return None
+
+        key = (base_field, subfield)
+        with self._lock:
+            if key not in self._text_indexes:
+                index = _FieldIndex(_multi_value_analyzer(analyzers[subfield]))
+                for doc_id, values in enumerate(self._text_values[base_field]):
+                    if values:
+                        index.add(doc_id, values)
+                index.freeze()
+                self._text_indexes[key] = index
+            return self._text_indexes[key], analyzers[subfield]
+
+    def _get_column(self, field):
+        base_field, subfield = self._resolve_field(field)
+        return None if subfield else self._columns.get(base_field)
+
+    def _get_range_index(self, field):
+        """Returns the range index of a number or date field, building it on first use. The index
+        holds the values of the field in sorted order and the id of the document of each value,
+        so that the documents within a range are found with a binary search for each bound.
+
+        Returns:
+            (tuple): The sorted values and their document ids, or None if the field is not indexed
+        """
+        column = self._get_column(field)
+        if column is None or column.ndim != 1:
+            return None
+
+        base_field, _ = self._resolve_field(field)
+        with self._lock:
+            if base_field not in self._range_indexes:
+                doc_ids = np.flatnonzero(~np.isnan(column))
+                doc_ids = doc_ids[np.argsort(column[doc_ids], kind='mergesort')]
+                self._range_indexes[base_field] = (column[doc_ids], doc_ids)
+            return self._range_indexes[base_field]
+
+    def evaluate(self, query):
+        """Evaluates a query against all documents.
+
+        Args:
+            query (dict): A query in the Elasticsearch query DSL
+
+        Returns:
+            (tuple): The scores of the documents and a mask of the matching documents
+        """
+        query_type, params = next(iter(query.items()))
+        method = getattr(self, '_evaluate_' + query_type, None)
+        if method is None:
+            raise ValueError('Unsupported knowledge base query {!r}'.format(query_type))
+        return method(params)
+
+    def _evaluate_match_all(self, params):
+        return np.full(self.size, float(params.get('boost', 1))), np.ones(self.size, dtype=bool)
+
+    def _evaluate_match(self, params):
+        field, spec = next(iter(params.items()))
+        text = spec['query'] if isinstance(spec, dict) else spec
+        scores = np.zeros(self.size)
+        text_index = self._get_text_index(field)
+        if text_index is not None:
+            index, analyzer = text_index
+            index.score_tokens(analyzer(str(text))[0], 1, scores)
+        return scores, scores > 0
+
+    def _evaluate_term(self, params):
+        field, value = next(iter(params.items()))
+        value = value['value'] if isinstance(value, dict) else value
+        scores = np.zeros(self.size)
+        text_index = self._get_text_index(field)
+        if text_index is not None:
+            text_index[0].score_tokens([str(value)], 1, scores)
+        return scores, scores > 0
+
+    def _evaluate_range(self, params):
+        field, bounds = next(iter(params.items()))
+        range_index = self._get_range_index(field)
+        mask = np.zeros(self.size, dtype=bool)
+        if range_index is None:
+            return mask.astype(np.float64), mask
+
+        values, doc_ids = range_index
+        base_field, _ = self._resolve_field(field)
+        parse = _parse_date if self.field_types[base_field] == 'date' else float
+        start, end = 0, len(values)
+        # lower bounds move the start of the range, upper bounds its end
+        for operator, side, is_lower in (('gt', 'right', True), ('gte', 'left', True),
+                                         ('lt', 'left', False), ('lte', 'right', False)):
+            if bounds.get(operator) is not None:
+                bound = parse(bounds[operator])
+                if bound is None:
+                    raise ValueError('Invalid range value {!r}'.format(bounds[operator]))
+                position = int(np.searchsorted(values, bound, side=side))
+                start, end = (max(start, position), end) if is_lower else \
+                    (start, min(end, position))
+        if start < end:
+            mask[doc_ids[start:end]] = True
+        return mask.astype(np.float64), mask
+
+    def _evaluate_bool(self, params):
+        scores = np.zeros(self.size)
+        mask = np.ones(self.size, dtype=bool)
+        for clause in self._clause_list(params.get('must')):
+            clause_scores, clause_mask = self.evaluate(clause)
+            scores += clause_scores
+            mask &= clause_mask
+        for clause in self._clause_list(params.get('filter')):
+            mask &= self.evaluate(clause)[1]
+        for clause in self._clause_list(params.get('must_not')):
+            mask &= ~self.evaluate(clause)[1]
+
+        should = self._clause_list(params.get('should'))
+        if should:
+            should_mask = np.zeros(self.size, dtype=bool)
+            for clause in should:
+                clause_scores, clause_mask = self.evaluate(clause)
+                scores += clause_scores
+                should_mask |= clause_mask
+            # should clauses are optional when there are other required clauses
+            if not params.get('must') and not params.get('filter'):
+                mask &= should_mask
+        return np.where(mask, scores, 0), mask
+
+    def _evaluate_nested(self, params):
+        field, _ = self._resolve_field(params['path'])
+        scores = np.zeros(self.size)
+        mask = np.zeros(self.size, dtype=bool)
+        if field not in self._nested:
+            return scores, mask
+
+        children, parents = self._nested[field]
+        child_scores, child_mask = children.evaluate(params['query'])
+        matched_parents = parents[child_mask]
+        child_scores = child_scores[child_mask]
+        mask[matched_parents] = True
+
+        score_mode = params.get('score_mode', 'avg')
+        if score_mode == 'max':
+            np.maximum.at(scores, matched_parents, child_scores)
+        elif score_mode == 'min':
+            scores[mask] = np.inf
+            np.minimum.at(scores, matched_parents, child_scores)
+        elif score_mode in ('sum', 'avg'):
+            np.add.at(scores, matched_parents, child_scores)
+            if score_mode == 'avg':
+                counts = np.bincount(matched_parents, minlength=self.size)
+                scores[mask] /= counts[mask]
+        else:
+            # score_mode 'none'
+            scores[mask] = 0
+        return scores, mask
+
+    def _evaluate_function_score(self, params):
+        scores, mask = self.evaluate(params.get('query', {'match_all': {}}))
+        if params.get('score_mode', 'sum') != 'sum':
+            raise ValueError('Unsupported function score mode {!r}'.format(params['score_mode']))
+
+        factors = np.zeros(self.size)
+        matched_functions = np.zeros(self.size, dtype=bool)
+        for function in params.get('functions', []):
+            function_mask = self.evaluate(function['filter'])[1] if 'filter' in function else \
+                np.ones(self.size, dtype=bool)
+            factors += np.where(function_mask, self._function_factors(function), 0)
+            matched_functions |= function_mask
+        # documents which match none of the functions keep the query score
+        factors[~matched_functions] = 1
+
+        boost_mode = params.get('boost_mode', 'multiply')
+        if boost_mode == 'sum':
+            scores = scores + factors
+        elif boost_mode == 'multiply':
+            scores = scores * factors
+        elif boost_mode == 'replace':
+            scores = factors
+        else:
+            raise ValueError('Unsupported function score boost mode {!r}'.format(boost_mode))
+        return np.where(mask, scores, 0), mask
+
+    def _function_factors(self, function):
+        """Computes the factors of a score function for all documents."""
+        weight = float(function.get('weight', 1))
+        if 'linear' not in function:
+            if any(key not in ('filter', 'weight') for key in function):
+                raise ValueError('Unsupported score function {!r}'.format(function))
+            return np.full(self.size, weight)
+
+        field, params = next(iter(function['linear'].items()))
+        column = self._get_column(field)
+        if column is None:
+            return np.full(self.size, weight)
+        base_field, _ = self._resolve_field(field)
+        field_type = self.field_types[base_field]
+        if field_type == 'geo_point':
+            origin = _parse_geo_point(params['origin'])
+            distances = _haversine_distance(column[:, 0], column[:, 1], origin)
+            scale = _parse_amount(params['scale'], DISTANCE_UNITS)
+            offset = _parse_amount(params.get('offset', 0), DISTANCE_UNITS)
+        else:
+            parse = _parse_date if field_type == 'date' else float
+            distances = np.abs(column - parse(params['origin']))
+            scale = _parse_amount(params['scale'], TIME_UNITS)
+            offset = _parse_amount(params.get('offset', 0), TIME_UNITS)
+
+        decay_scale = scale / (1 - float(params.get('decay', DEFAULT_DECAY)))
+        decays = np.maximum(0, (decay_scale - np.maximum(0, distances - offset)) / decay_scale)
+        # documents without a value are not penalized
+        return weight * np.where(np.isnan(decays), 1, decays)
+
+    @staticmethod
+    def _clause_list(clauses):
+        if clauses is None:
+            return []
+        return clauses if isinstance(clauses, list) else [clauses]
+
+    def aggregate(self, aggs, mask):
+        """Computes the min and max aggregations of the matching documents."""
+        results = {}
+        for name, agg in aggs.items():
+            agg_type, params = next(iter(agg.items()))
+            if agg_type not in ('min', 'max'):
+                raise ValueError('Unsupported aggregation {!r}'.format(agg_type))
+            column = self._get_column(params['field'])
+            values = column[mask] if column is not None and column.ndim == 1 else np.zeros(0)
+            values = values[~np.isnan(values)]
+            value = None
+            if len(values):
+                value = float(values.min() if agg_type == 'min' else values.max())
+            results[name] = {'value': value}
+        return results
+
+
+class LocalIndex:
+    """An in-memory knowledge base index.
+
+    Args:
+        docs (iterable): The documents of the index
+    """
+
+    def __init__(self, docs):
+        self._docs = list(docs)
+        self._document_set = _DocumentSet(self._docs)
+
+    @property
+    def field_types(self):
+        """dict: The type of each field in the index, as in the Elasticsearch mapping"""
+        return dict(self._document_set.field_types)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def search(self, body):
+        """Executes a search.
+
+        Args:
+            body (dict): The search in the Elasticsearch query DSL
+
+        Returns:
+            (dict): The response in the format of an Elasticsearch search response
+        """
+        scores, mask = self._document_set.evaluate(body.get('query', {'match_all': {}}))
+        matched = np.flatnonzero(mask)
+        ranking = np.argsort(-scores[matched], kind='mergesort')
+        ranking = ranking[:body.get('size', DEFAULT_SEARCH_SIZE)]
+
+        excludes = body.get('_source', {}).get('excludes', [])
+        hits = []
+        for doc_id, score in zip(matched[ranking].tolist(), scores[matched][ranking].tolist()):
+            source = {field: copy.deepcopy(value) for field, value in self._docs[doc_id].items()
+                      if not any(fnmatch.fnmatchcase(field, pattern) for pattern in excludes)}
+            hits.append({'_id': source.get('id'), '_score': score, '_source': source})
+
+        response = {'hits': {'total': len(matched),
+                             'max_score': hits[0]['_score'] if hits else None,
+                             'hits': hits}}
+        if body.get('aggs'):
+            response['aggregations'] = self._document_set.aggregate(body['aggs'], mask)
+        return response
+
+
+class LocalKnowledgeBase:
+    """A collection of in-memory knowledge base indexes. Its :meth:`search` method has the same
+    signature as the one of the Elasticsearch client, so that both can execute the searches of the
+    question answerer.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def create_index(self, index, docs):
+        """Creates an index from the given documents, replacing an existing index with the same
+        name.
+
+        Args:
+            index (str): The scoped name of the index
+            docs (iterable): The documents of the index
+        """
+        local_index = LocalIndex(docs)
+        with self._lock:
+            self._indexes[index] = local_index
+        logger.info('Loaded %s documents into local knowledge base index %r', len(local_index),
+                    index)
+
+    def delete_index(self, index):
+        """Deletes an index if it exists.
+
+        Args:
+            index (str): The scoped name of the index
+        """
+        with self._lock:
+            self._indexes.pop(index, None)
+
+    def does_index_exist(self, index):
+        """Returns whether an index exists.
+
+        Args:
+            index (str): The scoped name of the index
+        """
+        return index in self._indexes
+
+    def _get_index(self, index):
+        try:
+            return self._indexes[index]
+        except KeyError:
+            raise KnowledgeBaseError('Knowledge base index {!r} does not exist.'.format(index))
+
+    def get_field_types(self, index):
+        """Returns the type of each field in an index.
+
+        Args:
+            index (str): The scoped name of the index
+
+        Returns:
+            (dict): A mapping from field names to field types
+        """
+        return self._get_index(index).field_types
+
+    def search(self, index, body, **kwargs):  # pylint: disable=unused-argument
+        """Executes a search against an index.
+
+        Args:
+            index (str): The scoped name of the index
+            body (dict): The search in the Elasticsearch query DSL
+
+        Returns:
+            (dict): The response in the format of an Elasticsearch search response
+        """
+        return self._get_index(index).search(body)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains an in-memory text relevance index used for entity resolution without
+Elasticsearch. It mirrors the analyzers of the Elasticsearch synonym index (see ``_config.py``)
+and scores documents with the same BM25 similarity and ``sort_factor`` boost as the text
+relevance query in the entity resolver, so both return a similar ranking.
+"""
+from collections import defaultdict
+from functools import lru_cache
+import logging
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+try:
+    from metaphone import doublemetaphone
+except ImportError:
+    doublemetaphone = None
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters used by Elasticsearch
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Elasticsearch returns 10 hits unless a size is specified
+DEFAULT_SEARCH_SIZE = 10
+
+KEYWORD_MAX_LENGTH = 256
+NGRAM_SIZE = 3
+MAX_SHINGLE_SIZE = 4
+PHONETIC_MAX_CODE_LENGTH = 7
+
+_LETTER = r"[^\W\d_]"
+_NOT_LETTER_OR_NUMBER = r"(?:[^\w&']|_)"
+_CHAR_FILTERS = [
+    (re.compile(','), ''),
+    (re.compile('[™®]'), ''),
+    (re.compile(" '|' "), ''),
+    (re.compile(r"([^\d\s]+)'s "), r"\1 's "),
+    (re.compile(r"^(?:[^\w&'$¢£¥₠-₿]|_)+"), ''),
+    (re.compile(_NOT_LETTER_OR_NUMBER + '+$'), ''),
+    (re.compile(r'({0}+){1}+(?=[\d\s])'.format(_LETTER, _NOT_LETTER_OR_NUMBER)), r'\1 '),
+    (re.compile(r'(\d+){0}+(?={1}|\s)'.format(_NOT_LETTER_OR_NUMBER, _LETTER)), r'\1 '),
+    (re.compile(r'({0}+){1}+(?={0})'.format(_LETTER, _NOT_LETTER_OR_NUMBER)), r'\1 '),
+]
+
+
+@lru_cache(maxsize=4096)
+def _normalize(text):
+    """Applies the character filters, lowercasing and ASCII folding of the Elasticsearch
+    analyzers.
+    """
+    for pattern, replacement in _CHAR_FILTERS:
+        text = pattern.sub(replacement, text)
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _shingles(words):
+    tokens = list(words)
+    for size in range(2, MAX_SHINGLE_SIZE + 1):
+        tokens.extend(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return tokens
+
+
+def analyze_raw(text):
+    """Analyzes text like a keyword field. Returns the tokens and the field length."""
+    return ([text] if len(text) <= KEYWORD_MAX_LENGTH else []), 1
+
+
+def analyze_keyword(text):
+    """Analyzes text like the ``keyword_match_analyzer``. Returns the tokens and the field
+    length.
+    """
+    return [_normalize(text)], 1
+
+
+def analyze_default(text):
+    """Analyzes text like the ``default_analyzer``. Returns the tokens and the field length."""
+    words = _normalize(text).split()
+    return _shingles(words), len(words)
+
+
+def analyze_char_ngram(text):
+    """Analyzes text like the ``char_ngram_analyzer``. Returns the tokens and the field
+    length.
+    """
+    tokens = []
+    length = 0
+    for word in _normalize(text).split():
+        grams = [word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)]
+        tokens.extend(grams)
+        length += 1 if grams else 0
+    return tokens, length
+
+
+def analyze_phonetic(text):
+    """Analyzes text like the ``phonetic_analyzer``. Returns the tokens and the field length."""
+    words = _normalize(text).split()
+    tokens = []
+    for shingle in _shingles(words):
+        codes = [code[:PHONETIC_MAX_CODE_LENGTH] for code in doublemetaphone(shingle) if code]
+        tokens.extend(sorted(set(codes)))
+    return tokens, len(words)
+
+
+class _FieldIndex:
+    """An inverted index over a single field. Each posting stores the precomputed BM25 weight of
+    the term in the document, so that scoring a query only sums weights.
+    """
+
+    def __init__(self, analyzer):
+        self._analyzer = analyzer
+        self._postings = defaultdict(lambda: defaultdict(int))
+        self._lengths = {}
+        self._total_term_count = 0
+
+    def add(self, doc_id, text):
+        tokens, length = self._analyzer(text)
+        if not tokens:
+            return
+        for token in tokens:
+            self._postings[token][doc_id] += 1
+        self._lengths[doc_id] = length
+        self._total_term_count += len(tokens)
+
+    def freeze(self):
+        """Computes the BM25 weights of all postings and stores them in flat arrays."""
+        doc_count = len(self._lengths)
+        avg_length = self._total_term_count / doc_count if doc_count else 1.0
+        postings = {}
+        for token, doc_freqs in self._postings.items():
+            idf = math.log(1 + (doc_count - len(doc_freqs) + 0.5) / (len(doc_freqs) + 0.5))
+            doc_ids = np.fromiter(doc_freqs.keys(), dtype=np.int32, count=len(doc_freqs))
+            freqs = np.fromiter(doc_freqs.values(), dtype=np.float64, count=len(doc_freqs))
+            lengths = np.array([self._lengths[doc_id] for doc_id in doc_freqs])
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+            postings[token] = (doc_ids, idf * freqs * (BM25_K1 + 1) / (freqs + norms))
+        self._postings = postings
+        self._lengths = None
+
+    def score(self, text, boost, scores):
+        """Adds the scores of a match query for the given text to ``scores``.
+
+        Args:
+            text (str): The query text
+            boost (float): The boost of the match query
+            scores (numpy.array): The scores of all documents
+        """
+        self.score_tokens(self._analyzer(text)[0], boost, scores)
+
+    def score_tokens(self, tokens, boost, scores):
+        """Adds the scores of the given terms, which are not analyzed, to ``scores``.
+
+        Args:
+            tokens (list): The terms
+            boost (float): The boost of the query
+            scores (numpy.array): The scores of all documents
+        """
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is not None:
+                # document ids are unique within a posting
+                scores[posting[0]] += boost * posting[1]
+
+
+class TextRelevanceIndex:
+    """An in-memory index of the canonical names and synonyms of an entity map, which ranks
+    entities like the Elasticsearch text relevance query of the entity resolver.
+
+    Args:
+        entities (list): The entities in the entity map
+        use_double_metaphone (bool): Whether to also match double metaphone codes
+    """
+
+    def __init__(self, entities, use_double_metaphone=False):
+        if use_double_metaphone and doublemetaphone is None:
+            logger.warning("The 'metaphone' package is not installed. Phonetic matching is "
+                           "disabled for the local text relevance index.")
+            use_double_metaphone = False
+        self._use_double_metaphone = use_double_metaphone
+
+        self._items = []
+        self._synonyms = []
+        synonym_items = []
+        self._cname_fields = self._create_fields()
+        self._synonym_fields = self._create_fields(synonym=True)
+        for item in entities:
+            item_id = len(self._items)
+            self._items.append({key: value for key, value in item.items() if key != 'whitelist'})
+            for field, _ in self._cname_fields.values():
+                field.add(item_id, item['cname'])
+            for name in [item['cname']] + list(item.get('whitelist', [])):
+                for field, _ in self._synonym_fields.values():
+                    field.add(len(self._synonyms), name)
+                self._synonyms.append(name)
+                synonym_items.append(item_id)
+
+        for field, _ in list(self._cname_fields.values()) + list(self._synonym_fields.values()):
+            field.freeze()
+        self._synonym_items = np.array(synonym_items, dtype=np.int32)
+        self._boosts = np.log10(1 + 10 * np.array(
+            [item.get('sort_factor') or 0 for item in self._items], dtype=np.float64))
+
+    def _create_fields(self, synonym=False):
+        """Creates the indexed fields with the boosts used by the text relevance query."""
+        if synonym:
+            fields = {'normalized_keyword': (_FieldIndex(analyze_keyword), 10),
+                      'name': (_FieldIndex(analyze_default), 1),
+                      'char_ngram': (_FieldIndex(analyze_char_ngram), 1)}
+            phonetic_boost = 3
+        else:
+            fields = {'normalized_keyword': (_FieldIndex(analyze_keyword), 10),
+                      'raw': (_FieldIndex(analyze_raw), 10),
+                      'char_ngram': (_FieldIndex(analyze_char_ngram), 1)}
+            phonetic_boost = 2
+        if self._use_double_metaphone:
+            fields['double_metaphone'] = (_FieldIndex(analyze_phonetic), phonetic_boost)
+        return fields
+
+    def search(self, entities, size=DEFAULT_SEARCH_SIZE):
+        """Ranks the indexed entities for the given n-best entities.
+
+        Args:
+            entities (tuple): A list of n-best entity objects
+            size (int): The maximum number of hits to return
+
+        Returns:
+            (dict): The hits in the format of an Elasticsearch search response
+        """
+        scores = np.zeros(len(self._items))
+        for i, entity in enumerate(entities):
+            weight = 1 - float(i) / len(entities)
+            for name, (field, boost) in self._cname_fields.items():
+                if i == 0 or name == 'double_metaphone':
+                    field.score(entity.text, boost * weight, scores)
+                elif name == 'normalized_keyword':
+                    # the other n-best transcripts only have to match the whole normalized text
+                    field.score(entity.text, weight, scores)
+
+        synonym_scores = np.zeros(len(self._synonyms))
+        for field, boost in self._synonym_fields.values():
+            field.score(entities[0].text, boost, synonym_scores)
+        matched_synonyms = np.flatnonzero(synonym_scores)
+        best_synonym_scores = np.zeros(len(self._items))
+        np.maximum.at(best_synonym_scores, self._synonym_items[matched_synonyms],
+                      synonym_scores[matched_synonyms])
+
+        matched = np.flatnonzero(scores + best_synonym_scores)
+        totals = scores[matched] + best_synonym_scores[matched] + self._boosts[matched]
+        ranking = np.argsort(-totals, kind='mergesort')[:size]
+
+        hits = []
+        for item_id, total in zip(matched[ranking].tolist(), totals[ranking].tolist()):
+            synonym_ids = matched_synonyms[self._synonym_items[matched_synonyms] == item_id]
+            synonym_ids = synonym_ids[np.argsort(-synonym_scores[synonym_ids], kind='mergesort')]
+            synonym_hits = [{'_score': synonym_scores[synonym_id],
+                             '_source': {'name': self._synonyms[synonym_id]}}
+                            for synonym_id in synonym_ids[:3].tolist()]
+            hits.append({'_score': total, '_source': self._items[item_id],
+                         'inner_hits': {'whitelist': {'hits': {'hits': synonym_hits}}}})
+        return {'hits': {'hits': hits}}
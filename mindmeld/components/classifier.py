@@ -19,12 +19,10 @@ import json
 import logging
 import os
 
-from sklearn.externals import joblib
-
-from .. import markup
-from ..exceptions import ClassifierLoadError
+from .. import markup, serialization
+from ..exceptions import ArtifactLoadError, ClassifierLoadError
 from ..core import Query
-from ..constants import DEFAULT_TRAIN_SET_REGEX, DEFAULT_TEST_SET_REGEX
+from ..constants import DEFAULT_TRAIN_SET_REGEX, DEFAULT_TEST_SET_REGEX, WARM_START_HASH_SUFFIX
 
 from ..models import create_model, ModelConfig
 
@@ -132,6 +130,7 @@ class Classifier(ABC):
         self.dirty = False
         self.config = None
         self.hash = ''
+        self.warm_start_hash = ''
 
     def fit(self, queries=None, label_set=None, incremental_timestamp=None, **kwargs):
         """Trains a statistical model for classification using the provided training examples and
@@ -221,10 +220,20 @@ class Classifier(ABC):
             return
 
         model.initialize_resources(self._resource_loader, queries, classes)
-        model.fit(queries, classes)
+        warm_start_hash = self._get_warm_start_hash(model_config, classes)
+        previous_model = None
+        if incremental_timestamp:
+            previous_model = self._load_warm_start_model(warm_start_hash)
+
+        if previous_model:
+            logger.info('Warm starting from previous model.')
+            model.fit_warm_start(queries, classes, previous_model)
+        else:
+            model.fit(queries, classes)
         self._model = model
         self.config = ClassifierConfig.from_model_config(self._model.config)
         self.hash = new_hash
+        self.warm_start_hash = warm_start_hash
 
         self.ready = True
         self.dirty = True
@@ -278,13 +287,16 @@ class Classifier(ABC):
         class_proba_tuples = list(predict_proba_result[0][1].items())
         return sorted(class_proba_tuples, key=lambda x: x[1], reverse=True)
 
-    def evaluate(self, queries=None, label_set=None):
+    def evaluate(self, queries=None, label_set=None, compare_full_retrain=False):
         """Evaluates the trained classification model on the given test data
 
         Args:
             queries (list of ProcessedQuery): The labeled queries to use as test data. If none
                 are provided, the test label set will be used.
             label_set (str): The label set to use for evaluation.
+            compare_full_retrain (bool, optional): If the model was warm started, also train a
+                model from scratch on the same data and report its accuracy in the
+                ``full_retrain_accuracy`` attribute of the evaluation. Defaults to False.
 
         Returns:
             ModelEvaluation: A ModelEvaluation object that contains evaluation results
@@ -308,8 +320,37 @@ class Classifier(ABC):
             return None
 
         evaluation = self._model.evaluate(queries, labels)
+        if compare_full_retrain:
+            if getattr(self._model, 'warm_started_', False):
+                evaluation.full_retrain_accuracy = self._get_full_retrain_accuracy(queries,
+                                                                                   labels)
+            else:
+                logger.info('Not comparing the %s with a full retrain since it was not warm '
+                            'started.', self.__class__.__name__)
         return evaluation
 
+    def _get_full_retrain_accuracy(self, queries, labels):
+        """Trains a model from scratch with the configuration and training data of the current
+        warm started model, and evaluates it on the given queries for comparison.
+
+        Args:
+            queries (list of Query): The queries to evaluate on
+            labels (list): The gold labels for the queries
+
+        Returns:
+            float: The accuracy of the fully retrained model
+        """
+        model_config = self._model.config
+        label_set = model_config.train_label_set or DEFAULT_TRAIN_SET_REGEX
+        train_queries, train_labels = self._get_queries_and_labels(label_set=label_set)
+        if not train_queries:
+            return None
+
+        model = create_model(model_config)
+        model.initialize_resources(self._resource_loader, train_queries, train_labels)
+        model.fit(train_queries, train_labels)
+        return model.evaluate(queries, labels).get_accuracy()
+
     def inspect(self, query, gold_label=None, dynamic_resource=None):
         raise NotImplementedError
 
@@ -363,7 +404,7 @@ class Classifier(ABC):
         return self._model
 
     def _create_and_dump_payload(self, path):
-        joblib.dump(self._data_dump_payload(), path)
+        serialization.dump(self._data_dump_payload(), path)
 
     def dump(self, model_path, incremental_model_path=None):
         """Persists the trained classification model to disk.
@@ -388,6 +429,11 @@ class Classifier(ABC):
             with open(hash_path, 'w') as hash_file:
                 hash_file.write(self.hash)
 
+            if self.warm_start_hash:
+                warm_start_hash_path = path + WARM_START_HASH_SUFFIX
+                with open(warm_start_hash_path, 'w') as hash_file:
+                    hash_file.write(self.warm_start_hash)
+
             if path == model_path:
                 self.dirty = False
 
@@ -398,8 +444,8 @@ class Classifier(ABC):
             model_path (str): The location on disk where the model is stored
         """
         try:
-            self._model = joblib.load(model_path)
-        except (OSError, IOError):
+            self._model = serialization.load(model_path)
+        except (OSError, IOError, ArtifactLoadError):
             msg = 'Unable to load {}. Pickle at {!r} cannot be read.'
             raise ClassifierLoadError(msg.format(self.__class__.__name__, model_path))
         if self._model is not None:
@@ -418,13 +464,14 @@ class Classifier(ABC):
             self.config = ClassifierConfig.from_model_config(self._model.config)
 
         self.hash = self._load_hash(model_path)
+        self.warm_start_hash = self._load_hash(model_path, WARM_START_HASH_SUFFIX)
 
         self.ready = True
         self.dirty = False
 
     @staticmethod
-    def _load_hash(model_path):
-        hash_path = model_path + '.hash'
+    def _load_hash(model_path, suffix='.hash'):
+        hash_path = model_path + suffix
         if not os.path.isfile(hash_path):
             return ''
         with open(hash_path, 'r') as hash_file:
@@ -537,6 +584,43 @@ class Classifier(ABC):
             rsc_hash
         ])
 
+    def _get_warm_start_hash(self, model_config, labels):
+        """Returns a hash identifying the models which can be used to warm start this classifier.
+        Unlike the model hash, it does not depend on the training queries, only on the model
+        configuration and the set of classes.
+
+        Args:
+            model_config (ModelConfig): The model configuration
+            labels (list): The training labels
+
+        Returns:
+            str: The hash
+        """
+        config_hash = self._resource_loader.hash_string(model_config.to_json())
+        labels_hash = self._resource_loader.hash_list(sorted(set(labels)))
+        return self._resource_loader.hash_list([self.CLF_TYPE, config_hash, labels_hash])
+
+    def _load_warm_start_model(self, warm_start_hash):
+        """Loads the most recently cached model matching the given warm start hash.
+
+        Args:
+            warm_start_hash (str): The warm start hash
+
+        Returns:
+            Model: The cached model, or None if there is no usable model
+        """
+        model_path = self._resource_loader.warm_start_hash_to_model_path.get(warm_start_hash)
+        if not model_path:
+            return None
+        try:
+            model = serialization.load(model_path)
+        except (OSError, IOError, ArtifactLoadError):
+            logger.warning('Unable to load the model to warm start from at %r', model_path)
+            return None
+        if not hasattr(model, 'fit_warm_start'):
+            return None
+        return model
+
     def __repr__(self):
         msg = '<{} ready: {!r}, dirty: {!r}>'
         return msg.format(self.__class__.__name__, self.ready, self.dirty)
@@ -16,8 +16,8 @@ This module contains the entity recognizer component of the MindMeld natural lan
 """
 import logging
 
-from sklearn.externals import joblib
-
+from .. import serialization
+from ..exceptions import ArtifactLoadError
 from ..core import Entity, Query
 from ..models import create_model, QUERY_EXAMPLE_TYPE, ENTITIES_LABEL_TYPE
 from ..constants import DEFAULT_TRAIN_SET_REGEX
@@ -142,7 +142,7 @@ class EntityRecognizer(Classifier):
         """
         logger.info('Loading entity recognizer: domain=%r, intent=%r', self.domain, self.intent)
         try:
-            er_data = joblib.load(model_path)
+            er_data = serialization.load(model_path)
 
             self.entity_types = er_data['entity_types']
             self._model_config = er_data.get('model_config')
@@ -156,7 +156,7 @@ class EntityRecognizer(Classifier):
             else:
                 self._model = create_model(self._model_config)
                 self._model.load(model_path, er_data)
-        except (OSError, IOError):
+        except (OSError, IOError, ArtifactLoadError):
             msg = 'Unable to load {}. Pickle file cannot be read from {!r}'
             raise ClassifierLoadError(msg.format(self.__class__.__name__, model_path))
 
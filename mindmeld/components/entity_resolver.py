@@ -14,26 +14,162 @@
 """
 This module contains the entity resolver component of the MindMeld natural language processor.
 """
+from collections import defaultdict, namedtuple, OrderedDict
 import copy
+import json
 import logging
 import hashlib
 import os
+import re
+import threading
+import time
 
 from elasticsearch5.exceptions import ConnectionError as EsConnectionError, TransportError,\
     ElasticsearchException
 
+from .. import path
 from ..core import Entity
 from ._config import (get_app_namespace, get_classifier_config, DOC_TYPE,
                       DEFAULT_ES_SYNONYM_MAPPING, PHONETIC_ES_SYNONYM_MAPPING)
 
-from ._elasticsearch_helpers import (create_es_client, load_index, get_scoped_index_name,
+from ._elasticsearch_helpers import (get_es_client, load_index, get_scoped_index_name,
                                      delete_index, does_index_exist, get_field_names,
-                                     INDEX_TYPE_KB, INDEX_TYPE_SYNONYM)
+                                     get_es_host, get_index_names,
+                                     run_es_request_async, INDEX_TYPE_KB, INDEX_TYPE_SYNONYM)
 
-from ..exceptions import EntityResolverConnectionError, EntityResolverError
+from ._text_relevance_index import TextRelevanceIndex
+
+from ..exceptions import (EntityResolverConnectionError, EntityResolverError,
+                          KnowledgeBaseConnectionError, KnowledgeBaseError)
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_RESULT_CACHE_SIZE = 10000
+# the number of seconds for which resolution results are cached, so that results resolved
+# against a synonym index which was updated by another process expire
+DEFAULT_RESULT_CACHE_TTL = 300
+
+# the number of seconds for which the names of the existing indexes are cached while the
+# resolvers are loaded
+INDEX_NAMES_TTL = 10
+
+# stands in for an entity while a query template is compiled
+_TextSlot = namedtuple('_TextSlot', ['text'])
+_TEXT_SLOT = '@@mm_text_{}@@'
+_TEXT_SLOT_PATTERN = re.compile(r'"@@mm_text_(\d+)@@"')
+
+
+class QueryTemplate:
+    """An Elasticsearch query body which is serialized to JSON once. Rendering the template
+    only substitutes the entity texts into the serialized body.
+
+    Args:
+        body (dict): The query body, where the entity texts are ``_TEXT_SLOT`` placeholders
+    """
+
+    def __init__(self, body):
+        parts = _TEXT_SLOT_PATTERN.split(json.dumps(body, separators=(',', ':')))
+        self._segments = parts[0::2]
+        self._slots = [int(slot) for slot in parts[1::2]]
+
+    def render(self, texts):
+        """Renders the query body for the given entity texts.
+
+        Args:
+            texts (list of str): The text of each n-best entity
+
+        Returns:
+            (str): The serialized query body
+        """
+        values = [json.dumps(text) for text in texts]
+        rendered = [self._segments[0]]
+        for slot, segment in zip(self._slots, self._segments[1:]):
+            rendered.append(values[slot])
+            rendered.append(segment)
+        return ''.join(rendered)
+
+
+class ResolutionCache:
+    """A bounded least recently used cache of entity resolution results, which also keeps track
+    of its hit rate.
+
+    Args:
+        max_size (int): The maximum number of results to keep
+        ttl (float, optional): The number of seconds after which a result expires. If None,
+            results do not expire.
+    """
+
+    def __init__(self, max_size=DEFAULT_RESULT_CACHE_SIZE, ttl=DEFAULT_RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy_values(values):
+        # callers may modify the resolved values, so cached values are never handed out
+        return [copy.copy(value) for value in values]
+
+    def get(self, key):
+        """Gets the cached resolved values for the given key.
+
+        Args:
+            key (tuple): The texts of the n-best entities
+
+        Returns:
+            (list): The resolved values, or None if they are not cached
+        """
+        with self._lock:
+            expiry, values = self._results.get(key, (None, None))
+            if values is not None and expiry is not None and expiry < time.time():
+                del self._results[key]
+                values = None
+            if values is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+        return self._copy_values(values)
+
+    def set(self, key, values):
+        """Caches the resolved values for the given key.
+
+        Args:
+            key (tuple): The texts of the n-best entities
+            values (list): The resolved values
+        """
+        if self.max_size <= 0:
+            return
+        values = self._copy_values(values)
+        expiry = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._results[key] = (expiry, values)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached results."""
+        with self._lock:
+            self._results.clear()
+
+    @property
+    def hit_rate(self):
+        """float: The fraction of lookups which were answered from the cache."""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def info(self):
+        """Returns statistics about the cache.
+
+        Returns:
+            (dict): The number of hits and misses, the hit rate, and the current and maximum size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'size': len(self._results), 'max_size': self.max_size}
+
 
 class EntityResolver:
     """An entity resolver is used to resolve entities in a given query to their canonical values
@@ -43,6 +179,15 @@ class EntityResolver:
     ES_SYNONYM_INDEX_PREFIX = "synonym"
     """The prefix of the ES index."""
 
+    # result caches shared by the resolvers of each entity type
+    _result_caches = {}
+    # compiled query templates for each phonetic setting and number of n-best entities
+    _query_templates = {}
+    _result_caches_lock = threading.Lock()
+    # the expiry time and the names of the existing indexes of each app
+    _index_names = {}
+    _index_names_lock = threading.Lock()
+
     def __init__(self, app_path, resource_loader, entity_type, es_host=None, es_client=None):
         """Initializes an entity resolver
 
@@ -52,12 +197,14 @@ class EntityResolver:
             entity_type: The entity type associated with this entity resolver
             es_host (str): The Elasticsearch host server
         """
+        self._app_path = app_path
         self._app_namespace = get_app_namespace(app_path)
         self._resource_loader = resource_loader
         self._normalizer = resource_loader.query_factory.normalize
         self.type = entity_type
         self._is_system_entity = Entity.is_system_entity(self.type)
         self._exact_match_mapping = None
+        self._text_relevance_index = None
         self._er_config = get_classifier_config('entity_resolution', app_path=app_path)
         self._es_host = es_host
         self._es_config = {'client': es_client, 'pid': os.getpid()}
@@ -66,19 +213,37 @@ class EntityResolver:
     def _es_index_name(self):
         return EntityResolver.ES_SYNONYM_INDEX_PREFIX + "_" + self.type
 
+    @property
+    def result_cache(self):
+        """ResolutionCache: The cache of resolution results, which is shared by all resolvers for
+        this entity type and Elasticsearch host.
+        """
+        key = (get_es_host(self._es_host), self._app_namespace, self.type)
+        with EntityResolver._result_caches_lock:
+            if key not in EntityResolver._result_caches:
+                EntityResolver._result_caches[key] = ResolutionCache(
+                    self._er_config.get('result_cache_size', DEFAULT_RESULT_CACHE_SIZE),
+                    self._er_config.get('result_cache_ttl', DEFAULT_RESULT_CACHE_TTL))
+            return EntityResolver._result_caches[key]
+
     @property
     def _use_text_rel(self):
         return self._er_config['model_type'] == 'text_relevance'
 
+    @property
+    def _use_local_text_rel(self):
+        return self._er_config['model_type'] == 'local_text_relevance'
+
     @property
     def _use_double_metaphone(self):
         return 'double_metaphone' in self._er_config.get('phonetic_match_types', [])
 
     @property
     def _es_client(self):
-        # Lazily connect to Elasticsearch.  Make sure each subprocess gets it's own connection
+        # Lazily connect to Elasticsearch.  Make sure each subprocess gets it's own connection.
+        # The resolvers of all entity types share the client of the process.
         if self._es_config['client'] is None or self._es_config['pid'] != os.getpid():
-            self._es_config = {'pid': os.getpid(), 'client': create_es_client()}
+            self._es_config = {'pid': os.getpid(), 'client': get_es_client(self._es_host)}
         return self._es_config['client']
 
     @classmethod
@@ -160,10 +325,21 @@ class EntityResolver:
         if self._is_system_entity:
             return
 
+        # results resolved against the previous synonym index are stale
+        self.result_cache.clear()
+
+        if self._use_local_text_rel:
+            self._fit_local_text_relevance()
+            return
+
         if not self._use_text_rel:
             self._fit_exact_match()
             return
 
+        # the synonym index may be created or deleted
+        with EntityResolver._index_names_lock:
+            EntityResolver._index_names.pop(self._app_namespace, None)
+
         if clean:
             delete_index(self._app_namespace, self._es_index_name, self._es_host,
                          self._es_client)
@@ -172,13 +348,6 @@ class EntityResolver:
         # list of canonical entities and their synonyms
         entities = entity_map.get('entities', [])
 
-        # create synonym index and import synonyms
-        logger.info("Importing synonym data to synonym index '%s'", self._es_index_name)
-        EntityResolver.ingest_synonym(app_namespace=self._app_namespace,
-                                      index_name=self._es_index_name, data=entities,
-                                      es_host=self._es_host, es_client=self._es_client,
-                                      use_double_metaphone=self._use_double_metaphone)
-
         # It's supported to specify the KB object type and field name that the NLP entity type
         # corresponds to in the mapping.json file. In this case the synonym whitelist is also
         # imported to KB object index and the synonym info will be used when using Question Answerer
@@ -186,6 +355,33 @@ class EntityResolver:
         kb_index = entity_map.get('kb_index_name')
         kb_field = entity_map.get('kb_field_name')
 
+        # only the entities which changed since the last fit are imported
+        doc_ids, state = self._get_synonym_index_state(entities, kb_index, kb_field)
+        previous_state = {} if clean else self._load_synonym_index_state()
+        if previous_state.get('settings') != state['settings'] or not does_index_exist(
+                self._app_namespace, self._es_index_name, self._es_host, self._es_client):
+            previous_state = {}
+        kb_synonyms_loaded = not (kb_index and kb_field) or self._are_kb_synonyms_loaded(
+            kb_index, kb_field, len(entities))
+        if previous_state.get('mapping_hash') == state['mapping_hash'] and kb_synonyms_loaded:
+            logger.info("Synonym index '%s' is up to date", self._es_index_name)
+            return
+
+        previous_hashes = previous_state.get('doc_hashes', {})
+        changed_entities = [entity for entity, doc_id in zip(entities, doc_ids)
+                            if previous_hashes.get(doc_id) != state['doc_hashes'][doc_id]]
+        deleted_ids = [doc_id for doc_id in previous_hashes if doc_id not in state['doc_hashes']]
+
+        # create synonym index and import synonyms
+        logger.info("Importing %s changed and deleting %s removed entities in synonym index '%s'",
+                    len(changed_entities), len(deleted_ids), self._es_index_name)
+        EntityResolver.ingest_synonym(app_namespace=self._app_namespace,
+                                      index_name=self._es_index_name, data=changed_entities,
+                                      es_host=self._es_host, es_client=self._es_client,
+                                      use_double_metaphone=self._use_double_metaphone)
+        if deleted_ids:
+            self._delete_synonyms(deleted_ids)
+
         # if KB index and field name is specified then also import synonyms into KB object index.
         if kb_index and kb_field:
             # validate the KB index and field are valid.
@@ -202,10 +398,85 @@ class EntityResolver:
                                  "without ID.")
             logger.info("Importing synonym data to knowledge base index '%s'", kb_index)
             EntityResolver.ingest_synonym(app_namespace=self._app_namespace, index_name=kb_index,
-                                          index_type='kb', field_name=kb_field, data=entities,
+                                          index_type='kb', field_name=kb_field,
+                                          data=changed_entities if kb_synonyms_loaded
+                                          else entities,
                                           es_host=self._es_host, es_client=self._es_client,
                                           use_double_metaphone=self._use_double_metaphone)
 
+        self._dump_synonym_index_state(state)
+
+    def _get_synonym_index_state(self, entities, kb_index=None, kb_field=None):
+        """Hashes the entities in the entity map to detect which of them changed since the
+        synonym index was last updated.
+
+        Args:
+            entities (list): The entities in the entity map
+            kb_index (str): The knowledge base index the synonyms are also imported to
+            kb_field (str): The knowledge base field the synonyms are imported to
+
+        Returns:
+            (tuple): The synonym index document id of each entity, and the state of the synonym \
+                index after importing the entities
+        """
+        doc_ids = []
+        doc_hashes = {}
+        for entity in entities:
+            doc_id = entity.get('id') or hashlib.sha256(entity['cname'].encode('utf-8')).hexdigest()
+            doc_ids.append(doc_id)
+            doc_hashes[doc_id] = hashlib.sha256(
+                json.dumps(entity, sort_keys=True).encode('utf-8')).hexdigest()
+
+        # the state file is shared by all hosts the app is fit against
+        settings = {'es_host': get_es_host(self._es_host),
+                    'use_double_metaphone': self._use_double_metaphone,
+                    'kb_index': kb_index, 'kb_field': kb_field}
+        mapping_hash = hashlib.sha256(json.dumps(
+            [settings, sorted(doc_hashes.items())]).encode('utf-8')).hexdigest()
+        return doc_ids, {'settings': settings, 'mapping_hash': mapping_hash,
+                         'doc_hashes': doc_hashes}
+
+    def _load_synonym_index_state(self):
+        state_path = path.get_synonym_index_state_path(self._app_path, self.type)
+        try:
+            with open(state_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _dump_synonym_index_state(self, state):
+        state_path = path.get_synonym_index_state_path(self._app_path, self.type)
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        with open(state_path + '.tmp', 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(state_path + '.tmp', state_path)
+
+    def _are_kb_synonyms_loaded(self, kb_index, kb_field, count):
+        """Checks whether the synonyms of the entities have been imported into the knowledge base
+        index, which is not the case if the index was reloaded since the last fit.
+        """
+        if not does_index_exist(self._app_namespace, kb_index, self._es_host, self._es_client):
+            return False
+        syn_field = kb_field + '$whitelist'
+        query = {'query': {'nested': {'path': syn_field, 'ignore_unmapped': True,
+                                      'query': {'exists': {'field': syn_field + '.name'}}}}}
+        response = self._es_client.count(
+            index=get_scoped_index_name(self._app_namespace, kb_index), body=query)
+        return response['count'] >= count
+
+    def _delete_synonyms(self, doc_ids):
+        """Deletes the documents of entities which were removed from the entity map from the
+        synonym index.
+
+        Args:
+            doc_ids (list): The ids of the documents to delete
+        """
+        actions = ({'_op_type': 'delete', '_id': doc_id} for doc_id in doc_ids)
+        mapping = PHONETIC_ES_SYNONYM_MAPPING if self._use_double_metaphone else \
+            DEFAULT_ES_SYNONYM_MAPPING
+        load_index(self._app_namespace, self._es_index_name, actions, len(doc_ids), mapping,
+                   DOC_TYPE, self._es_host, self._es_client)
+
     @staticmethod
     def _process_entity_map(entity_type, entity_map, normalizer):
         """Loads in the mapping.json file and stores the synonym mappings in a item_map and a
@@ -253,6 +524,14 @@ class EntityResolver:
         self._exact_match_mapping = self._process_entity_map(self.type, entity_map,
                                                              self._normalizer)
 
+    def _fit_local_text_relevance(self):
+        """Fits an in-memory text relevance entity resolution model, which ranks entities like
+        the Elasticsearch based model without requiring a cluster.
+        """
+        entity_map = self._resource_loader.get_entity_map(self.type)
+        self._text_relevance_index = TextRelevanceIndex(
+            entity_map.get('entities', []), use_double_metaphone=self._use_double_metaphone)
+
     def predict(self, entity):
         """Predicts the resolved value(s) for the given entity using the loaded entity map or the
         trained entity resolution model.
@@ -264,20 +543,147 @@ class EntityResolver:
         Returns:
             (list): The top 20 resolved values for the provided entity.
         """
-        if isinstance(entity, (list, tuple)):
-            top_entity = entity[0]
-            entity = tuple(entity)
-        else:
-            top_entity = entity
-            entity = tuple([entity])
+        return EntityResolver.predict_batch([(self, entity)])[0]
 
-        if self._is_system_entity:
-            # system entities are already resolved
-            return [top_entity.value]
+    @staticmethod
+    def predict_batch(requests):
+        """Predicts the resolved values for many entities at once. The text relevance queries for
+        all of the entities are sent to Elasticsearch in a single multi-search request, and the
+        responses are matched back to the entities they were issued for. Entities resolved by
+        exact match or by the local text relevance model are answered without Elasticsearch.
 
-        if not self._use_text_rel:
-            return self._predict_exact_match(top_entity)
+        Args:
+            requests (list): A list of ``(resolver, entity)`` tuples, where ``resolver`` is the \
+                entity resolver for the entity's type and ``entity`` is an entity or a list of \
+                n-best entity objects.
+
+        Returns:
+            (list): The resolved values for each request, in order.
+        """
+        results = [None] * len(requests)
+        searches = defaultdict(list)
+        for idx, (resolver, entity) in enumerate(requests):
+            entities = tuple(entity) if isinstance(entity, (list, tuple)) else (entity,)
+            if resolver._is_system_entity:
+                # system entities are already resolved
+                results[idx] = [entities[0].value]
+            elif not (resolver._use_text_rel or resolver._use_local_text_rel):
+                results[idx] = resolver._predict_exact_match(entities[0])
+            else:
+                # entities which only differ in case or spacing share their cached results
+                cache_key = tuple(resolver._normalizer(e.text) for e in entities)
+                results[idx] = resolver.result_cache.get(cache_key)
+                if results[idx] is not None:
+                    continue
+                if resolver._use_local_text_rel:
+                    results[idx] = resolver._get_resolved_values(
+                        entities, resolver._text_relevance_index.search(entities))
+                    resolver.result_cache.set(cache_key, results[idx])
+                else:
+                    searches[resolver._es_host].append((idx, resolver, entities, cache_key))
+
+        for group in searches.values():
+            es_client = group[0][1]._es_client
+            lines = []
+            for _, resolver, entities, _ in group:
+                lines.append(json.dumps({'index': get_scoped_index_name(
+                    resolver._app_namespace, resolver._es_index_name)}))
+                lines.append(resolver._get_query_template(len(entities)).render(
+                    [e.text for e in entities]))
+            responses = EntityResolver._msearch(es_client, '\n'.join(lines) + '\n')
+            for (idx, resolver, entities, cache_key), response in zip(group, responses):
+                results[idx] = resolver._get_resolved_values(entities, response)
+                resolver.result_cache.set(cache_key, results[idx])
+        return results
+
+    async def predict_async(self, entity):
+        """Predicts the resolved value(s) for the given entity without blocking the event loop.
+
+        Args:
+            entity (Entity, tuple): An entity found in an input query, or a list of n-best entity \
+                objects.
+
+        Returns:
+            (list): The top 20 resolved values for the provided entity.
+        """
+        return (await EntityResolver.predict_batch_async([(self, entity)]))[0]
+
+    @staticmethod
+    async def predict_batch_async(requests):
+        """Predicts the resolved values for many entities at once without blocking the event
+        loop. See :meth:`predict_batch`.
+
+        Args:
+            requests (list): A list of ``(resolver, entity)`` tuples
 
+        Returns:
+            (list): The top 20 resolved values for each entity, in the order of the requests.
+        """
+        return await run_es_request_async(EntityResolver.predict_batch, requests)
+
+    @staticmethod
+    def _msearch(es_client, body):
+        """Sends a multi-search request to Elasticsearch.
+
+        Args:
+            es_client (Elasticsearch): The Elasticsearch client
+            body (str): The serialized header and query body of each search, one per line
+
+        Returns:
+            (list): The response for each search
+        """
+        try:
+            responses = es_client.msearch(body=body)['responses']
+        except EsConnectionError as ex:
+            logger.error(
+                'Unable to connect to Elasticsearch: %s details: %s', ex.error, ex.info)
+            raise EntityResolverConnectionError(es_host=es_client.transport.hosts)
+        except TransportError as ex:
+            logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
+                         'Status code: %s details: %s', ex.error, ex.status_code, ex.info)
+            raise EntityResolverError('Unexpected error occurred when sending requests to '
+                                      'Elasticsearch: {} Status code: {} details: '
+                                      '{}'.format(ex.error, ex.status_code, ex.info))
+        except ElasticsearchException:
+            raise EntityResolverError
+
+        for response in responses:
+            if 'error' in response:
+                logger.error('Unexpected error occurred when sending requests to Elasticsearch: '
+                             '%s Status code: %s', response['error'], response.get('status'))
+                raise EntityResolverError('Unexpected error occurred when sending requests to '
+                                          'Elasticsearch: {} Status code: {}'.format(
+                                              response['error'], response.get('status')))
+        return responses
+
+    def _get_query_template(self, nbest_size):
+        """Gets the compiled text relevance query template for the given number of n-best
+        entities.
+
+        Args:
+            nbest_size (int): The number of n-best entities
+
+        Returns:
+            (QueryTemplate): The query template
+        """
+        key = (self._use_double_metaphone, nbest_size)
+        template = EntityResolver._query_templates.get(key)
+        if template is None:
+            slots = tuple(_TextSlot(_TEXT_SLOT.format(i)) for i in range(nbest_size))
+            template = QueryTemplate(self._construct_text_relevance_query(slots))
+            EntityResolver._query_templates[key] = template
+        return template
+
+    def _construct_text_relevance_query(self, entity):
+        """Constructs the Elasticsearch query body used to resolve the given n-best entities.
+
+        Args:
+            entity (tuple): A list of n-best entity objects
+
+        Returns:
+            (dict): The query body
+        """
+        top_entity = entity[0]
         weight_factors = [1 - float(i) / len(entity) for i in range(len(entity))]
 
         def _construct_match_query(entity, weight=1):
@@ -423,48 +829,44 @@ class EntityResolver:
         text_relevance_query["query"]["function_score"]["query"]["bool"]["should"].append(
             whitelist_query)
 
-        try:
-            index = get_scoped_index_name(self._app_namespace, self._es_index_name)
-            response = self._es_client.search(index=index, body=text_relevance_query)
-        except EsConnectionError as ex:
-            logger.error(
-                'Unable to connect to Elasticsearch: %s details: %s', ex.error, ex.info)
-            raise EntityResolverConnectionError(es_host=self._es_client.transport.hosts)
-        except TransportError as ex:
-            logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
-                         'Status code: %s details: %s', ex.error, ex.status_code, ex.info)
-            raise EntityResolverError('Unexpected error occurred when sending requests to '
-                                      'Elasticsearch: {} Status code: {} details: '
-                                      '{}'.format(ex.error, ex.status_code, ex.info))
-        except ElasticsearchException:
-            raise EntityResolverError
-        else:
-            hits = response['hits']['hits']
+        return text_relevance_query
 
-            results = []
-            for hit in hits:
-                if self._use_double_metaphone and len(entity) > 1:
-                    if hit['_score'] < 0.5 * len(entity):
-                        continue
+    def _get_resolved_values(self, entity, response):
+        """Extracts the resolved values from an Elasticsearch search response.
 
-                top_synonym = None
-                synonym_hits = hit['inner_hits']['whitelist']['hits']['hits']
-                if synonym_hits:
-                    top_synonym = synonym_hits[0]['_source']['name']
-                result = {
-                    'cname': hit['_source']['cname'],
-                    'score': hit['_score'],
-                    'top_synonym': top_synonym}
+        Args:
+            entity (tuple): The list of n-best entity objects the search was issued for
+            response (dict): The search response
+
+        Returns:
+            (list): The top 20 resolved values
+        """
+        hits = response['hits']['hits']
+
+        results = []
+        for hit in hits:
+            if self._use_double_metaphone and len(entity) > 1:
+                if hit['_score'] < 0.5 * len(entity):
+                    continue
 
-                if hit['_source'].get('id'):
-                    result['id'] = hit['_source'].get('id')
+            top_synonym = None
+            synonym_hits = hit['inner_hits']['whitelist']['hits']['hits']
+            if synonym_hits:
+                top_synonym = synonym_hits[0]['_source']['name']
+            result = {
+                'cname': hit['_source']['cname'],
+                'score': hit['_score'],
+                'top_synonym': top_synonym}
 
-                if hit['_source'].get('sort_factor'):
-                    result['sort_factor'] = hit['_source'].get('sort_factor')
+            if hit['_source'].get('id'):
+                result['id'] = hit['_source'].get('id')
 
-                results.append(result)
+            if hit['_source'].get('sort_factor'):
+                result['sort_factor'] = hit['_source'].get('sort_factor')
 
-            return results[0:20]
+            results.append(result)
+
+        return results[0:20]
 
     def _predict_exact_match(self, entity):
         """Predicts the resolved value(s) for the given entity using the loaded entity map.
@@ -492,16 +894,34 @@ class EntityResolver:
 
         return values
 
+    def _get_index_names(self):
+        """Returns the names of the existing indexes of the app. They are fetched with a single
+        request and cached briefly, so that loading the resolvers of all entity types does not
+        check each synonym index separately.
+        """
+        with EntityResolver._index_names_lock:
+            expiry, index_names = EntityResolver._index_names.get(self._app_namespace, (0, None))
+            if index_names is None or expiry < time.time():
+                index_names = get_index_names(self._app_namespace, self._es_host,
+                                              self._es_client)
+                EntityResolver._index_names[self._app_namespace] = (
+                    time.time() + INDEX_NAMES_TTL, index_names)
+            return index_names
+
     def load(self):
         """Loads the trained entity resolution model from disk."""
         try:
             if self._use_text_rel:
                 scoped_index_name = get_scoped_index_name(self._app_namespace, self._es_index_name)
-                if not self._es_client.indices.exists(index=scoped_index_name):
+                if scoped_index_name not in self._get_index_names():
                     self.fit()
             else:
                 self.fit()
 
+        except KnowledgeBaseConnectionError as e:
+            raise EntityResolverConnectionError(es_host=e.es_host)
+        except KnowledgeBaseError:
+            raise EntityResolverError
         except EsConnectionError as e:
             logger.error(
                 'Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
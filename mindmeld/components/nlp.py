@@ -16,6 +16,8 @@ This module contains the natural language processor.
 """
 import os
 import sys
+import threading
+from collections import OrderedDict
 from multiprocessing import cpu_count
 from concurrent.futures import ProcessPoolExecutor, wait
 from abc import ABC, abstractmethod
@@ -26,6 +28,7 @@ import time
 import warnings
 
 from .. import path
+from ..constants import DOMAIN_STAGE, ENTITIES_STAGE, FULL_STAGE, INTENT_STAGE, NLP_STAGES
 from ..core import ProcessedQuery, Bunch
 from ..exceptions import ProcessorError
 from ..resource_loader import ResourceLoader
@@ -83,6 +86,64 @@ def subproc_call_instance_function(instance_id, func_name, *args, **kwargs):
         sys.exit(1)
 
 
+class IntentModelCache:
+    """Keeps track of the lazily loaded intent processors whose models are resident in memory.
+
+    Intent processors register with the cache whenever their models are used. When more than
+    ``max_loaded_intents`` processors are resident, the models of the least recently used ones
+    are unloaded. Pinned processors are never unloaded.
+
+    Attributes:
+        max_loaded_intents (int): The maximum number of intents whose models are kept in memory,
+            or None for no limit.
+    """
+
+    def __init__(self, max_loaded_intents=None):
+        self.max_loaded_intents = max_loaded_intents
+        self._loaded = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def pin(self, processor):
+        """Exempts an intent processor from eviction.
+
+        Args:
+            processor (IntentProcessor): The intent processor to pin.
+        """
+        with self._lock:
+            self._pinned.add(id(processor))
+
+    def touch(self, processor):
+        """Marks an intent processor as most recently used, and unloads the least recently used
+        processors if the cache is over its budget.
+
+        Args:
+            processor (IntentProcessor): The intent processor whose models were used.
+        """
+        with self._lock:
+            self._loaded[id(processor)] = processor
+            self._loaded.move_to_end(id(processor))
+            if self.max_loaded_intents is None:
+                return
+            candidates = [p for key, p in self._loaded.items() if key not in self._pinned and
+                          p is not processor]
+            num_to_evict = len(self._loaded) - self.max_loaded_intents
+            evicted = []
+            for candidate in candidates:
+                if len(evicted) >= num_to_evict:
+                    break
+                if candidate.unload_models():
+                    evicted.append(candidate)
+            for candidate in evicted:
+                del self._loaded[id(candidate)]
+
+    @property
+    def loaded_intents(self):
+        """list: The loaded intent processors, from least to most recently used."""
+        with self._lock:
+            return list(self._loaded.values())
+
+
 class Processor(ABC):
     """A generic base class for processing queries through the MindMeld NLP
     components.
@@ -190,7 +251,7 @@ class Processor(ABC):
     def _load(self, incremental_timestamp=None):
         raise NotImplementedError
 
-    def evaluate(self, print_stats=False, label_set=None):
+    def evaluate(self, print_stats=False, label_set=None, compare_full_retrain=False):
         """Evaluates all the natural language processing models for this processor and its
         children.
 
@@ -199,16 +260,20 @@ class Processor(ABC):
                                 the accuracy
             label_set (str, optional): The label set from which to evaluate
                                 all classifiers.
+            compare_full_retrain (bool, optional): If true, classifiers which were warm started
+                                from a previous model are compared with a model trained from
+                                scratch, and the accuracy of both is printed.
         """
-        self._evaluate(print_stats, label_set)
+        self._evaluate(print_stats, label_set, compare_full_retrain=compare_full_retrain)
 
         for child in self._children.values():
-            child.evaluate(print_stats, label_set=label_set)
+            child.evaluate(print_stats, label_set=label_set,
+                           compare_full_retrain=compare_full_retrain)
 
         self.resource_loader.query_cache.dump()
 
     @abstractmethod
-    def _evaluate(self, print_stats, label_set="test"):
+    def _evaluate(self, print_stats, label_set="test", compare_full_retrain=False):
         raise NotImplementedError
 
     def _check_ready(self):
@@ -216,7 +281,8 @@ class Processor(ABC):
             raise ProcessorError('Processor not ready, models must be built or loaded first.')
 
     def process(self, query_text, allowed_nlp_classes=None, language=None, time_zone=None,
-                timestamp=None, dynamic_resource=None, verbose=False):
+                timestamp=None, dynamic_resource=None, verbose=False, stop_at=None,
+                confidence_threshold=None):
         """Processes the given query using the full hierarchy of natural language processing models \
         trained for this application.
 
@@ -235,6 +301,10 @@ class Processor(ABC):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'domain'``, \
+                ``'intent'``, ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the domain or intent \
+                prediction is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -243,9 +313,12 @@ class Processor(ABC):
         """
         query = self.create_query(
             query_text, language=language, time_zone=time_zone, timestamp=timestamp)
-        return self.process_query(query, allowed_nlp_classes, dynamic_resource, verbose).to_dict()
+        return self.process_query(query, allowed_nlp_classes, dynamic_resource, verbose,
+                                  stop_at=stop_at,
+                                  confidence_threshold=confidence_threshold).to_dict()
 
-    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False):
+    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False,
+                      stop_at=None, confidence_threshold=None):
         """Processes the given query using the full hierarchy of natural language processing models \
         trained for this application.
 
@@ -258,6 +331,10 @@ class Processor(ABC):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference \
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'domain'``, \
+                ``'intent'``, ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the domain or intent \
+                prediction is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -266,6 +343,23 @@ class Processor(ABC):
         """
         raise NotImplementedError
 
+    @staticmethod
+    def _get_stop_stage(stop_at):
+        """Validates the stage at which processing should stop."""
+        if stop_at is None:
+            return FULL_STAGE
+        if stop_at not in NLP_STAGES:
+            raise ValueError('Invalid stop_at value {!r}, expected one of {}'.format(
+                stop_at, ', '.join(NLP_STAGES)))
+        return stop_at
+
+    @staticmethod
+    def _is_below_threshold(label, probas, confidence_threshold):
+        """Checks whether the confidence of the predicted label is below the threshold."""
+        if confidence_threshold is None or not probas:
+            return False
+        return dict(probas).get(label, 0.0) < confidence_threshold
+
     def _process_list(self, items, func, *args, **kwargs):
         """Processes a list of items in parallel if possible using the executor.
         Args:
@@ -379,6 +473,52 @@ class NaturalLanguageProcessor(Processor):
         """The domains supported by this application."""
         return self._children
 
+    def load(self, incremental_timestamp=None, lazy=None):  # pylint: disable=arguments-differ
+        """Loads all the natural language processing models for this processor and its children
+        from disk.
+
+        In lazy mode, the entity recognizers, role classifiers and entity resolvers of each
+        intent are only loaded the first time a query is processed for that intent. The
+        ``lazy_load`` key of the NLP config controls lazy loading::
+
+            NLP_CONFIG = {
+                'lazy_load': {
+                    'max_loaded_intents': 50,
+                    'preload_intents': ['store_info.get_store_hours', 'greeting.*']
+                }
+            }
+
+        ``max_loaded_intents`` limits how many intents have their models in memory at once, the
+        least recently used intents are unloaded first. The intents in ``preload_intents`` are
+        loaded immediately and never unloaded.
+
+        Args:
+            incremental_timestamp (str, optional): The incremental timestamp value.
+            lazy (bool, optional): Whether to load the intent models lazily. If omitted, lazy
+                loading is enabled when the NLP config has a ``lazy_load`` key.
+        """
+        lazy_config = self.config.get('lazy_load')
+        if lazy is None:
+            lazy = lazy_config is not None
+        lazy_config = lazy_config or {}
+
+        model_cache = None
+        if lazy:
+            model_cache = IntentModelCache(lazy_config.get('max_loaded_intents'))
+        for domain_processor in self.domains.values():
+            for intent_processor in domain_processor.intents.values():
+                intent_processor.model_cache = model_cache
+
+        super().load(incremental_timestamp=incremental_timestamp)
+
+        if lazy:
+            preload_intents = self.extract_allowed_intents(lazy_config.get('preload_intents', []))
+            for domain, intents in preload_intents.items():
+                for intent in intents:
+                    intent_processor = self.domains[domain].intents[intent]
+                    model_cache.pin(intent_processor)
+                    intent_processor.load_models()
+
     def _build(self, incremental=False, label_set=None):
         if incremental:
             # During an incremental build, we set the incremental_timestamp for caching
@@ -409,11 +549,16 @@ class NaturalLanguageProcessor(Processor):
 
         self.domain_classifier.load(incremental_model_path if incremental_timestamp else model_path)
 
-    def _evaluate(self, print_stats, label_set=None):
+    def _evaluate(self, print_stats, label_set=None, compare_full_retrain=False):
         if len(self.domains) > 1:
-            domain_eval = self.domain_classifier.evaluate(label_set=label_set)
+            domain_eval = self.domain_classifier.evaluate(
+                label_set=label_set, compare_full_retrain=compare_full_retrain)
             if domain_eval:
                 print("Domain classification accuracy: '{}'".format(domain_eval.get_accuracy()))
+                if domain_eval.full_retrain_accuracy is not None:
+                    print("Domain classification accuracy of the warm started model: '{}', of a "
+                          "full retrain: '{}'".format(domain_eval.get_accuracy(),
+                                                      domain_eval.full_retrain_accuracy))
                 if print_stats:
                     domain_eval.print_stats()
             else:
@@ -458,7 +603,8 @@ class NaturalLanguageProcessor(Processor):
                 domain_proba = [(domain, 1.0)]
             return domain, domain_proba
 
-    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False):
+    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False,
+                      stop_at=None, confidence_threshold=None):
         """Processes the given query using the full hierarchy of natural language processing models \
         trained for this application.
 
@@ -473,6 +619,10 @@ class NaturalLanguageProcessor(Processor):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'domain'``, \
+                ``'intent'``, ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the domain or intent \
+                prediction is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -484,17 +634,22 @@ class NaturalLanguageProcessor(Processor):
             top_query = query[0]
         else:
             top_query = query
-        domain, domain_proba = self._process_domain(top_query,
-                                                    allowed_nlp_classes=allowed_nlp_classes,
-                                                    dynamic_resource=dynamic_resource,
-                                                    verbose=verbose)
-
-        allowed_intents = allowed_nlp_classes.get(domain) if allowed_nlp_classes else None
-
-        processed_query = self.domains[domain].process_query(
-            query, allowed_intents, dynamic_resource=dynamic_resource, verbose=verbose)
-        processed_query.domain = domain
-        if domain_proba:
+        stop_at = self._get_stop_stage(stop_at)
+        domain, domain_proba = self._process_domain(
+            top_query, allowed_nlp_classes=allowed_nlp_classes,
+            dynamic_resource=dynamic_resource,
+            verbose=verbose or confidence_threshold is not None)
+
+        if stop_at == DOMAIN_STAGE or \
+                self._is_below_threshold(domain, domain_proba, confidence_threshold):
+            processed_query = ProcessedQuery(top_query, domain=domain, entities=[])
+        else:
+            allowed_intents = allowed_nlp_classes.get(domain) if allowed_nlp_classes else None
+            processed_query = self.domains[domain].process_query(
+                query, allowed_intents, dynamic_resource=dynamic_resource, verbose=verbose,
+                stop_at=stop_at, confidence_threshold=confidence_threshold)
+            processed_query.domain = domain
+        if verbose and domain_proba:
             domain_scores = dict(domain_proba)
             scores = processed_query.confidence or {}
             scores["domains"] = domain_scores
@@ -571,7 +726,9 @@ class NaturalLanguageProcessor(Processor):
                 allowed_intents=None,
                 language=None, time_zone=None, timestamp=None,
                 dynamic_resource=None,
-                verbose=False):
+                verbose=False,
+                stop_at=None,
+                confidence_threshold=None):
         """Processes the given query using the full hierarchy of natural language processing models \
         trained for this application.
 
@@ -592,6 +749,10 @@ class NaturalLanguageProcessor(Processor):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'domain'``, \
+                ``'intent'``, ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the domain or intent \
+                prediction is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -605,7 +766,8 @@ class NaturalLanguageProcessor(Processor):
         return super().process(query_text, allowed_nlp_classes=allowed_nlp_classes,
                                language=language, time_zone=time_zone,
                                timestamp=timestamp, dynamic_resource=dynamic_resource,
-                               verbose=verbose)
+                               verbose=verbose, stop_at=stop_at,
+                               confidence_threshold=confidence_threshold)
 
 
 class DomainProcessor(Processor):
@@ -662,12 +824,18 @@ class DomainProcessor(Processor):
 
         self.intent_classifier.load(incremental_model_path if incremental_timestamp else model_path)
 
-    def _evaluate(self, print_stats, label_set="test"):
+    def _evaluate(self, print_stats, label_set="test", compare_full_retrain=False):
         if len(self.intents) > 1:
-            intent_eval = self.intent_classifier.evaluate(label_set=label_set)
+            intent_eval = self.intent_classifier.evaluate(
+                label_set=label_set, compare_full_retrain=compare_full_retrain)
             if intent_eval:
                 print("Intent classification accuracy for the '%s' domain: %s",
                       self.name, intent_eval.get_accuracy())
+                if intent_eval.full_retrain_accuracy is not None:
+                    print("Intent classification accuracy for the '{}' domain of the warm started "
+                          "model: {}, of a full retrain: {}".format(
+                              self.name, intent_eval.get_accuracy(),
+                              intent_eval.full_retrain_accuracy))
                 if print_stats:
                     intent_eval.print_stats()
             else:
@@ -675,7 +843,8 @@ class DomainProcessor(Processor):
 
     def process(self, query_text,  # pylint: disable=arguments-differ
                 allowed_nlp_classes=None,
-                time_zone=None, timestamp=None, dynamic_resource=None, verbose=False):
+                time_zone=None, timestamp=None, dynamic_resource=None, verbose=False,
+                stop_at=None, confidence_threshold=None):
         """Processes the given input text using the hierarchy of natural language processing models \
         trained for this domain.
 
@@ -696,6 +865,10 @@ class DomainProcessor(Processor):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'intent'``, \
+                ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the intent prediction \
+                is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -703,11 +876,14 @@ class DomainProcessor(Processor):
         """
         query = self.create_query(query_text, time_zone=time_zone, timestamp=timestamp)
         processed_query = self.process_query(query, allowed_nlp_classes=allowed_nlp_classes,
-                                             dynamic_resource=dynamic_resource, verbose=verbose)
+                                             dynamic_resource=dynamic_resource, verbose=verbose,
+                                             stop_at=stop_at,
+                                             confidence_threshold=confidence_threshold)
         processed_query.domain = self.name
         return processed_query.to_dict()
 
-    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False):
+    def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False,
+                      stop_at=None, confidence_threshold=None):
         """Processes the given query using the full hierarchy of natural language processing models \
         trained for this application.
 
@@ -721,6 +897,10 @@ class DomainProcessor(Processor):
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class probabilities along with class \
                 prediction.
+            stop_at (str, optional): The last stage of the pipeline to run, one of ``'intent'``, \
+                ``'entities'`` or ``'full'``. Defaults to ``'full'``.
+            confidence_threshold (float, optional): If the confidence of the intent prediction \
+                is below this value, the deeper stages of the pipeline are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -734,11 +914,13 @@ class DomainProcessor(Processor):
         else:
             top_query = query
 
+        stop_at = self._get_stop_stage(stop_at)
+        need_proba = verbose or confidence_threshold is not None
         intent_proba = None
         if len(self.intents) > 1:
             # Check if the user has specified allowed intents
             if not allowed_nlp_classes:
-                if verbose:
+                if need_proba:
                     intent_proba = self.intent_classifier.predict_proba(
                         top_query, dynamic_resource=dynamic_resource)
                     intent = intent_proba[0][0]
@@ -748,12 +930,12 @@ class DomainProcessor(Processor):
             else:
                 if len(allowed_nlp_classes) == 1:
                     intent = list(allowed_nlp_classes.keys())[0]
-                    if verbose:
+                    if need_proba:
                         intent_proba = [(intent, 1.0)]
                 else:
                     sorted_intents = self.intent_classifier.predict_proba(top_query)
                     intent = None
-                    if verbose:
+                    if need_proba:
                         intent_proba = sorted_intents
                     for ordered_intent, _ in sorted_intents:
                         if ordered_intent in allowed_nlp_classes.keys():
@@ -765,12 +947,17 @@ class DomainProcessor(Processor):
                             'Could not find user inputted intent in NLP hierarchy')
         else:
             intent = list(self.intents.keys())[0]
-            if verbose:
+            if need_proba:
                 intent_proba = [(intent, 1.0)]
-        processed_query = self.intents[intent].process_query(
-            query, dynamic_resource=dynamic_resource, verbose=verbose)
-        processed_query.intent = intent
-        if intent_proba:
+
+        if stop_at in (DOMAIN_STAGE, INTENT_STAGE) or \
+                self._is_below_threshold(intent, intent_proba, confidence_threshold):
+            processed_query = ProcessedQuery(top_query, intent=intent, entities=[])
+        else:
+            processed_query = self.intents[intent].process_query(
+                query, dynamic_resource=dynamic_resource, verbose=verbose, stop_at=stop_at)
+            processed_query.intent = intent
+        if verbose and intent_proba:
             intent_scores = dict(intent_proba)
             scores = processed_query.confidence or {}
             scores["intents"] = intent_scores
@@ -825,6 +1012,12 @@ class IntentProcessor(Processor):
 
         self._nbest_transcripts_enabled = False
 
+        self.model_cache = None
+        self._models_pending = False
+        self._pending_timestamp = None
+        self._active_queries = 0
+        self._models_lock = threading.RLock()
+
     @property
     def entities(self):
         """The entity types associated with this intent (list)."""
@@ -853,6 +1046,7 @@ class IntentProcessor(Processor):
             processor = EntityProcessor(self._app_path, self.domain, self.name, entity_type,
                                         self.resource_loader)
             self._children[entity_type] = processor
+        self._models_pending = False
 
     def _dump(self):
         model_path, incremental_model_path = path.get_entity_model_paths(
@@ -860,6 +1054,79 @@ class IntentProcessor(Processor):
 
         self.entity_recognizer.dump(model_path, incremental_model_path=incremental_model_path)
 
+    def load(self, incremental_timestamp=None):
+        """Loads the models for this intent and its entity types from disk. If this processor has
+        a model cache, loading is deferred until the models are first used.
+
+        Args:
+            incremental_timestamp (str, optional): The incremental timestamp value.
+        """
+        if self.model_cache is None:
+            super().load(incremental_timestamp=incremental_timestamp)
+            return
+
+        with self._models_lock:
+            self._reset_models()
+            self._pending_timestamp = incremental_timestamp
+        self.ready = True
+        self.dirty = False
+
+    def load_models(self):
+        """Loads the models for this intent if their loading was deferred, and marks them as
+        recently used."""
+        with self._models_lock:
+            self._load_pending_models()
+        # The cache must not be touched while holding the models lock, since it may need to
+        # acquire the models lock of other intents to unload them
+        if self.model_cache is not None:
+            self.model_cache.touch(self)
+
+    def _load_pending_models(self):
+        if self._models_pending:
+            logger.info("Lazily loading models for the '%s.%s' intent", self.domain, self.name)
+            super().load(incremental_timestamp=self._pending_timestamp)
+            self._models_pending = False
+
+    def unload_models(self, force=False):
+        """Releases the models for this intent. They will be loaded again on next use.
+
+        Args:
+            force (bool, optional): Unload the models even if a query is being processed.
+
+        Returns:
+            bool: Whether the models were unloaded.
+        """
+        with self._models_lock:
+            if self._active_queries and not force:
+                return False
+            logger.info("Unloading models for the '%s.%s' intent", self.domain, self.name)
+            self._reset_models()
+            return True
+
+    def _reset_models(self):
+        self.entity_recognizer = EntityRecognizer(self.resource_loader, self.domain, self.name)
+        self._children = Bunch()
+        self._models_pending = True
+
+    def _acquire_models(self):
+        """Loads the models for this intent if needed and keeps them from being unloaded until
+        :meth:`_release_models` is called.
+
+        Returns:
+            (tuple): The entity recognizer and the entity processors of this intent
+        """
+        with self._models_lock:
+            self._load_pending_models()
+            self._active_queries += 1
+            models = self.entity_recognizer, self.entities
+        if self.model_cache is not None:
+            self.model_cache.touch(self)
+        return models
+
+    def _release_models(self):
+        with self._models_lock:
+            self._active_queries -= 1
+
     def _load(self, incremental_timestamp=None):
         model_path, incremental_model_path = path.get_entity_model_paths(
             self._app_path, self.domain, self.name, timestamp=incremental_timestamp)
@@ -872,7 +1139,10 @@ class IntentProcessor(Processor):
                                         self.resource_loader)
             self._children[entity_type] = processor
 
-    def _evaluate(self, print_stats, label_set="test"):
+    def _evaluate(self, print_stats, label_set="test", compare_full_retrain=False):
+        # entity recognizers are not warm started
+        del compare_full_retrain
+        self.load_models()
         if len(self.entity_recognizer.entity_types) > 1:
             entity_eval = self.entity_recognizer.evaluate(label_set=label_set)
             if entity_eval:
@@ -885,7 +1155,8 @@ class IntentProcessor(Processor):
                             self.domain, self.name)
 
     def process(self, query_text,  # pylint: disable=arguments-differ
-                time_zone=None, timestamp=None, dynamic_resource=None, verbose=False):
+                time_zone=None, timestamp=None, dynamic_resource=None, verbose=False,
+                stop_at=None):
         """Processes the given input text using the hierarchy of natural language processing models
         trained for this intent.
 
@@ -898,45 +1169,57 @@ class IntentProcessor(Processor):
             timestamp (long, optional): A unix time stamp for the request (in seconds).
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If True, returns class as well as predict probabilities.
+            stop_at (str, optional): The last stage of the pipeline to run. If ``'entities'``, \
+                role classification, entity resolution and parsing are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
                 applying the hierarchy of natural language processing models to the input text.
         """
         query = self.create_query(query_text, time_zone=time_zone, timestamp=timestamp)
-        processed_query = self.process_query(query, dynamic_resource=dynamic_resource)
+        processed_query = self.process_query(query, dynamic_resource=dynamic_resource,
+                                             stop_at=stop_at)
         processed_query.domain = self.domain
         processed_query.intent = self.name
         return processed_query.to_dict()
 
-    def _recognize_entities(self, query, dynamic_resource=None, verbose=False):
+    def _recognize_entities(self, query, dynamic_resource=None, verbose=False,
+                            entity_recognizer=None):
         """Calls the entity recognition component.
 
         Args:
             query (Query, tuple): The user input query, or a list of the n-best transcripts
                 query objects.
             verbose (bool, optional): If True returns class as well as confidence scores.
+            entity_recognizer (EntityRecognizer, optional): The entity recognizer acquired for
+                the query. If not given, the models of the intent are loaded.
         Returns:
             (list): A list of lists of the QueryEntity objects for each transcript.
         """
+        if entity_recognizer is None:
+            self.load_models()
+            entity_recognizer = self.entity_recognizer
         if isinstance(query, (list, tuple)):
             if self.nbest_transcripts_enabled:
+                kwargs = {'dynamic_resource': dynamic_resource, 'verbose': verbose}
+                if not executor:
+                    # models are only passed along in process, subprocesses load their own
+                    kwargs['entity_recognizer'] = entity_recognizer
                 nbest_transcripts_entities = self._process_list(
-                    query, '_recognize_entities', **{'dynamic_resource': dynamic_resource,
-                                                     'verbose': verbose})
+                    query, '_recognize_entities', **kwargs)
                 return nbest_transcripts_entities
             else:
                 if verbose:
-                    return [self.entity_recognizer.predict_proba(
+                    return [entity_recognizer.predict_proba(
                         query[0], dynamic_resource=dynamic_resource)]
                 else:
-                    return [self.entity_recognizer.predict(
+                    return [entity_recognizer.predict(
                         query[0], dynamic_resource=dynamic_resource)]
         if verbose:
-            return self.entity_recognizer.predict_proba(
+            return entity_recognizer.predict_proba(
                 query, dynamic_resource=dynamic_resource)
         else:
-            return self.entity_recognizer.predict(query, dynamic_resource=dynamic_resource)
+            return entity_recognizer.predict(query, dynamic_resource=dynamic_resource)
 
     def _align_entities(self, entities):
         """If n-best transcripts is enabled, align the spans across transcripts.
@@ -985,17 +1268,39 @@ class IntentProcessor(Processor):
                             break
         return aligned_entities
 
-    def _classify_and_resolve_entities(self, idx, query, processed_entities, aligned_entities,
-                                       verbose=False):
+    def _classify_entities(self, idx, query, processed_entities, verbose=False,
+                           entity_processors=None):
+        if entity_processors is None:
+            self.load_models()
+            entity_processors = self.entities
         entity = processed_entities[idx]
         # Run the role classification
-        entity, role_confidence = self.entities[entity.entity.type].process_entity(
+        entity, role_confidence = entity_processors[entity.entity.type].process_entity(
             query, processed_entities, idx, verbose)
-        # Run the entity resolution
-        entity = self.entities[entity.entity.type].resolve_entity(entity, aligned_entities[idx])
         return [entity, role_confidence]
 
-    def _process_entities(self, query, entities, aligned_entities, verbose=False):
+    def _resolve_entities(self, entities, aligned_entities, entity_processors):
+        """Resolves all the entities in a query together, so that the entity resolvers can
+        answer them with a single request to Elasticsearch.
+
+        Args:
+            entities (list of QueryEntity): The entities to resolve
+            aligned_entities (list of lists of QueryEntity): A list of lists of entity objects,
+                where each list is a group of spans that represent the same canonical entity
+            entity_processors (Bunch): The entity processors acquired for the query
+
+        Returns:
+            list (QueryEntity): The entities populated with their resolved values
+        """
+        requests = [entity_processors[entity.entity.type].get_resolution_request(entity, spans)
+                    for entity, spans in zip(entities, aligned_entities)]
+        values = EntityResolver.predict_batch(requests)
+        for entity, value in zip(entities, values):
+            entity.entity.value = value
+        return entities
+
+    def _process_entities(self, query, entities, aligned_entities, entity_processors,
+                          verbose=False):
         """
 
         Args:
@@ -1005,6 +1310,7 @@ class IntentProcessor(Processor):
                 where each list is the recognized entities for the nth query
             aligned_entities (list of lists of QueryEntity): A list of lists of entity objects,
                 where each list is a group of spans that represent the same canonical entity
+            entity_processors (Bunch): The entity processors acquired for the query
 
         Returns:
             list (QueryEntity): Returns a list of processed entity objects
@@ -1013,23 +1319,29 @@ class IntentProcessor(Processor):
             query = query[0]
 
         processed_entities = [deepcopy(e) for e in entities[0]]
+        args = [query, processed_entities, verbose]
+        if not executor:
+            # models are only passed along in process, subprocesses load their own
+            args.append(entity_processors)
         processed_entities_conf = self._process_list([i for i in range(len(processed_entities))],
-                                                     '_classify_and_resolve_entities',
-                                                     *[query, processed_entities, aligned_entities,
-                                                       verbose])
+                                                     '_classify_entities', *args)
         if processed_entities_conf:
             processed_entities, role_confidence = [list(tup)
                                                    for tup in zip(*processed_entities_conf)]
         else:
             role_confidence = []
+        # Run the entity resolution
+        processed_entities = self._resolve_entities(processed_entities, aligned_entities,
+                                                    entity_processors)
         # Run the entity parsing
         processed_entities = self.parser.parse_entities(query, processed_entities) \
             if self.parser else processed_entities
         return processed_entities, role_confidence
 
-    def _get_pred_entities(self, query, dynamic_resource=None, verbose=False):
+    def _get_pred_entities(self, query, dynamic_resource=None, verbose=False,
+                           entity_recognizer=None):
         entities = self._recognize_entities(query, dynamic_resource=dynamic_resource,
-                                            verbose=verbose)
+                                            verbose=verbose, entity_recognizer=entity_recognizer)
         pred_entities = entities[0]
         entity_confidence = []
         if verbose and len(pred_entities) > 0:
@@ -1039,7 +1351,8 @@ class IntentProcessor(Processor):
             return entity_confidence, [_pred_entities]
         return entity_confidence, entities
 
-    def process_query(self, query, dynamic_resource=None, verbose=False):
+    def process_query(self, query, dynamic_resource=None, verbose=False,
+                      stop_at=None):
         """Processes the given query using the hierarchy of natural language processing models \
         trained for this intent.
 
@@ -1048,6 +1361,8 @@ class IntentProcessor(Processor):
                 query objects.
             dynamic_resource (dict, optional): A dynamic resource to aid NLP inference.
             verbose (bool, optional): If ``True``, returns class as well as predict probabilities.
+            stop_at (str, optional): The last stage of the pipeline to run. If ``'entities'``, \
+                role classification, entity resolution and parsing are skipped.
 
         Returns:
             (ProcessedQuery): A processed query object that contains the prediction results from \
@@ -1063,12 +1378,21 @@ class IntentProcessor(Processor):
         else:
             query = (query,)
 
-        entity_confidence, entities = self._get_pred_entities(
-            query, dynamic_resource=dynamic_resource, verbose=verbose)
+        # The models are acquired once for the whole query and passed to each stage
+        entity_recognizer, entity_processors = self._acquire_models()
+        try:
+            entity_confidence, entities = self._get_pred_entities(
+                query, dynamic_resource=dynamic_resource, verbose=verbose,
+                entity_recognizer=entity_recognizer)
 
-        aligned_entities = self._align_entities(entities)
-        processed_entities, role_confidence = self._process_entities(query, entities,
-                                                                     aligned_entities, verbose)
+            aligned_entities = self._align_entities(entities)
+            if self._get_stop_stage(stop_at) == ENTITIES_STAGE:
+                processed_entities, role_confidence = list(entities[0]), []
+            else:
+                processed_entities, role_confidence = self._process_entities(
+                    query, entities, aligned_entities, entity_processors, verbose)
+        finally:
+            self._release_models()
 
         confidence = {'entities': entity_confidence, 'roles': role_confidence} if verbose else {}
 
@@ -1133,7 +1457,9 @@ class EntityProcessor(Processor):
         self.role_classifier.load(incremental_model_path if incremental_timestamp else model_path)
         self.entity_resolver.load()
 
-    def _evaluate(self, print_stats, label_set="test"):
+    def _evaluate(self, print_stats, label_set="test", compare_full_retrain=False):
+        # role classifiers are not warm started
+        del compare_full_retrain
         if len(self.role_classifier.roles) > 1:
             role_eval = self.role_classifier.evaluate(label_set=label_set)
             if role_eval:
@@ -1190,13 +1516,28 @@ class EntityProcessor(Processor):
         Returns:
             (Entity): The entity populated with the resolved values.
         """
+        resolver, entity_list = self.get_resolution_request(entity, aligned_entity_spans)
+        entity.entity.value = resolver.predict(entity_list)
+        return entity
+
+    def get_resolution_request(self, entity, aligned_entity_spans=None):
+        """Gets the entity resolver and the entities to resolve for a single entity, so that the
+        resolution of several entities can be batched with ``EntityResolver.predict_batch``.
+
+        Args:
+            entity (QueryEntity): The entity to process.
+            aligned_entity_spans (list[QueryEntity]): The list of aligned n-best entity spans
+                to improve resolution.
+
+        Returns:
+            (tuple): The entity resolver and the list of entities to resolve.
+        """
         self._check_ready()
         if aligned_entity_spans:
             entity_list = [e.entity for e in aligned_entity_spans]
         else:
             entity_list = [entity.entity]
-        entity.entity.value = self.entity_resolver.predict(entity_list)
-        return entity
+        return self.entity_resolver, entity_list
 
     def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False):
         """Not implemented"""
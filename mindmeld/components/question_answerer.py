@@ -15,27 +15,114 @@
 This module contains the question answerer component of MindMeld.
 """
 from abc import ABC, abstractmethod
+import codecs
 
 import json
 import logging
 import copy
+import os
+import re
+import threading
+import time
+
 from elasticsearch5 import TransportError, ElasticsearchException,\
     ConnectionError as EsConnectionError
+from tqdm import tqdm
 
 from ._config import get_app_namespace, DOC_TYPE, DEFAULT_ES_QA_MAPPING, DEFAULT_RANKING_CONFIG
-from ._elasticsearch_helpers import (create_es_client, load_index, get_scoped_index_name,
-                                     does_index_exist)
+from ._elasticsearch_helpers import (get_es_client, get_es_host, load_index, get_scoped_index_name,
+                                     does_index_exist, get_index_names, run_es_request_async,
+                                     DEFAULT_BULK_THREAD_COUNT,
+                                     DEFAULT_BULK_CHUNK_SIZE, DEFAULT_BULK_MAX_CHUNK_BYTES)
+from ._local_knowledge_base import LocalKnowledgeBase
 
+from .. import path
 from ..resource_loader import ResourceLoader
 from ..exceptions import KnowledgeBaseError, KnowledgeBaseConnectionError
 
 logger = logging.getLogger(__name__)
 
+# the number of seconds for which knowledge base field information and statistics are cached
+FIELD_STATS_TTL = 300
+
+# the number of bytes of a json data file which are decoded at a time when loading it
+DATA_FILE_READ_SIZE = 1024 * 1024
+
+# the stores which can hold knowledge base indexes
+ELASTICSEARCH_KB_BACKEND = 'elasticsearch'
+LOCAL_KB_BACKEND = 'local'
+KB_BACKENDS = (ELASTICSEARCH_KB_BACKEND, LOCAL_KB_BACKEND)
+
+
+class FieldStatsCache:
+    """A cache of knowledge base field statistics, which expire after a time to live.
+
+    Args:
+        ttl (float): The number of seconds for which statistics are cached
+    """
+
+    def __init__(self, ttl=FIELD_STATS_TTL):
+        self.ttl = ttl
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, es_host, index, field):
+        """Gets the cached statistics of a field.
+
+        Args:
+            es_host (str): The Elasticsearch host of the index, or None for the local knowledge
+                base
+            index (str): The scoped index name
+            field (str): The field name
+
+        Returns:
+            dict: The field statistics, or None if they are not cached or have expired
+        """
+        with self._lock:
+            entry = self._stats.get((es_host, index, field))
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            return None
+        return dict(entry[1])
+
+    def set(self, es_host, index, field, stats):
+        """Caches the statistics of a field.
+
+        Args:
+            es_host (str): The Elasticsearch host of the index, or None for the local knowledge
+                base
+            index (str): The scoped index name
+            field (str): The field name
+            stats (dict): The field statistics
+        """
+        with self._lock:
+            self._stats[(es_host, index, field)] = (time.time(), dict(stats))
+
+    def invalidate(self, es_host, index):
+        """Removes the cached statistics of all fields of an index.
+
+        Args:
+            es_host (str): The Elasticsearch host of the index, or None for the local knowledge
+                base
+            index (str): The scoped index name
+        """
+        with self._lock:
+            for key in [key for key in self._stats if key[:2] == (es_host, index)]:
+                del self._stats[key]
+
 
 class QuestionAnswerer:
     """The question answerer is primarily an information retrieval system that provides all the
     necessary functionality for interacting with the application's knowledge base.
     """
+    # the load time and knowledge base field information of each scoped index, keyed by the
+    # Elasticsearch host (None for the local knowledge base) and the scoped index name, and shared
+    # by all question answerers
+    _field_info_cache = {}
+
+    # the indexes loaded into process memory with the local backend. Searches against these
+    # indexes do not use Elasticsearch.
+    _local_kb = LocalKnowledgeBase()
+
     def __init__(self, app_path, resource_loader=None, es_host=None):
         """Initializes a question answerer
 
@@ -47,14 +134,18 @@ class QuestionAnswerer:
         self._resource_loader = resource_loader or ResourceLoader.create_resource_loader(app_path)
         self._es_host = es_host
         self.__es_client = None
+        self._es_client_lock = threading.Lock()
+        self._app_path = app_path
         self._app_namespace = get_app_namespace(app_path)
-        self._es_field_info = {}
+        self._es_field_info = QuestionAnswerer._field_info_cache
 
     @property
     def _es_client(self):
-        # Lazily connect to Elasticsearch
-        if self.__es_client is None:
-            self.__es_client = create_es_client(self._es_host)
+        # Lazily connect to Elasticsearch. The client and its connection pool are shared with the
+        # other components of the process and by concurrent async lookups.
+        with self._es_client_lock:
+            if self.__es_client is None:
+                self.__es_client = get_es_client(self._es_host)
         return self.__es_client
 
     def get(self, index, size=10, **kwargs):
@@ -134,6 +225,26 @@ class QuestionAnswerer:
         results = s.execute(size=size)
         return results
 
+    async def get_async(self, index, size=10, **kwargs):
+        """Gets a collection of documents from the knowledge base matching the provided
+        search criteria without blocking the event loop. This is the coroutine version of
+        :meth:`get` for async dialogue handlers, so that concurrent conversations overlap their
+        knowledge base requests.
+
+        Examples:
+
+            >>> await question_answerer.get_async(index='menu_items', name='pork and shrimp')
+
+        Args:
+            index (str): The name of an index.
+            size (int): The maximum number of records, default to 10.
+            **kwargs: The search criteria, as in :meth:`get`.
+
+        Returns:
+            list: A list of matching documents.
+        """
+        return await run_es_request_async(self.get, index, size=size, **kwargs)
+
     def build_search(self, index, ranking_config=None):
         """Build a search object for advanced filtered search.
 
@@ -144,48 +255,110 @@ class QuestionAnswerer:
             Search: a Search object for filtered search.
         """
 
-        if not does_index_exist(app_namespace=self._app_namespace, index_name=index):
-            raise ValueError('Knowledge base index \'{}\' does not exist.'.format(index))
-
-        # get index name with app scope
-        index = get_scoped_index_name(self._app_namespace, index)
-
-        # load knowledge base field information for the specified index.
-        self._load_field_info(index)
+        scoped_index = get_scoped_index_name(self._app_namespace, index)
+
+        if self._local_kb.does_index_exist(scoped_index):
+            field_info = self._get_cached_field_info(None, scoped_index)
+            if field_info is None:
+                field_info = {name: FieldInfo(name, field_type) for name, field_type
+                              in self._local_kb.get_field_types(scoped_index).items()}
+                self._es_field_info[(None, scoped_index)] = (time.time(), field_info)
+            return Search(client=self._local_kb,
+                          index=scoped_index,
+                          ranking_config=ranking_config,
+                          field_info=field_info)
+
+        # indices with recently loaded field information are known to exist
+        es_host = get_es_host(self._es_host)
+        field_info = self._get_cached_field_info(es_host, scoped_index)
+        if field_info is None:
+            if not does_index_exist(app_namespace=self._app_namespace, index_name=index,
+                                    es_client=self._es_client):
+                self._es_field_info.pop((es_host, scoped_index), None)
+                raise ValueError('Knowledge base index \'{}\' does not exist.'.format(index))
+
+            # load knowledge base field information for the specified index.
+            field_info = self._load_field_info(scoped_index)
 
         return Search(client=self._es_client,
-                      index=index,
+                      index=scoped_index,
                       ranking_config=ranking_config,
-                      field_info=self._es_field_info[index])
+                      field_info=field_info,
+                      es_host=es_host)
+
+    def _get_cached_field_info(self, es_host, index):
+        """Gets the cached field information of an index. Field information expires like the
+        field statistics, so that changes to the index by other processes are picked up.
+
+        Args:
+            es_host (str): The Elasticsearch host of the index, or None for the local knowledge
+                base
+            index (str): The scoped index name
+
+        Returns:
+            dict: The field information, or None if it is not cached or has expired
+        """
+        load_time, field_info = self._es_field_info.get((es_host, index), (0, None))
+        if field_info is None or time.time() - load_time >= FIELD_STATS_TTL:
+            return None
+        return field_info
 
     def _load_field_info(self, index):
         """load knowledge base field metadata information for the specified index.
 
         Args:
             index (str): index name.
+
+        Returns:
+            dict: The field information of the index
         """
+        index_info = {}
+        try:
+            # TODO: move the ES API call logic to ES helper
+            res = self._es_client.indices.get(index=index)
+            all_field_info = res[index]['mappings']['document']['properties']
+            for field_name in all_field_info:
+                field_type = all_field_info[field_name].get('type')
+                index_info[field_name] = FieldInfo(field_name, field_type)
+            self._es_field_info[(get_es_host(self._es_host), index)] = (time.time(), index_info)
+            return index_info
+        except EsConnectionError as e:
+            logger.error('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
+            raise KnowledgeBaseConnectionError(es_host=self._es_client.transport.hosts)
+        except TransportError as e:
+            logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
+                         'Status code: %s details: %s', e.error, e.status_code, e.info)
+            raise KnowledgeBaseError
+        except ElasticsearchException:
+            raise KnowledgeBaseError
 
-        # load field info from local cache
-        index_info = self._es_field_info.get(index, {})
+    def load(self):
+        """Loads the field information of all knowledge base indexes of the app, so that the first
+        searches against them do not have to fetch it from Elasticsearch.
+        """
+        try:
+            index_names = path.get_indexes(self._app_path)
+        except (OSError, StopIteration):
+            # the app has no knowledge base indexes
+            return
+
+        scoped_index_names = [get_scoped_index_name(self._app_namespace, index_name)
+                              for index_name in index_names]
+        scoped_index_names = [index for index in scoped_index_names
+                              if not self._local_kb.does_index_exist(index)]
+        if not scoped_index_names:
+            return
 
-        if not index_info:
-            try:
-                # TODO: move the ES API call logic to ES helper
-                self._es_field_info[index] = {}
-                res = self._es_client.indices.get(index=index)
-                all_field_info = res[index]['mappings']['document']['properties']
-                for field_name in all_field_info:
-                    field_type = all_field_info[field_name].get('type')
-                    self._es_field_info[index][field_name] = FieldInfo(field_name, field_type)
-            except EsConnectionError as e:
-                logger.error('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
-                raise KnowledgeBaseConnectionError(es_host=self._es_client.transport.hosts)
-            except TransportError as e:
-                logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
-                             'Status code: %s details: %s', e.error, e.status_code, e.info)
-                raise KnowledgeBaseError
-            except ElasticsearchException:
-                raise KnowledgeBaseError
+        try:
+            # check the existence of all indexes with a single request
+            existing_index_names = get_index_names(self._app_namespace,
+                                                   es_client=self._es_client)
+            for scoped_index_name in scoped_index_names:
+                if scoped_index_name in existing_index_names:
+                    self._load_field_info(scoped_index_name)
+        except (KnowledgeBaseConnectionError, KnowledgeBaseError):
+            logger.warning('Unable to load the field information of the knowledge base indexes '
+                           'of app %r', self._app_namespace)
 
     def config(self, config):
         """Summary
@@ -197,11 +370,18 @@ class QuestionAnswerer:
 
     @classmethod
     def load_kb(cls, app_namespace, index_name, data_file, es_host=None, es_client=None,
-                connect_timeout=2):
+                connect_timeout=2, thread_count=DEFAULT_BULK_THREAD_COUNT,
+                chunk_size=DEFAULT_BULK_CHUNK_SIZE, max_chunk_bytes=DEFAULT_BULK_MAX_CHUNK_BYTES,
+                backend=ELASTICSEARCH_KB_BACKEND):
         """Loads documents from disk into the specified index in the knowledge
         base. If an index with the specified name doesn't exist, a new index
         with that name will be created in the knowledge base.
 
+        With the ``'local'`` backend the index is kept in the memory of the
+        current process instead of Elasticsearch, and all searches against it
+        are executed locally. This is meant for small knowledge bases, and the
+        index has to be loaded again in every process which serves the app.
+
         Args:
             app_namespace (str): The namespace of the app. Used to prevent
                 collisions between the indices of this app and those of other
@@ -214,44 +394,130 @@ class QuestionAnswerer:
             es_client (Elasticsearch): The Elasticsearch client.
             connect_timeout (int, optional): The amount of time for a
                 connection to the Elasticsearch host.
+            thread_count (int, optional): The number of threads sending bulk
+                requests to Elasticsearch.
+            chunk_size (int, optional): The maximum number of documents in a
+                bulk request.
+            max_chunk_bytes (int, optional): The maximum size of a bulk request
+                in bytes.
+            backend (str, optional): Where the index is stored, either
+                ``'elasticsearch'`` or ``'local'``.
         """
-        def _doc_count(data_file):
-            with open(data_file) as data_fp:
-                line = data_fp.readline()
-                data_fp.seek(0)
-                if line.strip() == '[':
-                    docs = json.load(data_fp)
-                    return len(docs)
-                else:
-                    count = 0
-                    for _ in data_fp:
-                        count += 1
-                    return count
-
-        def _doc_generator(data_file):
-            def transform(doc):
+        if backend not in KB_BACKENDS:
+            raise ValueError('Invalid knowledge base backend {!r}. Valid backends are {}.'.format(
+                backend, ', '.join(repr(kb_backend) for kb_backend in KB_BACKENDS)))
+
+        file_size = os.path.getsize(data_file)
+        # the progress is tracked by the position in the data file, so the
+        # documents do not have to be counted before loading them
+        pbar = tqdm(total=file_size, unit='B', unit_scale=True)
+
+        def _doc_generator():
+            for doc, position in _read_data_file(data_file):
+                pbar.update(position - pbar.n)
+                yield doc
+            pbar.update(file_size - pbar.n)
+
+        def _es_doc_generator():
+            for doc in _doc_generator():
                 base = {'_id': doc['id']}
                 base.update(doc)
-                return base
-
-            with open(data_file) as data_fp:
-                line = data_fp.readline()
-                data_fp.seek(0)
-                if line.strip() == '[':
-                    logging.debug('Loading data from a json file.')
-                    docs = json.load(data_fp)
-                    for doc in docs:
-                        yield transform(doc)
-                else:
-                    logging.debug('Loading data from a jsonl file.')
-                    for line in data_fp:
-                        doc = json.loads(line)
-                        yield transform(doc)
+                yield base
+
+        scoped_index_name = get_scoped_index_name(app_namespace, index_name)
+        try:
+            if backend == LOCAL_KB_BACKEND:
+                cls._local_kb.create_index(scoped_index_name, _doc_generator())
+            else:
+                load_index(app_namespace, index_name, _es_doc_generator(), None,
+                           DEFAULT_ES_QA_MAPPING, DOC_TYPE, es_host, es_client,
+                           connect_timeout=connect_timeout, thread_count=thread_count,
+                           chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes)
+                # searches use the most recently loaded copy of the index
+                cls._local_kb.delete_index(scoped_index_name)
+        finally:
+            pbar.close()
+            # the mapping and field statistics of the index may have changed. Either backend
+            # replaces or deletes the local index.
+            for kb_host in (None, get_es_host(es_host)):
+                cls._field_info_cache.pop((kb_host, scoped_index_name), None)
+                Search.field_stats_cache.invalidate(kb_host, scoped_index_name)
+
+
+def _read_data_file(data_file):
+    """Reads the documents in a knowledge base data file in a single pass.
+
+    Args:
+        data_file (str): The path to a json file containing a list of documents, or a jsonl file
+            containing one document per line
+
+    Yields:
+        (tuple): A document and the position in the file in bytes after reading it
+    """
+    with open(data_file, 'rb') as data_fp:
+        data = data_fp.read(1024)
+        if data.lstrip()[:1] == b'[':
+            logger.debug('Loading data from a json file.')
+            yield from _read_json_list(data_fp, data)
+        else:
+            logger.debug('Loading data from a jsonl file.')
+            data_fp.seek(0)
+            position = 0
+            for line in data_fp:
+                position += len(line)
+                if line.strip():
+                    yield json.loads(line.decode('utf-8')), position
 
-        docs = _doc_generator(data_file)
-        docs_count = _doc_count(data_file)
-        load_index(app_namespace, index_name, docs, docs_count, DEFAULT_ES_QA_MAPPING,
-                   DOC_TYPE, es_host, es_client, connect_timeout=connect_timeout)
+
+def _read_json_list(data_fp, data):
+    """Decodes the documents of a json list one at a time from fixed size reads, so that neither
+    the file nor the parsed documents are all kept in memory.
+
+    Args:
+        data_fp (file): The data file, opened in binary mode
+        data (bytes): The bytes already read from the file, which include the opening bracket
+
+    Yields:
+        (tuple): A document and the approximate position in the file in bytes after reading it
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    separators = re.compile(r'[\s,]*')
+    buffer = text_decoder.decode(data)
+    bytes_read = len(data)
+    chars_read = len(buffer)
+    index = buffer.index('[') + 1
+    position = 0
+    eof = False
+    while True:
+        index = separators.match(buffer, index).end()
+        if index < len(buffer) and buffer[index] == ']':
+            return
+        doc = None
+        if index < len(buffer):
+            try:
+                doc, end = decoder.raw_decode(buffer, index)
+            except ValueError:
+                if eof:
+                    raise
+        # a document which reaches the end of the buffer may continue in the next read
+        if doc is None or (end == len(buffer) and not eof):
+            if eof:
+                return
+            data = data_fp.read(DATA_FILE_READ_SIZE)
+            eof = not data
+            text = text_decoder.decode(data, final=eof)
+            buffer = buffer[index:] + text
+            bytes_read += len(data)
+            chars_read += len(text)
+            index = 0
+            continue
+
+        index = end
+        # the decoder works on characters, which are scaled to approximate byte positions
+        scale = float(bytes_read) / chars_read if chars_read else 1.0
+        position = max(position, bytes_read - int((len(buffer) - end) * scale))
+        yield doc, position
 
 
 class FieldInfo:
@@ -305,17 +571,25 @@ class Search:
     """
     SYN_FIELD_SUFFIX = "$whitelist"
 
-    def __init__(self, client, index, ranking_config=None, field_info=None):
+    field_stats_cache = FieldStatsCache()
+    """The cache of field statistics shared by all searches."""
+
+    def __init__(self, client, index, ranking_config=None, field_info=None, es_host=None):
         """Initialize a Search object.
 
         Args:
-            client (Elasticsearch): Elasticsearch client.
+            client (Elasticsearch or LocalKnowledgeBase): The knowledge base backend which
+                executes the searches. Backends implement the ``search(index, body, **kwargs)``
+                method of the Elasticsearch client.
             index (str): index name of knowledge base object.
             ranking_config (dict): overriding ranking configuration parameters for current search.
             field_info (dict): dictionary contains knowledge base matadata objects.
+            es_host (str): The Elasticsearch host of the client, which scopes the cached field
+                statistics. None for the local knowledge base.
         """
         self.index = index
         self.client = client
+        self.es_host = es_host
 
         self._clauses = {
             "query": [],
@@ -335,7 +609,7 @@ class Search:
         Returns:
             Search: cloned copy of the Search object.
         """
-        s = Search(client=self.client, index=self.index)
+        s = Search(client=self.client, index=self.index, es_host=self.es_host)
         s._clauses = copy.deepcopy(self._clauses)
         s._ranking_config = copy.deepcopy(self._ranking_config)
         s._kb_field_info = copy.deepcopy(self._kb_field_info)
@@ -512,14 +786,20 @@ class Search:
             dict: dictionary that contains knowledge base field statistics.
         """
 
+        field_stats = Search.field_stats_cache.get(self.es_host, self.index, field)
+        if field_stats is not None:
+            return field_stats
+
         stats_query = {"aggs": {}, "size": 0}
         stats_query['aggs'][field + '_min'] = {"min": {"field": field}}
         stats_query['aggs'][field + '_max'] = {"max": {"field": field}}
 
         res = self.client.search(index=self.index, body=stats_query, search_type="query_then_fetch")
 
-        return {'min_value': res['aggregations'][field + '_min']['value'],
-                'max_value': res['aggregations'][field + '_max']['value']}
+        field_stats = {'min_value': res['aggregations'][field + '_min']['value'],
+                       'max_value': res['aggregations'][field + '_max']['value']}
+        Search.field_stats_cache.set(self.es_host, self.index, field, field_stats)
+        return field_stats
 
     def _build_es_query(self, size=10):
         """Build knowledge base search syntax based on provided search criteria.
@@ -615,6 +895,18 @@ class Search:
         except ElasticsearchException:
             raise KnowledgeBaseError
 
+    async def execute_async(self, size=10):
+        """Executes the knowledge base search with provided criteria without blocking the event
+        loop, and returns matching documents.
+
+        Args:
+            size (int): The maximum number of records to fetch, default to 10.
+
+        Returns:
+            a list of matching documents.
+        """
+        return await run_es_request_async(self.execute, size=size)
+
     class Clause(ABC):
         """This class models an abstract knowledge base clause."""
 
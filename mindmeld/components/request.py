@@ -16,6 +16,8 @@ import immutables
 from pytz import timezone
 from pytz.exceptions import UnknownTimeZoneError
 
+from ..constants import NLP_STAGES
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,6 +43,41 @@ def _validate_time_zone(param=None):
     return param
 
 
+def _validate_stop_at(param=None):
+    """Validates the stage at which natural language processing should stop
+
+    Args:
+        param (str, optional): The stop_at parameter
+
+    Returns:
+        str: The passed in stage
+    """
+    if param not in NLP_STAGES:
+        logger.warning("Invalid %r param: %s is not one of %s.", 'stop_at', param, NLP_STAGES)
+        return None
+    return param
+
+
+def _validate_confidence_threshold(param=None):
+    """Validates the confidence threshold below which natural language processing stops
+
+    Args:
+        param (float, optional): The confidence_threshold parameter
+
+    Returns:
+        float: The passed in threshold
+    """
+    if isinstance(param, bool) or not isinstance(param, (int, float)):
+        logger.warning("Invalid %r param: %s is not of type %s.", 'confidence_threshold', param,
+                       float)
+        return None
+    if not 0 <= param <= 1:
+        logger.warning("Invalid %r param: %s is not between 0 and 1.", 'confidence_threshold',
+                       param)
+        return None
+    return param
+
+
 def _validate_generic(name, ptype):
     def validator(param):
         if not isinstance(param, ptype):
@@ -55,7 +92,9 @@ PARAM_VALIDATORS = {
     'target_dialogue_state': _validate_generic('target_dialogue_state', str),
     'time_zone': _validate_time_zone,
     'timestamp': _validate_generic('timestamp', int),
-    'dynamic_resource': _validate_generic('dynamic_resource', immutables.Map)
+    'dynamic_resource': _validate_generic('dynamic_resource', immutables.Map),
+    'stop_at': _validate_stop_at,
+    'confidence_threshold': _validate_confidence_threshold
 }
 
 
@@ -74,12 +113,18 @@ class Params:
         timestamp (long): A unix time stamp for the request accurate to the nearest second.
         dynamic_resource (dict): A dictionary containing data used to influence the language
             classifiers by adding resource data for the given turn.
+        stop_at (str): The last stage of the natural language processing pipeline to run, one of
+            'domain', 'intent', 'entities' or 'full'.
+        confidence_threshold (float): The domain or intent confidence below which the deeper
+            stages of the natural language processing pipeline are skipped.
     """
     allowed_intents = attr.ib(default=attr.Factory(tuple))
     target_dialogue_state = attr.ib(default=None)
     time_zone = attr.ib(default=None)
     timestamp = attr.ib(default=0)
     dynamic_resource = attr.ib(default=attr.Factory(dict))
+    stop_at = attr.ib(default=None)
+    confidence_threshold = attr.ib(default=None)
 
     def validate_param(self, name):
         """
@@ -94,7 +139,8 @@ class Params:
         """
         validator = PARAM_VALIDATORS.get(name)
         param = vars(self).get(name)
-        if param:
+        # False is validated as well so that boolean values are rejected
+        if param or param is False:
             return validator(param)
         return param
 
@@ -120,13 +166,15 @@ class Params:
 
     def nlp_params(self):
         """
-        Validate time zone, timestamp, and dynamic resource parameters.
+        Validate time zone, timestamp, dynamic resource, stop at and confidence threshold
+        parameters.
 
         Returns:
             dict: Mapping from parameter name to bool depending on validation.
         """
         return {param: self.validate_param(param)
-                for param in ('time_zone', 'timestamp', 'dynamic_resource')}
+                for param in ('time_zone', 'timestamp', 'dynamic_resource', 'stop_at',
+                              'confidence_threshold')}
 
 
 @attr.s(frozen=True, kw_only=True)
@@ -144,6 +192,10 @@ class FrozenParams(Params):
         timestamp (long): A unix time stamp for the request accurate to the nearest second.
         dynamic_resource (dict): A dictionary containing data used to influence the language
             classifiers by adding resource data for the given turn.
+        stop_at (str): The last stage of the natural language processing pipeline to run, one of
+            'domain', 'intent', 'entities' or 'full'.
+        confidence_threshold (float): The domain or intent confidence below which the deeper
+            stages of the natural language processing pipeline are skipped.
     """
     allowed_intents = attr.ib(default=attr.Factory(tuple),
                               converter=tuple)
@@ -152,6 +204,8 @@ class FrozenParams(Params):
     timestamp = attr.ib(default=0)
     dynamic_resource = attr.ib(default=immutables.Map(),
                                converter=immutables.Map)
+    stop_at = attr.ib(default=None)
+    confidence_threshold = attr.ib(default=None)
 
 
 @attr.s(frozen=True, kw_only=True)
@@ -16,8 +16,8 @@ This module contains the role classifier component of the MindMeld natural langu
 """
 import logging
 
-from sklearn.externals import joblib
-
+from .. import serialization
+from ..exceptions import ArtifactLoadError
 from ..models import create_model, ENTITY_EXAMPLE_TYPE, CLASS_LABEL_TYPE
 from ..core import Query
 from ..constants import DEFAULT_TRAIN_SET_REGEX
@@ -142,10 +142,10 @@ class RoleClassifier(Classifier):
         logger.info('Loading role classifier: domain=%r, intent=%r, entity_type=%r',
                     self.domain, self.intent, self.entity_type)
         try:
-            rc_data = joblib.load(model_path)
+            rc_data = serialization.load(model_path)
             self._model = rc_data['model']
             self.roles = rc_data['roles']
-        except (OSError, IOError):
+        except (OSError, IOError, ArtifactLoadError):
             logger.error('Unable to load %s. Pickle file cannot be read from %r',
                          self.__class__.__name__, model_path)
             return
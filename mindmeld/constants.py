@@ -13,3 +13,11 @@
 DEFAULT_TRAIN_SET_REGEX = r'train.*\.txt'
 DEFAULT_TEST_SET_REGEX = r'test.*\.txt'
 DEVCENTER_URL = 'https://devcenter.mindmeld.com'
+WARM_START_HASH_SUFFIX = '.warm_start_hash'
+
+# The stages of the natural language processing pipeline after which processing can stop
+DOMAIN_STAGE = 'domain'
+INTENT_STAGE = 'intent'
+ENTITIES_STAGE = 'entities'
+FULL_STAGE = 'full'
+NLP_STAGES = (DOMAIN_STAGE, INTENT_STAGE, ENTITIES_STAGE, FULL_STAGE)
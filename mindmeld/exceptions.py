@@ -53,6 +53,11 @@ class ClassifierLoadError(MindMeldError):
     pass
 
 
+class ArtifactLoadError(MindMeldError):
+    """An exception which indicates a persisted artifact could not be loaded."""
+    pass
+
+
 class ProcessorError(MindMeldError):
     """An exception which indicates an error with a processor."""
     pass
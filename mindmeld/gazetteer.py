@@ -16,11 +16,21 @@ from collections import defaultdict
 import logging
 import os
 
-from sklearn.externals import joblib
+import numpy as np
+
+from . import serialization
+from .serialization import FrozenStringMap, FrozenStringSetMap, StringArray
 
 logger = logging.getLogger(__name__)
 
 
+def _thaw(value):
+    """Returns the mutable equivalent of a frozen structure from a persisted gazetteer"""
+    if isinstance(value, (StringArray, FrozenStringMap, FrozenStringSetMap)):
+        return value.copy()
+    return value
+
+
 class Gazetteer:
     """
     This class holds the following  fields, which are extracted and exported to file.
@@ -76,8 +86,9 @@ class Gazetteer:
             # We only shallow copy lists and dicts here since we do not have nested
             # data structures in this container, only 1-levels dictionaries and lists,
             # so the references only need to be copies. For all other types, like strings,
-            # they can just be passed by value.
-            setattr(self, key, value.copy() if isinstance(value, (list, dict)) else value)
+            # they can just be passed by value. Frozen structures from a loaded gazetteer are
+            # copied into their mutable equivalents.
+            setattr(self, key, value.copy() if isinstance(value, (list, dict)) else _thaw(value))
 
     def dump(self, gaz_path):
         """Persists the gazetteer to disk.
@@ -91,7 +102,13 @@ class Gazetteer:
         if not os.path.isdir(folder):
             os.makedirs(folder)
 
-        joblib.dump(self.to_dict(), gaz_path)
+        gaz_data = self.to_dict()
+        # Store the large structures as flat arrays which are memory-mapped on load
+        gaz_data['pop_dict'] = FrozenStringMap(self.pop_dict, default_factory=int,
+                                               dtype=np.float64)
+        gaz_data['index'] = FrozenStringSetMap(self.index, default_factory=set)
+        gaz_data['entities'] = StringArray(self.entities)
+        serialization.dump(gaz_data, gaz_path)
 
     def load(self, gaz_path):
         """Loads the gazetteer from disk
@@ -100,9 +117,11 @@ class Gazetteer:
             gaz_path (str): The location on disk where the gazetteer is stored
 
         """
-        gaz_data = joblib.load(gaz_path)
+        gaz_data = serialization.load(gaz_path)
         self.name = gaz_data['name']
         self.entity_count = gaz_data['total_entities']
+        # The flat arrays are memory-mapped and looked up in place, so that they are shared
+        # between processes. They are only copied when the gazetteer is updated (see from_dict).
         self.pop_dict = gaz_data['pop_dict']
         self.index = gaz_data['index']
         self.entities = gaz_data['entities']
@@ -235,6 +235,9 @@ class ModelEvaluation(namedtuple('ModelEvaluation', ['config', 'results'])):
     def __init__(self, config, results):
         del results
         self.label_encoder = get_label_encoder(config)
+        # Accuracy of a model fully retrained on the same data, set when the evaluated model was
+        # warm started from a previous model
+        self.full_retrain_accuracy = None
 
     def get_accuracy(self):
         """The accuracy represents the share of examples whose predicted labels
@@ -707,6 +710,21 @@ class Model:
     def fit(self, examples, labels, params=None):
         raise NotImplementedError
 
+    def fit_warm_start(self, examples, labels, previous_model):
+        """Trains this model, initializing it from a previously trained model with the same
+        configuration. Models which do not support warm starts are trained from scratch.
+
+        Args:
+            examples (list): A list of examples.
+            labels (list): A parallel list to examples. The gold labels for each example.
+            previous_model (Model): A previously trained model with the same configuration.
+
+        Returns:
+            (Model): Returns self.
+        """
+        del previous_model
+        return self.fit(examples, labels)
+
     def _get_model_constructor(self):
         raise NotImplementedError
 
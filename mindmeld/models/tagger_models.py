@@ -15,7 +15,6 @@
 import logging
 import os
 import random
-from sklearn.externals import joblib
 
 from .helpers import (register_model, get_label_encoder, get_seq_accuracy_scorer,
                       get_seq_tag_accuracy_scorer, ingest_dynamic_gazetteer)
@@ -23,6 +22,7 @@ from .model import EvaluatedExample, ModelConfig, EntityModelEvaluation, Model
 from .taggers.crf import ConditionalRandomFields
 from .taggers.memm import MemmModel
 from .taggers.lstm import LstmModel
+from .. import serialization
 from ..exceptions import MindMeldError
 from ..tokenizer import Tokenizer
 
@@ -318,8 +318,8 @@ class TaggerModel(Model):
 
     def dump(self, path, config):
         """
-        Dumps the model using joblib for the config and call's the underlying model
-        to dump its state.
+        Dumps the model and the config in the MindMeld artifact format and calls the underlying
+        model to dump its state.
 
         Args:
             path (str): The path to dump the model to
@@ -337,9 +337,9 @@ class TaggerModel(Model):
                 'label_encoder': self._label_encoder,
                 'no_entities': self._no_entities
             }
-            joblib.dump(variables_to_dump, os.path.join(config['model'], '.tagger_vars'))
+            serialization.dump(variables_to_dump, os.path.join(config['model'], '.tagger_vars'))
 
-        joblib.dump(config, path)
+        serialization.dump(config, path)
 
     def load(self, path, config):
         """
@@ -351,7 +351,7 @@ class TaggerModel(Model):
             config (dict): The config containing the model configuration
         """
         self._clf.load(path)
-        variables_to_load = joblib.load(os.path.join(config['model'], '.tagger_vars'))
+        variables_to_load = serialization.load(os.path.join(config['model'], '.tagger_vars'))
         self._current_params = variables_to_load['current_params']
         self._label_encoder = variables_to_load['label_encoder']
         self._no_entities = variables_to_load['no_entities']
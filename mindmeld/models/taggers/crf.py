@@ -14,8 +14,15 @@
 """
 This module contains the CRF entity recognizer.
 """
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import math
+import os
+import threading
+
 import numpy as np
+import pycrfsuite
 from sklearn_crfsuite import CRF
 
 from .taggers import Tagger, extract_sequence_features
@@ -24,9 +31,26 @@ logger = logging.getLogger(__name__)
 
 ZERO = 1e-20
 
+# The maximum number of distinct token feature dicts whose crfsuite items are memoized
+FEATURE_CACHE_SIZE = 10000
+
+# The minimum number of sequences per process when the feature binner transform is sharded
+MIN_SHARD_SIZE = 1000
+
 
 class ConditionalRandomFields(Tagger):
-    """A Conditional Random Fields model."""
+    """A Conditional Random Fields model.
+
+    Predictions are made with a ``pycrfsuite.Tagger`` which is opened once per process, and
+    which computes the predicted tags and their marginal probabilities in a single pass.
+    """
+
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        # the tagger and feature cache are rebuilt on demand
+        attributes.pop('_tagger', None)
+        attributes.pop('_feature_cache', None)
+        return attributes
 
     @staticmethod
     def _predict_proba(X):
@@ -39,10 +63,12 @@ class ConditionalRandomFields(Tagger):
         pass
 
     def fit(self, X, y):
+        self._tagger = None
         self._clf.fit(X, y)
         return self
 
     def set_params(self, **parameters):
+        self._tagger = None
         self._clf = CRF()
         self._clf.set_params(**parameters)
         return self
@@ -51,7 +77,11 @@ class ConditionalRandomFields(Tagger):
         return self._clf.get_params()
 
     def predict(self, X, dynamic_resource=None):
-        return self._clf.predict(X)
+        return [tags for tags, _ in self._tag(X)]
+
+    def extract_and_predict(self, examples, config, resources):
+        X, _, _ = self.extract_features(examples, config, resources, fit=False)
+        return self.predict(X)
 
     def predict_proba(self, examples, config, resources):
         """
@@ -65,16 +95,46 @@ class ConditionalRandomFields(Tagger):
             list of tuples of (mindmeld.core.QueryEntity): a list of predicted labels \
              with confidence scores
         """
-        X, _, _ = self.extract_features(examples, config, resources)
-        seq = self._clf.predict(X)
-        marginals_dict = self._clf.predict_marginals(X)
-        marginal_tuples = []
-        for query_index, query_seq in enumerate(seq):
-            query_marginal_tuples = []
-            for i, tag in enumerate(query_seq):
-                query_marginal_tuples.append([tag, marginals_dict[query_index][i][tag]])
-            marginal_tuples.append(query_marginal_tuples)
-        return marginal_tuples
+        X, _, _ = self.extract_features(examples, config, resources, fit=False)
+        return [[[tag, marginal] for tag, marginal in zip(tags, marginals)]
+                for tags, marginals in self._tag(X, marginals=True)]
+
+    def _tag(self, X, marginals=False):
+        """Predicts the tags for sequences in crfsuite format.
+
+        Args:
+            X (list of list of list of str): The features of each token of each sequence
+            marginals (bool, optional): Whether to compute the marginal probability of each
+                predicted tag
+
+        Returns:
+            (list of tuple): For each sequence, the predicted tags and their marginal \
+                probabilities, or None if marginals are not computed
+        """
+        tagger, lock = self._get_tagger()
+        results = []
+        with lock:
+            for xseq in X:
+                if not xseq:
+                    results.append(([], [] if marginals else None))
+                    continue
+                tagger.set(xseq)
+                tags = tagger.tag()
+                seq_marginals = [tagger.marginal(tag, i) for i, tag in enumerate(tags)] \
+                    if marginals else None
+                results.append((tags, seq_marginals))
+        return results
+
+    def _get_tagger(self):
+        """Returns the crfsuite tagger of the current process and the lock which guards it,
+        opening the tagger if necessary."""
+        tagger_info = getattr(self, '_tagger', None)
+        if tagger_info is None or tagger_info[0] != os.getpid():
+            tagger = pycrfsuite.Tagger()
+            tagger.open(self._clf.modelfile.name)
+            tagger_info = (os.getpid(), tagger, threading.Lock())
+            self._tagger = tagger_info
+        return tagger_info[1:]
 
     def extract_features(self, examples, config, resources, y=None, fit=True):
         """Transforms a list of examples into a feature matrix.
@@ -123,20 +183,47 @@ class ConditionalRandomFields(Tagger):
         """
         if fit:
             self._feat_binner.fit(X)
+            self._feature_cache = {}
+            binned_X = self._feat_binner.transform(X, num_workers=self._binner_workers)
+            return [[self._format_feature_items(feature) for feature in feat_seq]
+                    for feat_seq in binned_X]
+
+        return [[self._get_feature_items(feature) for feature in feat_seq] for feat_seq in X]
+
+    def _get_feature_items(self, feature):
+        """Converts the features of a token into crfsuite items. The items are memoized for each
+        distinct feature dict, since many tokens share the same features.
+
+        Args:
+            feature (dict): features of a token
+
+        Returns:
+            (list of str): the crfsuite items
+        """
+        cache = getattr(self, '_feature_cache', None)
+        if cache is None:
+            cache = self._feature_cache = {}
+        key = tuple(sorted(feature.items()))
+        try:
+            return cache[key]
+        except KeyError:
+            pass
 
-        new_X = []
-        for feat_seq in self._feat_binner.transform(X):
-            feat_list = []
-            for feature in feat_seq:
-                temp_list = []
-                for feat_type in sorted(feature.keys()):
-                    temp_list.append("{}={}".format(feat_type, str(feature[feat_type])))
-                feat_list.append(temp_list)
-            new_X.append(feat_list)
-        return new_X
+        items = self._format_feature_items(self._feat_binner.transform([[feature]])[0][0])
+        if len(cache) >= FEATURE_CACHE_SIZE:
+            cache.clear()
+        cache[key] = items
+        return items
+
+    @staticmethod
+    def _format_feature_items(binned_feature):
+        return ["{}={}".format(feat_type, str(binned_feature[feat_type]))
+                for feat_type in sorted(binned_feature.keys())]
 
     def setup_model(self, config):
+        model_settings = config.model_settings or {}
         self._feat_binner = FeatureBinner()
+        self._binner_workers = model_settings.get('feature_binner_workers', 1)
 
 # Feature extraction for CRF
 
@@ -177,34 +264,56 @@ class FeatureMapper:
         """
         self.values.append(value)
 
-    def fit(self):
-        """Calculate statistics and then create the bins."""
-        self.std = np.std(self.values)
-        self.mean = np.mean(self.values)
+    def fit(self, values=None):
+        """Calculate statistics and then create the bins.
+
+        Args:
+            values (numpy.array, optional): The values of this feature. If omitted, the values
+                collected with ``add_value`` are used.
+        """
+        values = np.asarray(self.values if values is None else values, dtype=np.float64)
+        self.set_statistics(np.mean(values), np.std(values))
+
+    def set_statistics(self, mean, std):
+        """Create the bins from precomputed statistics. The collected values are released.
 
-        range_start = self.mean - self.std * self._num_std
-        num_bin = 2 * int(self._num_std / self._size_std)
-        bins = [range_start]
+        Args:
+            mean (float): The mean of this feature
+            std (float): The standard deviation of this feature
+        """
+        self.mean = mean
+        self.std = std
+        self.values = []
 
-        while num_bin > 0 and self.std > ZERO:
-            range_start += self.std * self._size_std
-            bins.append(range_start)
-            num_bin -= 1
-        self._std_bins = np.array(bins)
+        num_bin = 2 * int(self._num_std / self._size_std) if std > ZERO else 0
+        self._std_bins = mean + std * (np.arange(num_bin + 1) * self._size_std - self._num_std)
 
     def map_bucket(self, value):
         """
         Get corresponding bucket number for this value.
 
         Args:
-           value (float): numerical value of this feature
+           value (float or numpy.array): numerical value of this feature
         """
         return np.searchsorted(self._std_bins, value)
 
 
+def _to_float(value):
+    """Converts a feature value to a float, or returns None for non numerical values."""
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
 class FeatureBinner:
     """
     Class to convert features with numerical values to categorical values.
+
+    Features are processed column by column: the values of each numerical feature are gathered
+    across all tokens, so that statistics and bucket numbers are computed with NumPy.
     """
     def __init__(self):
         self.features = {}
@@ -216,32 +325,76 @@ class FeatureBinner:
         Args:
             X_train (list of list of dict): training data
         """
+        feat_ids = {}
+        ids = []
+        values = []
         for sentence in X_train:
             for word in sentence:
                 for feat_name, feat_value in word.items():
-                    self._collect_feature(feat_name, feat_value)
+                    feat_value = _to_float(feat_value)
+                    if feat_value is None:
+                        # Skip collection of non numerical features
+                        continue
+                    ids.append(feat_ids.setdefault(feat_name, len(feat_ids)))
+                    values.append(feat_value)
+
+        ids = np.array(ids, dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        counts = np.bincount(ids, minlength=len(feat_ids))
+        means = np.bincount(ids, weights=values, minlength=len(feat_ids)) / np.maximum(counts, 1)
+        variances = np.bincount(ids, weights=(values - means[ids]) ** 2,
+                                minlength=len(feat_ids)) / np.maximum(counts, 1)
+        stds = np.sqrt(variances)
 
-        for mapper in self.features.values():
-            mapper.fit()
+        self.features = {}
+        for feat_name, feat_id in feat_ids.items():
+            mapper = FeatureMapper()
+            mapper.feat_name = feat_name
+            mapper.set_statistics(means[feat_id], stds[feat_id])
+            self.features[feat_name] = mapper
 
-    def transform(self, X_train):
+    def transform(self, X_train, num_workers=1):
         """
         Convert numerical values to categorical values.
 
         Args:
             X_train (list of list of dict): training data
+            num_workers (int, optional): The number of processes to shard the data across
         """
-        new_X_train = []
-        for sentence in X_train:
-            new_sentence = []
+        num_shards = min(num_workers or 1, len(X_train) // MIN_SHARD_SIZE)
+        if num_shards <= 1:
+            return self._transform(X_train)
+
+        shard_size = int(math.ceil(len(X_train) / num_shards))
+        shards = [X_train[start:start + shard_size]
+                  for start in range(0, len(X_train), shard_size)]
+        with ProcessPoolExecutor(max_workers=num_shards) as pool:
+            return [sentence for shard in pool.map(self._transform, shards)
+                    for sentence in shard]
+
+    def _transform(self, X_train):
+        new_X_train = [[dict(word) for word in sentence] for sentence in X_train]
+
+        # the words containing each numerical feature, and its values
+        columns = defaultdict(lambda: ([], []))
+        for sentence in new_X_train:
             for word in sentence:
-                new_word = {}
                 for feat_name, feat_value in word.items():
-                    new_feats = self._map_feature(feat_name, feat_value)
-                    if new_feats:
-                        new_word.update(new_feats)
-                new_sentence.append(new_word)
-            new_X_train.append(new_sentence)
+                    feat_value = _to_float(feat_value)
+                    if feat_value is None:
+                        # Don't do bucketing of non numerical features
+                        continue
+                    if feat_name not in self.features:
+                        word[feat_name] = feat_value
+                        continue
+                    words, values = columns[feat_name]
+                    words.append(word)
+                    values.append(feat_value)
+
+        for feat_name, (words, values) in columns.items():
+            buckets = self.features[feat_name].map_bucket(np.array(values, dtype=np.float64))
+            for word, bucket in zip(words, buckets):
+                word[feat_name] = bucket
         return new_X_train
 
     def fit_transform(self, X_train):
@@ -253,42 +406,3 @@ class FeatureBinner:
         """
         self.fit(X_train)
         return self.transform(X_train)
-
-    def _collect_feature(self, feat_name, feat_value):
-        """
-        Collect numerical feature values to fit corresponding mapper.
-
-        Args:
-            feat_name (str): feature name
-            feat_value (any): feature value
-        """
-        try:
-            feat_value = float(feat_value)
-        except ValueError:
-            # Skip collection of non numerical features
-            return
-        mapper = self.features.get(feat_name, FeatureMapper())
-        mapper.feat_name = feat_name
-        mapper.add_value(feat_value)
-
-        self.features[feat_name] = mapper
-
-    def _map_feature(self, feat_name, feat_value):
-        """
-        Map numerical feature values to categorical values.
-
-        Args:
-            feat_name (str): feature name
-            feat_value (any): feature value
-        """
-        try:
-            feat_value = float(feat_value)
-        except ValueError:
-            # Don't do bucketing of non numerical features
-            return {feat_name: feat_value}
-        if feat_name not in self.features:
-            return {feat_name: feat_value}
-
-        mapper = self.features[feat_name]
-        new_feat_value = mapper.map_bucket(feat_value)
-        return {feat_name: new_feat_value}
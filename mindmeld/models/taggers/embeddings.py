@@ -10,26 +10,36 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
 import os
 import zipfile
+import zlib
 import logging
 import pickle
+from collections.abc import Mapping
 from urllib.request import urlretrieve
 import numpy as np
 
 from tqdm import tqdm
 
-from ...path import EMBEDDINGS_FILE_PATH, \
+from ... import serialization
+from ...path import CUSTOM_EMBEDDINGS_FOLDER_PATH, EMBEDDINGS_FILE_PATH, \
     EMBEDDINGS_FOLDER_PATH, PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH, \
     PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH
-from ...exceptions import EmbeddingDownloadError
+from ...exceptions import ArtifactLoadError, EmbeddingDownloadError
+from ...serialization import FrozenStringMap
 
 logger = logging.getLogger(__name__)
 
 GLOVE_DOWNLOAD_LINK = 'http://nlp.stanford.edu/data/glove.6B.zip'
 EMBEDDING_FILE_PATH_TEMPLATE = 'glove.6B.{}d.txt'
+EMBEDDING_STORE_PATH_TEMPLATE = 'glove.6B.{}d'
 ALLOWED_WORD_EMBEDDING_DIMENSIONS = [50, 100, 200, 300]
 
+# Tokens without an embedding are assigned one of these seeded random vectors by a stable hash
+UNKNOWN_EMBEDDING_POOL_SIZE = 5000
+UNKNOWN_EMBEDDING_SEED = 1
+
 
 class TqdmUpTo(tqdm):
     """Provides `update_to(n)` which uses `tqdm.update(delta_n)`."""
@@ -47,9 +57,122 @@ class TqdmUpTo(tqdm):
         self.update(b * bsize - self.n)  # will also set self.n = b * bsize
 
 
+class EmbeddingStore(Mapping):
+    """A read-only mapping from words to embeddings, backed by a float32 matrix file and a
+    vocabulary index which are memory-mapped from disk. Lookups don't copy the embeddings, and
+    the pages of the store are shared by all processes which open it.
+
+    Args:
+        vocab (FrozenStringMap): The row of the matrix for each word
+        matrix (numpy.array): The embedding matrix
+    """
+
+    MATRIX_SUFFIX = '.npy'
+    VOCAB_SUFFIX = '.vocab'
+
+    def __init__(self, vocab, matrix):
+        self._vocab = vocab
+        self.matrix = matrix
+
+    def __getitem__(self, word):
+        return np.asarray(self.matrix[self._vocab[word]])
+
+    def __contains__(self, word):
+        return word in self._vocab
+
+    def __len__(self):
+        return len(self._vocab)
+
+    def __iter__(self):
+        return iter(self._vocab)
+
+    def get_rows(self, words):
+        """Finds the rows of the embedding matrix for many words at once.
+
+        Args:
+            words (list of str): The words to look up
+
+        Returns:
+            (numpy.array): The row of each word, or -1 for words which are not in the store
+        """
+        return self._vocab.lookup(words, default=-1)
+
+    @classmethod
+    def exists(cls, path_prefix):
+        """Checks whether a store exists at the given location.
+
+        Args:
+            path_prefix (str): The path of the store files without their suffix
+
+        Returns:
+            (bool): Whether the store exists
+        """
+        # the vocabulary is written last, so its presence implies a complete store
+        return os.path.isfile(path_prefix + cls.VOCAB_SUFFIX)
+
+    @classmethod
+    def load(cls, path_prefix):
+        """Opens the store at the given location.
+
+        Args:
+            path_prefix (str): The path of the store files without their suffix
+
+        Returns:
+            (EmbeddingStore): The store
+        """
+        vocab = serialization.load(path_prefix + cls.VOCAB_SUFFIX)
+        matrix = np.load(path_prefix + cls.MATRIX_SUFFIX, mmap_mode='r')
+        return cls(vocab, matrix)
+
+    @classmethod
+    def build(cls, glove_file, path_prefix):
+        """Converts a file in the GloVe text format to a store at the given location.
+
+        Args:
+            glove_file (file): The GloVe file, opened in text or binary mode
+            path_prefix (str): The path of the store files without their suffix
+
+        Returns:
+            (EmbeddingStore): The store
+        """
+        raw_path = path_prefix + '.raw.tmp'
+        vocab = {}
+        dimension = None
+        try:
+            with open(raw_path, 'wb') as raw_file:
+                for word, coefs in _read_glove_file(glove_file):
+                    if word in vocab:
+                        continue
+                    dimension = dimension or len(coefs)
+                    if len(coefs) != dimension:
+                        continue
+                    vocab[word] = len(vocab)
+                    raw_file.write(coefs.tobytes())
+
+            matrix_path = path_prefix + cls.MATRIX_SUFFIX
+            shape = (len(vocab), dimension or 0)
+            matrix = np.lib.format.open_memmap(matrix_path + '.tmp', mode='w+',
+                                               dtype=np.float32, shape=shape)
+            if len(vocab):
+                matrix[:] = np.memmap(raw_path, dtype=np.float32, mode='r', shape=shape)
+            matrix.flush()
+            del matrix
+            os.replace(matrix_path + '.tmp', matrix_path)
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+        serialization.dump(FrozenStringMap(vocab), path_prefix + cls.VOCAB_SUFFIX)
+        return cls.load(path_prefix)
+
+
 class GloVeEmbeddingsContainer:
     """This class is responsible for the downloading, extraction and storing of
-    word embeddings based on the GloVe format."""
+    word embeddings based on the GloVe format.
+
+    The first time a GloVe file is used, it is converted to an :class:`EmbeddingStore`, which
+    is memory-mapped by all subsequent users.
+    """
 
     def __init__(self, token_dimension=300, token_pretrained_embedding_filepath=None):
 
@@ -69,10 +192,10 @@ class GloVeEmbeddingsContainer:
         self._extract_embeddings()
 
     def get_pretrained_word_to_embeddings_dict(self):
-        """Returns the word to embedding dict.
+        """Returns the word to embedding mapping.
 
         Returns:
-            (dict): word to embedding mapping.
+            (EmbeddingStore): word to embedding mapping.
         """
         return self.word_to_embedding
 
@@ -106,26 +229,66 @@ class GloVeEmbeddingsContainer:
 
             return zip_file_object
 
-    def _extract_and_map(self, glove_file):
-        for line in glove_file:
-            values = line.split()
-            word = values[0]
-            coefs = np.asarray(values[1:], dtype='float32')
-            self.word_to_embedding[word] = coefs
+    def _extract_and_map(self, open_glove_file, store_path_prefix):
+        """Converts a GloVe file to an embedding store. If the store cannot be written, the
+        embeddings are read into memory instead.
+
+        Args:
+            open_glove_file (callable): Returns the GloVe file, opened in text or binary mode
+            store_path_prefix (str): The path of the store files without their suffix
+        """
+        logger.info("Converting embeddings to a binary store at %s.", store_path_prefix)
+        try:
+            os.makedirs(os.path.dirname(store_path_prefix), exist_ok=True)
+            with open_glove_file() as glove_file:
+                self.word_to_embedding = EmbeddingStore.build(glove_file, store_path_prefix)
+            return
+        except OSError as error:
+            logger.warning("Unable to write the embedding store at %s: %s. Reading the "
+                           "embeddings into memory instead.", store_path_prefix, error)
+
+        with open_glove_file() as glove_file:
+            self.word_to_embedding = {}
+            for word, coefs in _read_glove_file(glove_file):
+                self.word_to_embedding.setdefault(word, coefs)
+
+    def _load_store(self, store_path_prefix, source_path=None):
+        """Opens an existing embedding store, unless it is older than its source file.
+
+        Returns:
+            (bool): Whether the store was opened
+        """
+        if not EmbeddingStore.exists(store_path_prefix):
+            return False
+        vocab_path = store_path_prefix + EmbeddingStore.VOCAB_SUFFIX
+        if source_path and os.path.getmtime(vocab_path) < os.path.getmtime(source_path):
+            return False
+        try:
+            self.word_to_embedding = EmbeddingStore.load(store_path_prefix)
+        except (ArtifactLoadError, IOError, ValueError):
+            logger.warning("Unable to open the embedding store at %s.", store_path_prefix)
+            return False
+        return True
 
     def _extract_embeddings(self):
         file_location = self.token_pretrained_embedding_filepath
 
         if file_location and os.path.isfile(file_location):
+            store_path_prefix = _get_custom_store_path_prefix(file_location)
+            if self._load_store(store_path_prefix, source_path=file_location):
+                return
             logger.info("Extracting embeddings from provided "
                         "file location %s.", str(file_location))
-            with open(file_location, 'r') as embedding_file:
-                self._extract_and_map(embedding_file)
+            self._extract_and_map(lambda: open(file_location, 'r'), store_path_prefix)
             return
 
         logger.info("Provided file location %s does not exist.", str(file_location))
 
         file_name = EMBEDDING_FILE_PATH_TEMPLATE.format(self.token_dimension)
+        store_path_prefix = os.path.join(
+            EMBEDDINGS_FOLDER_PATH, EMBEDDING_STORE_PATH_TEMPLATE.format(self.token_dimension))
+        if self._load_store(store_path_prefix):
+            return
 
         if os.path.isfile(EMBEDDINGS_FILE_PATH):
             logger.info("Extracting embeddings from default folder "
@@ -133,8 +296,8 @@ class GloVeEmbeddingsContainer:
 
             try:
                 zip_file_object = zipfile.ZipFile(EMBEDDINGS_FILE_PATH, 'r')
-                with zip_file_object.open(file_name) as embedding_file:
-                    self._extract_and_map(embedding_file)
+                self._extract_and_map(lambda: zip_file_object.open(file_name),
+                                      store_path_prefix)
             except zipfile.BadZipFile:
                 logger.warning("%s is corrupt. Deleting the zip file and attempting to"
                                " download the embedding file again", EMBEDDINGS_FILE_PATH)
@@ -153,11 +316,78 @@ class GloVeEmbeddingsContainer:
         if not zip_file_object:
             raise EmbeddingDownloadError("Failed to download embeddings.")
 
-        with zip_file_object.open(file_name) as embedding_file:
-            self._extract_and_map(embedding_file)
+        self._extract_and_map(lambda: zip_file_object.open(file_name), store_path_prefix)
         return
 
 
+def _read_glove_file(glove_file):
+    """Reads the words and embeddings of a file in the GloVe text format. Malformed lines are
+    skipped.
+
+    Args:
+        glove_file (file): The GloVe file, opened in text or binary mode
+
+    Yields:
+        (tuple): The word and its float32 embedding
+    """
+    for line in glove_file:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        values = line.rstrip().split(' ')
+        try:
+            coefs = np.asarray(values[1:], dtype=np.float32)
+        except ValueError:
+            continue
+        yield values[0], coefs
+
+
+def _get_custom_store_path_prefix(file_location):
+    """Returns the location of the embedding store for a user provided GloVe file. Stores are
+    kept in the MindMeld data folder rather than next to the file, which may not be writable.
+
+    Args:
+        file_location (str): The path of the GloVe file
+
+    Returns:
+        (str): The path of the store files without their suffix
+    """
+    file_location = os.path.abspath(file_location)
+    path_hash = hashlib.sha1(file_location.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CUSTOM_EMBEDDINGS_FOLDER_PATH, '{}-{}'.format(
+        os.path.basename(file_location), path_hash))
+
+
+def _get_unknown_embedding_pool(dimension):
+    """Generates the pool of random vectors used for tokens without an embedding.
+
+    Args:
+        dimension (int): The embedding dimension
+
+    Returns:
+        (numpy.array): A (UNKNOWN_EMBEDDING_POOL_SIZE, dimension) float32 matrix
+    """
+    random_state = np.random.RandomState(UNKNOWN_EMBEDDING_SEED)
+    return random_state.uniform(
+        -1, 1, size=(UNKNOWN_EMBEDDING_POOL_SIZE, dimension)).astype(np.float32)
+
+
+def _get_unknown_embedding(pool, token):
+    return pool[zlib.crc32(token.encode('utf-8')) % len(pool)]
+
+
+def _index_tokens(tokens, vocab):
+    """Maps tokens to ids, adding new tokens to the vocabulary. Id 0 is reserved for padding.
+
+    Args:
+        tokens (iterable): The tokens to index
+        vocab (dict): The id of each token seen so far
+
+    Returns:
+        (list of int): The id of each token
+    """
+    return [vocab.setdefault(token, len(vocab) + 1) for token in tokens]
+
+
 class WordSequenceEmbedding:
     """WordSequenceEmbedding encodes a sequence of words into a sequence of fixed
     dimension real-numbered vectors by mapping each word as a vector.
@@ -179,11 +409,39 @@ class WordSequenceEmbedding:
         self.token_embedding_dimension = token_embedding_dimension
         self.sequence_padding_length = sequence_padding_length
 
-        self.token_to_embedding_mapping = GloVeEmbeddingsContainer(
+        self.pretrained_embeddings = GloVeEmbeddingsContainer(
             token_embedding_dimension,
             token_pretrained_embedding_filepath).get_pretrained_word_to_embeddings_dict()
 
+        # embeddings of tokens which are not in the pretrained embeddings
+        self.token_to_embedding_mapping = {}
         self._add_historic_embeddings()
+        self._unknown_embeddings = _get_unknown_embedding_pool(token_embedding_dimension)
+
+    def encode_sequences(self, token_sequences):
+        """Encodes a batch of token sequences into padded embedding matrices. The tokens of the
+        batch are mapped to an id matrix in one pass, and the embeddings of the distinct tokens
+        are gathered with a single indexing operation.
+
+        Args:
+            token_sequences (list of list of str): The token sequences
+
+        Returns:
+            (tuple): A tuple containing:
+                * (numpy.array): The (batch size, padding length, embedding dimension)
+                    float32 embeddings
+                * (numpy.array): The (batch size, padding length) boolean mask of the
+                    positions holding a token
+        """
+        sequences = [sequence[:self.sequence_padding_length] for sequence in token_sequences]
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        mask = np.arange(self.sequence_padding_length) < lengths[:, np.newaxis]
+
+        vocab = {}
+        ids = np.zeros(mask.shape, dtype=np.int64)
+        ids[mask] = _index_tokens((token for sequence in sequences for token in sequence), vocab)
+
+        return self._get_embedding_table(list(vocab))[ids], mask
 
     def encode_sequence_of_tokens(self, token_sequence):
         """Encodes a sequence of tokens into real value vectors.
@@ -194,15 +452,30 @@ class WordSequenceEmbedding:
         Returns:
             (list): Encoded sequence of tokens.
         """
-        default_encoding = np.zeros(self.token_embedding_dimension)
-        encoded_query = [default_encoding] * self.sequence_padding_length
+        embeddings, _ = self.encode_sequences([token_sequence])
+        return list(embeddings[0])
+
+    def _get_embedding_table(self, tokens):
+        """Builds the embedding matrix of the given tokens, preceded by a zero padding row.
 
-        for idx, token in enumerate(token_sequence):
-            if idx >= self.sequence_padding_length:
-                break
-            encoded_query[idx] = self._encode_token(token)
+        Args:
+            tokens (list of str): The tokens, in id order
 
-        return encoded_query
+        Returns:
+            (numpy.array): The (number of tokens + 1, embedding dimension) embedding matrix
+        """
+        table = np.zeros((len(tokens) + 1, self.token_embedding_dimension), dtype=np.float32)
+        if isinstance(self.pretrained_embeddings, EmbeddingStore):
+            rows = self.pretrained_embeddings.get_rows(tokens)
+        else:
+            rows = np.full(len(tokens), -1, dtype=np.int64)
+
+        found = rows >= 0
+        if found.any():
+            table[1:][found] = self.pretrained_embeddings.matrix[rows[found]]
+        for index in np.flatnonzero(~found):
+            table[index + 1] = self._encode_token(tokens[index])
+        return table
 
     def _encode_token(self, token):
         """Encodes a token to its corresponding embedding
@@ -213,10 +486,11 @@ class WordSequenceEmbedding:
         Returns:
             corresponding embedding
         """
-        if token not in self.token_to_embedding_mapping:
-            random_vector = np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
-            self.token_to_embedding_mapping[token] = random_vector
-        return self.token_to_embedding_mapping[token]
+        if token in self.token_to_embedding_mapping:
+            return self.token_to_embedding_mapping[token]
+        if token in self.pretrained_embeddings:
+            return self.pretrained_embeddings[token]
+        return _get_unknown_embedding(self._unknown_embeddings, token)
 
     def _add_historic_embeddings(self):
         historic_word_embeddings = {}
@@ -228,11 +502,14 @@ class WordSequenceEmbedding:
             pkl_file.close()
 
         for word in historic_word_embeddings:
+            if word in self.pretrained_embeddings:
+                continue
             if len(historic_word_embeddings[word]) == self.token_embedding_dimension:
                 self.token_to_embedding_mapping[word] = historic_word_embeddings.get(word)
 
     def save_embeddings(self):
-        """Save extracted embeddings to historic pickle file.
+        """Save the embeddings of tokens which are not in the pretrained embeddings to historic
+        pickle file.
         """
         output = open(PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH, 'wb')
         pickle.dump(self.token_to_embedding_mapping, output)
@@ -261,34 +538,52 @@ class CharacterSequenceEmbedding:
         self.max_char_per_word = max_char_per_word
         self.token_to_embedding_mapping = {}
         self._add_historic_embeddings()
+        self._unknown_embeddings = _get_unknown_embedding_pool(token_embedding_dimension)
 
-    def encode_sequence_of_tokens(self, token_sequence):
-        """Encodes a sequence of tokens into real value vectors.
+    def encode_sequences(self, token_sequences):
+        """Encodes a batch of token sequences into padded character embedding tensors. The
+        characters of the batch are mapped to an id tensor in one pass, and the embeddings of the
+        distinct characters are gathered with a single indexing operation.
 
         Args:
-            token_sequence (list): A sequence of tokens.
+            token_sequences (list of list of str): The token sequences
 
         Returns:
-            (list): Encoded sequence of tokens.
+            (tuple): A tuple containing:
+                * (numpy.array): The (batch size, padding length, max characters per word,
+                    embedding dimension) float32 embeddings
+                * (numpy.array): The (batch size, padding length, max characters per word)
+                    boolean mask of the positions holding a character
         """
-        default_encoding = np.zeros(self.token_embedding_dimension)
-        default_char_word = [default_encoding] * self.max_char_per_word
-        encoded_query = [default_char_word] * self.sequence_padding_length
+        sequences = [sequence[:self.sequence_padding_length] for sequence in token_sequences]
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        token_mask = np.arange(self.sequence_padding_length) < lengths[:, np.newaxis]
+
+        words = [token[:self.max_char_per_word] for sequence in sequences for token in sequence]
+        word_lengths = np.zeros(token_mask.shape, dtype=np.int64)
+        word_lengths[token_mask] = [len(word) for word in words]
+        mask = np.arange(self.max_char_per_word) < word_lengths[..., np.newaxis]
 
-        for idx, word_token in enumerate(token_sequence):
-            if idx >= self.sequence_padding_length:
-                break
+        vocab = {}
+        ids = np.zeros(mask.shape, dtype=np.int64)
+        ids[mask] = _index_tokens((char for word in words for char in word), vocab)
 
-            encoded_word = [default_encoding] * self.max_char_per_word
-            for idx2, char_token in enumerate(word_token):
-                if idx2 >= self.max_char_per_word:
-                    break
+        table = np.zeros((len(vocab) + 1, self.token_embedding_dimension), dtype=np.float32)
+        for char, char_id in vocab.items():
+            table[char_id] = self._encode_token(char)
+        return table[ids], mask
 
-                self._encode_token(char_token)
-                encoded_word[idx2] = self.token_to_embedding_mapping[char_token]
+    def encode_sequence_of_tokens(self, token_sequence):
+        """Encodes a sequence of tokens into real value vectors.
 
-            encoded_query[idx] = encoded_word
-        return encoded_query
+        Args:
+            token_sequence (list): A sequence of tokens.
+
+        Returns:
+            (list): Encoded sequence of tokens.
+        """
+        embeddings, _ = self.encode_sequences([token_sequence])
+        return [list(word) for word in embeddings[0]]
 
     def _encode_token(self, token):
         """Encodes a token to its corresponding embedding
@@ -299,10 +594,9 @@ class CharacterSequenceEmbedding:
         Returns:
             corresponding embedding
         """
-        if token not in self.token_to_embedding_mapping:
-            random_vector = np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
-            self.token_to_embedding_mapping[token] = random_vector
-        return self.token_to_embedding_mapping[token]
+        if token in self.token_to_embedding_mapping:
+            return self.token_to_embedding_mapping[token]
+        return _get_unknown_embedding(self._unknown_embeddings, token)
 
     def _add_historic_embeddings(self):
         historic_char_embeddings = {}
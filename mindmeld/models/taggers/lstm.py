@@ -10,14 +10,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent.futures import Future
+import copy
 import numpy as np
 import tensorflow as tf
 import re
 import math
 import logging
 import os
+import queue
+import threading
+import time
 
-from sklearn.externals import joblib
+import scipy.sparse
+
+from ... import serialization
 from .taggers import Tagger, extract_sequence_features
 from .embeddings import WordSequenceEmbedding, CharacterSequenceEmbedding
 from sklearn.preprocessing import LabelBinarizer
@@ -29,10 +36,86 @@ DEFAULT_LABEL = 'B|UNK'
 DEFAULT_GAZ_LABEL = 'O'
 RANDOM_SEED = 1
 ZERO_INITIALIZER_VALUE = 0
+INFERENCE_GRAPH_FILE_NAME = 'lstm_inference_graph.pb'
+INFERENCE_OUTPUT_NAME = 'output_softmax_tensor'
 
 logger = logging.getLogger(__name__)
 
 
+class _MicroBatcher:
+    """Collects inference requests from concurrent threads and serves them with a single call
+    to a batch function, run on a background worker thread.
+
+    Args:
+        run_batch (callable): Maps a list of items to a list of outputs of the same length
+        max_batch_size (int): The number of items after which a batch is run without waiting
+        max_wait (float): The maximum time in seconds to wait for more requests
+    """
+
+    def __init__(self, run_batch, max_batch_size, max_wait):
+        self._run_batch = run_batch
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, items):
+        """Runs the batch function on the given items, together with the items of any other
+        requests which arrive in the meantime.
+
+        Args:
+            items (list): The items of this request
+
+        Returns:
+            (list): The outputs for the items of this request
+        """
+        if not items:
+            return []
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((items, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            # worker threads do not survive a fork
+            if self._worker is None or self._worker[0] != os.getpid():
+                thread = threading.Thread(target=self._work, name='lstm-micro-batcher',
+                                          daemon=True)
+                self._queue = queue.Queue()
+                self._worker = (os.getpid(), thread)
+                thread.start()
+
+    def _work(self):
+        requests_queue = self._queue
+        while True:
+            requests = [requests_queue.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self._max_wait
+            while size < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(requests_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                size += len(requests[-1][0])
+
+            try:
+                outputs = self._run_batch([item for items, _ in requests for item in items])
+            except Exception as exc:  # pylint: disable=broad-except
+                for _, future in requests:
+                    future.set_exception(exc)
+                continue
+
+            start = 0
+            for items, future in requests:
+                future.set_result(outputs[start:start + len(items)])
+                start += len(items)
+
+
 class LstmModel(Tagger):
     """This class encapsulates the bi-directional LSTM model and provides
     the correct interface for use by the tagger model"""
@@ -53,6 +136,12 @@ class LstmModel(Tagger):
 
         return resized_predicted_tags
 
+    def extract_and_predict(self, examples, config, resources):
+        return self._decode_outputs(self._predict_examples(examples))
+
+    def predict_proba(self, examples, config, resources):
+        return self._decode_outputs(self._predict_examples(examples), with_proba=True)
+
     def set_params(self, **parameters):
         """
         Initialize params for the LSTM. The keys in the parameters dictionary
@@ -92,6 +181,25 @@ class LstmModel(Tagger):
             lstm_output_keep_prob: The dropout rate of the outputs of the LSTM cell (float)
 
             gaz_encoding_dimension: The gazetteer encoding dimension (int)
+
+            number_of_length_buckets: The number of sequence length buckets. Batches only
+                hold queries from one bucket and are cut to the bucket's length. The bucket
+                lengths are chosen from the quantiles of the training query lengths (int)
+
+            use_micro_batching: Whether to combine the inference requests of concurrent
+                threads into one run of the network (bool)
+
+            micro_batch_size: The number of queries after which a micro-batch is run
+                without waiting for more requests (int)
+
+            micro_batch_wait_ms: The maximum time in milliseconds to wait for more
+                requests before running a micro-batch (float)
+
+            intra_op_parallelism_threads: The number of threads used within a TensorFlow op.
+                0 lets TensorFlow choose (int)
+
+            inter_op_parallelism_threads: The number of TensorFlow ops run in parallel.
+                0 lets TensorFlow choose (int)
         """
         self.number_of_epochs = parameters.get('number_of_epochs', 20)
         self.batch_size = parameters.get('batch_size', 20)
@@ -120,48 +228,73 @@ class LstmModel(Tagger):
         self.word_level_character_embedding_size = \
             parameters.get('word_level_character_embedding_size', 40)
 
+        self.number_of_length_buckets = parameters.get('number_of_length_buckets', 4)
+        self.use_micro_batching = parameters.get('use_micro_batching', False)
+        self.micro_batch_size = parameters.get('micro_batch_size', 64)
+        self.micro_batch_wait_ms = parameters.get('micro_batch_wait_ms', 5)
+
+        self.intra_op_parallelism_threads = parameters.get('intra_op_parallelism_threads', 0)
+        self.inter_op_parallelism_threads = parameters.get('inter_op_parallelism_threads', 0)
+
     def get_params(self, deep=True):
         return self.__dict__
 
-    def construct_tf_variables(self):
+    def construct_tf_variables(self, inference=False):
         """
         Constructs the variables and operations in the TensorFlow session graph
+
+        Args:
+            inference (bool, optional): Whether to construct an inference-only graph, without
+                dropout, labels or optimizer
         """
         with self.graph.as_default():
-            self.dense_keep_prob_tf = tf.placeholder(tf.float32, name='dense_keep_prob_tf')
-            self.lstm_input_keep_prob_tf = \
-                tf.placeholder(tf.float32, name='lstm_input_keep_prob_tf')
-            self.lstm_output_keep_prob_tf = \
-                tf.placeholder(tf.float32, name='lstm_output_keep_prob_tf')
-
+            if inference:
+                # constant keep probabilities make TensorFlow leave the dropout ops out
+                self.dense_keep_prob_tf = None
+                self.lstm_input_keep_prob_tf = 1.0
+                self.lstm_output_keep_prob_tf = 1.0
+            else:
+                self.dense_keep_prob_tf = \
+                    tf.placeholder(tf.float32, name='dense_keep_prob_tf')
+                self.lstm_input_keep_prob_tf = \
+                    tf.placeholder(tf.float32, name='lstm_input_keep_prob_tf')
+                self.lstm_output_keep_prob_tf = \
+                    tf.placeholder(tf.float32, name='lstm_output_keep_prob_tf')
+
+            # The time dimension is left dynamic, so that batches can be cut to the length of
+            # their bucket
             self.query_input_tf = tf.placeholder(tf.float32,
                                                  [None,
-                                                  self.padding_length,
+                                                  None,
                                                   self.token_embedding_dimension],
                                                  name='query_input_tf')
 
             self.gaz_input_tf = tf.placeholder(tf.float32,
                                                [None,
-                                                self.padding_length,
+                                                None,
                                                 self.gaz_dimension],
                                                name='gaz_input_tf')
 
-            self.label_tf = tf.placeholder(tf.int32,
-                                           [None,
-                                            int(self.padding_length),
-                                            self.output_dimension],
-                                           name='label_tf')
-
             self.batch_sequence_lengths_tf = tf.placeholder(tf.int32, shape=[None],
                                                             name='batch_sequence_lengths_tf')
 
-            self.batch_sequence_mask_tf = tf.placeholder(
-                tf.bool, shape=[None], name='batch_sequence_mask_tf')
+            if inference:
+                self.label_tf = None
+                self.batch_sequence_mask_tf = None
+            else:
+                self.label_tf = tf.placeholder(tf.int32,
+                                               [None,
+                                                None,
+                                                self.output_dimension],
+                                               name='label_tf')
+
+                self.batch_sequence_mask_tf = tf.placeholder(
+                    tf.bool, shape=[None], name='batch_sequence_mask_tf')
 
             if self.use_char_embeddings:
                 self.char_input_tf = tf.placeholder(tf.float32,
                                                     [None,
-                                                     self.padding_length,
+                                                     None,
                                                      self.max_char_per_word,
                                                      self.character_embedding_dimension],
                                                     name='char_input_tf')
@@ -169,14 +302,26 @@ class LstmModel(Tagger):
             combined_embedding_tf = self._construct_embedding_network()
             self.lstm_output_tf = self._construct_lstm_network(combined_embedding_tf)
             self.lstm_output_softmax_tf = tf.nn.softmax(self.lstm_output_tf,
-                                                        name='output_softmax_tensor')
-            self.optimizer_tf, self.cost_tf = self._define_optimizer_and_cost()
+                                                        name=INFERENCE_OUTPUT_NAME)
+            if not inference:
+                self.optimizer_tf, self.cost_tf = self._define_optimizer_and_cost()
 
-            self.global_init = tf.global_variables_initializer()
-            self.local_init = tf.local_variables_initializer()
+                self.global_init = tf.global_variables_initializer()
+                self.local_init = tf.local_variables_initializer()
 
             self.saver = tf.train.Saver()
 
+    def _get_session_config(self):
+        """Returns the TensorFlow session config with the configured thread counts, so that
+        several worker processes can share the CPUs of a machine without oversubscribing them.
+
+        Returns:
+            (tf.ConfigProto): The session config
+        """
+        return tf.ConfigProto(
+            intra_op_parallelism_threads=int(self.intra_op_parallelism_threads),
+            inter_op_parallelism_threads=int(self.inter_op_parallelism_threads))
+
     def extract_features(self, examples, config, resources, y=None, fit=True):
         """Transforms a list of examples into features that are then used by the
         deep learning model.
@@ -209,6 +354,7 @@ class LstmModel(Tagger):
             gaz_entities = [k for k in self.resources.get('gazetteers', {}).keys()]
             gaz_entities.append(DEFAULT_GAZ_LABEL)
             self.gaz_encoder.fit(gaz_entities)
+            self._gaz_label_encodings = {}
 
             # The gaz dimension are the sum total of the gazetteer entities and
             # the 'other' gaz entity, which is the entity for all non-gazetteer tokens
@@ -222,6 +368,12 @@ class LstmModel(Tagger):
         x_sequence_embeddings_arr, self.gaz_features_arr, self.char_features_arr = \
             self._get_features(examples)
 
+        if y:
+            # save all the embeddings used for model saving purposes
+            self.query_encoder.save_embeddings()
+            if self.use_char_embeddings:
+                self.char_encoder.save_embeddings()
+
         self.sequence_lengths = self._extract_seq_length(examples)
 
         # There are no groups in this model
@@ -232,9 +384,12 @@ class LstmModel(Tagger):
         self.set_params(**config.params)
         self.label_encoder = LabelBinarizer()
         self.gaz_encoder = LabelBinarizer()
+        self._gaz_label_encodings = {}
 
         self.graph = tf.Graph()
         self.saver = None
+        self.length_buckets = None
+        self._micro_batcher = None
 
         self.example_type = config.example_type
         self.features = config.features
@@ -271,13 +426,19 @@ class LstmModel(Tagger):
         return_dict = {
             self.query_input_tf: batch_examples,
             self.batch_sequence_lengths_tf: batch_seq_len,
-            self.gaz_input_tf: batch_gaz,
-            self.dense_keep_prob_tf: self.dense_keep_probability,
-            self.lstm_input_keep_prob_tf: self.lstm_input_keep_prob,
-            self.lstm_output_keep_prob_tf: self.lstm_output_keep_prob,
-            self.batch_sequence_mask_tf: self._generate_boolean_mask(batch_seq_len)
+            self.gaz_input_tf: batch_gaz
         }
 
+        # the inference graph has no dropout or mask placeholders
+        if self.dense_keep_prob_tf is not None:
+            return_dict.update({
+                self.dense_keep_prob_tf: self.dense_keep_probability,
+                self.lstm_input_keep_prob_tf: self.lstm_input_keep_prob,
+                self.lstm_output_keep_prob_tf: self.lstm_output_keep_prob,
+                self.batch_sequence_mask_tf: self._generate_boolean_mask(
+                    batch_seq_len, np.shape(batch_examples)[1])
+            })
+
         if len(batch_labels) > 0:
             return_dict[self.label_tf] = batch_labels
 
@@ -333,8 +494,9 @@ class LstmModel(Tagger):
         Returns:
             (Tensor): Convolved output tensor
         """
+        time_dim = tf.shape(input_tensor)[1]
         convolution_reshaped_char_embedding = tf.reshape(input_tensor,
-                                                         [-1, self.padding_length,
+                                                         [-1, time_dim,
                                                           self.max_char_per_word,
                                                           self.character_embedding_dimension, 1])
 
@@ -344,7 +506,8 @@ class LstmModel(Tagger):
         # the output dimension which is a hyper-parameter.
         char_convolution_filter = tf.Variable(tf.random_normal(
             [1, char_window_size, self.character_embedding_dimension,
-             1, self.word_level_character_embedding_size], dtype=tf.float32))
+             1, self.word_level_character_embedding_size], dtype=tf.float32),
+            name='char_convolution_filter_{}'.format(char_window_size))
 
         # Strides is None because we want to advance one character at a time and one word at a time
         conv_output = tf.nn.convolution(convolution_reshaped_char_embedding,
@@ -362,21 +525,13 @@ class LstmModel(Tagger):
         # the num_filters dimension comes after the query_padding_length, so the last index
         # 4 is brought after the index 1.
         max_pool = tf.transpose(max_pool, [0, 1, 4, 2, 3])
-        max_pool = tf.reshape(max_pool, [batch_size, self.padding_length,
+        max_pool = tf.reshape(max_pool, [batch_size, time_dim,
                                          self.word_level_character_embedding_size])
 
+        # The bias is broadcast over the batch and time dimensions
         char_convolution_bias = tf.Variable(
-            tf.random_normal([self.word_level_character_embedding_size, ]))
-
-        char_convolution_bias = tf.tile(char_convolution_bias, [self.padding_length])
-        char_convolution_bias = tf.reshape(char_convolution_bias,
-                                           [self.padding_length,
-                                            self.word_level_character_embedding_size])
-
-        char_convolution_bias = tf.tile(char_convolution_bias, [batch_size, 1])
-        char_convolution_bias = tf.reshape(char_convolution_bias,
-                                           [batch_size, self.padding_length,
-                                            self.word_level_character_embedding_size])
+            tf.random_normal([self.word_level_character_embedding_size, ]),
+            name='char_convolution_bias_{}'.format(char_window_size))
 
         word_level_char_embedding = tf.nn.relu(max_pool + char_convolution_bias)
         return word_level_char_embedding
@@ -425,7 +580,7 @@ class LstmModel(Tagger):
             int: The number of queries where all the tags are correct
         """
         reshaped_output_arr = np.reshape(
-            output_arr, [-1, int(self.padding_length), self.output_dimension])
+            output_arr, [-1, np.shape(label_arr)[1], self.output_dimension])
         reshaped_output_arr = np.argmax(reshaped_output_arr, 2)
         reshaped_labels_arr = np.argmax(label_arr, 2)
 
@@ -459,22 +614,69 @@ class LstmModel(Tagger):
             padded_output.append(padded_seq)
         return padded_output
 
-    def _generate_boolean_mask(self, seq_lengths):
+    def _generate_boolean_mask(self, seq_lengths, time_length=None):
         """
         Generates boolean masks for each query in a query list
 
         Args:
             seq_lengths (list): A list of sequence lengths
+            time_length (int, optional): The padded length of the queries in the batch.
+                Defaults to the padding length.
 
         Return:
             list: A list of boolean masking values
         """
-        mask = [False] * (len(seq_lengths) * self.padding_length)
-        for idx, seq_len in enumerate(seq_lengths):
-            start_index = idx * self.padding_length
-            for i in range(start_index, start_index + seq_len):
-                mask[i] = True
-        return mask
+        time_length = self.padding_length if time_length is None else time_length
+        mask = np.arange(time_length) < np.asarray(seq_lengths, dtype=int)[:, np.newaxis]
+        return mask.ravel().tolist()
+
+    def _compute_length_buckets(self, sequence_lengths):
+        """Chooses the padded lengths of the batches from the quantiles of the sequence lengths.
+        The padding length is always the last bucket, so that every query fits in a bucket.
+
+        Args:
+            sequence_lengths (list): The sequence lengths of the training queries
+
+        Returns:
+            (list of int): The increasing bucket lengths
+        """
+        number_of_buckets = max(int(self.number_of_length_buckets), 1)
+        buckets = {int(self.padding_length)}
+        if len(sequence_lengths) and number_of_buckets > 1:
+            quantiles = np.percentile(
+                sequence_lengths, np.linspace(0, 100, number_of_buckets + 1)[1:-1])
+            buckets.update(min(max(int(math.ceil(quantile)), 1), int(self.padding_length))
+                           for quantile in quantiles)
+        return sorted(buckets)
+
+    def _get_batches(self, sequence_lengths, batch_size=None, shuffle=False):
+        """Groups queries into batches of queries from the same length bucket.
+
+        Args:
+            sequence_lengths (list): The sequence length of each query
+            batch_size (int, optional): The maximum number of queries in a batch. By default
+                each bucket is a single batch.
+            shuffle (bool, optional): Whether to shuffle the queries and the batches
+
+        Returns:
+            (list of tuple): The indices of the queries in each batch and the padded length
+                of the batch
+        """
+        buckets = getattr(self, 'length_buckets', None) or [int(self.padding_length)]
+        bucket_ids = np.searchsorted(buckets, np.asarray(sequence_lengths, dtype=int))
+
+        batches = []
+        for bucket_id in np.unique(bucket_ids):
+            indices = np.flatnonzero(bucket_ids == bucket_id)
+            if shuffle:
+                np.random.shuffle(indices)
+            size = batch_size or len(indices)
+            for start in range(0, len(indices), size):
+                batches.append((indices[start:start + size], buckets[bucket_id]))
+
+        if shuffle:
+            np.random.shuffle(batches)
+        return batches
 
     def _construct_lstm_state(self, initializer, hidden_dimension, batch_size, name):
         """Construct the LSTM initial state
@@ -566,7 +768,8 @@ class LstmModel(Tagger):
 
         # Construct the output later
         output_tf = tf.concat([output_fw, output_bw], axis=-1)
-        output_tf = tf.nn.dropout(output_tf, self.dense_keep_prob_tf)
+        if self.dense_keep_prob_tf is not None:
+            output_tf = tf.nn.dropout(output_tf, self.dense_keep_prob_tf)
 
         output_weights_tf = tf.get_variable(name='output_weights_tf',
                                             shape=[2 * n_hidden, self.output_dimension],
@@ -612,26 +815,42 @@ class LstmModel(Tagger):
         Returns:
             (tuple): Word embeddings and Gazetteer one-hot embeddings
         """
-        x_feats_array = []
-        gaz_feats_array = []
-        char_feats_array = []
-        for idx, example in enumerate(examples):
-            x_feat, gaz_feat, char_feat = self._extract_features(example)
-            x_feats_array.append(x_feat)
-            gaz_feats_array.append(gaz_feat)
-            char_feats_array.append(char_feat)
-
-        # save all the embeddings used for model saving purposes
-        self.query_encoder.save_embeddings()
-        if self.use_char_embeddings:
-            self.char_encoder.save_embeddings()
+        gaz_feats_array = self._get_gaz_features(examples)
 
-        x_feats_array = np.asarray(x_feats_array)
-        gaz_feats_array = np.asarray(gaz_feats_array)
-        char_feats_array = np.asarray(char_feats_array) if self.use_char_embeddings else []
+        # the whole batch is embedded at once
+        token_sequences = [example.normalized_tokens for example in examples]
+        x_feats_array, _ = self.query_encoder.encode_sequences(token_sequences)
+        if self.use_char_embeddings:
+            char_feats_array, _ = self.char_encoder.encode_sequences(token_sequences)
+        else:
+            char_feats_array = []
 
         return x_feats_array, gaz_feats_array, char_feats_array
 
+    def _get_gaz_features(self, examples):
+        """Extracts the gazetteer one-hot encodings of the input examples
+
+        Args:
+            examples (list of mindmeld.core.Query): a list of queries
+
+        Returns:
+            (scipy.sparse.csr_matrix): The (examples, padding length * gaz dimension) \
+                gazetteer encodings
+        """
+        gaz_columns = []
+        gaz_values = []
+        for example in examples:
+            columns, values = self._extract_features(example)
+            gaz_columns.append(columns)
+            gaz_values.append(values)
+
+        indptr = np.zeros(len(examples) + 1, dtype=np.int64)
+        np.cumsum([len(columns) for columns in gaz_columns], out=indptr[1:])
+        return scipy.sparse.csr_matrix(
+            (np.concatenate(gaz_values + [[]]).astype(np.float32),
+             np.concatenate(gaz_columns + [[]]).astype(np.int64), indptr),
+            shape=(len(examples), self.padding_length * self.gaz_dimension))
+
     def _gaz_transform(self, list_of_tokens_to_transform):
         """This function is used to handle special logic around SKLearn's LabelBinarizer
         class which behaves in a non-standard way for 2 classes. In a 2 class system,
@@ -651,16 +870,47 @@ class LstmModel(Tagger):
             output = np.hstack((1 - output, output))
         return output
 
+    def _get_gaz_encoding(self, gaz_label):
+        """Returns the encoding of a gazetteer label, memoized for the fitted gazetteer encoder
+
+        Args:
+            gaz_label (str): A gazetteer label
+
+        Returns:
+            (ndarray): The encoding of the label
+        """
+        encoding = self._gaz_label_encodings.get(gaz_label)
+        if encoding is None:
+            encoding = self._gaz_transform([gaz_label])[0]
+            self._gaz_label_encodings[gaz_label] = encoding
+        return encoding
+
+    def _densify_gaz_features(self, gaz_features, indices, time_length):
+        """Densifies the gazetteer encodings of a batch of examples
+
+        Args:
+            gaz_features (scipy.sparse.csr_matrix): The sparse gazetteer encodings
+            indices (ndarray): The indices of the examples in the batch
+            time_length (int): The padded length of the batch
+
+        Returns:
+            (ndarray): The (batch size, time length, gaz dimension) gazetteer encodings
+        """
+        batch = gaz_features[indices][:, :time_length * self.gaz_dimension].toarray()
+        return batch.reshape(len(indices), time_length, self.gaz_dimension)
+
     def _extract_features(self, example):
-        """Extracts feature dicts for each token in an example.
+        """Extracts the gazetteer one-hot encodings for each token in an example. Word and
+        character embeddings are computed for whole batches in :meth:`_get_features`.
 
         Args:
             example (mindmeld.core.Query): an query
 
         Returns:
-            (list of dict): features
+            (tuple): The nonzero columns of the padded, flattened gazetteer encodings and \
+                their values
         """
-        default_gaz_one_hot = self._gaz_transform([DEFAULT_GAZ_LABEL]).tolist()[0]
+        default_gaz_one_hot = self._get_gaz_encoding(DEFAULT_GAZ_LABEL)
         extracted_gaz_tokens = [default_gaz_one_hot] * self.padding_length
         extracted_sequence_features = extract_sequence_features(
             example, self.example_type, self.features, self.resources)
@@ -688,19 +938,12 @@ class LstmModel(Tagger):
                         regex_match.group(REGEX_TYPE_POSITIONAL_INDEX))
 
             if len(combined_gaz_features) != 0:
-                total_encoding = np.zeros(self.gaz_dimension, dtype=np.int)
-                for encoding in self._gaz_transform(list(combined_gaz_features)):
-                    total_encoding = np.add(total_encoding, encoding)
-                extracted_gaz_tokens[index] = total_encoding.tolist()
-
-        padded_query = self.query_encoder.encode_sequence_of_tokens(example.normalized_tokens)
+                extracted_gaz_tokens[index] = sum(
+                    self._get_gaz_encoding(gaz_label) for gaz_label in combined_gaz_features)
 
-        if self.use_char_embeddings:
-            padded_char = self.char_encoder.encode_sequence_of_tokens(example.normalized_tokens)
-        else:
-            padded_char = None
-
-        return padded_query, extracted_gaz_tokens, padded_char
+        encodings = np.asarray(extracted_gaz_tokens)
+        columns = np.flatnonzero(encodings)
+        return columns, encodings.ravel()[columns]
 
     def _fit(self, X, y):
         """Trains a classifier without cross-validation. It iterates through
@@ -711,35 +954,31 @@ class LstmModel(Tagger):
             X (list of list of list of str): a list of queries to train on
             y (list of list of str): a list of expected labels
         """
+        self.length_buckets = self._compute_length_buckets(self.sequence_lengths)
+        logger.info("Training with sequence length buckets %s", self.length_buckets)
+
         self.construct_tf_variables()
-        self.session = tf.Session(graph=self.graph)
+        self.session = tf.Session(graph=self.graph, config=self._get_session_config())
 
         self.session.run([self.global_init, self.local_init])
 
+        seq_len = np.array(self.sequence_lengths)
+        batch_size = int(self.batch_size)
         for epochs in range(int(self.number_of_epochs)):
             logger.info("Training epoch : {}".format(epochs))
 
-            indices = [x for x in range(len(X))]
-            np.random.shuffle(indices)
-
-            gaz = self.gaz_features_arr[indices]
-            char = self.char_features_arr[indices] if self.use_char_embeddings else []
-
-            examples = X[indices]
-            labels = y[indices]
-            batch_size = int(self.batch_size)
-            num_batches = int(math.ceil(len(examples) / batch_size))
-            seq_len = np.array(self.sequence_lengths)[indices]
-
-            for batch in range(num_batches):
-                batch_start_index = batch * batch_size
-                batch_end_index = (batch * batch_size) + batch_size
-
-                batch_examples = examples[batch_start_index:batch_end_index]
-                batch_labels = labels[batch_start_index:batch_end_index]
-                batch_gaz = gaz[batch_start_index:batch_end_index]
-                batch_seq_len = seq_len[batch_start_index:batch_end_index]
-                batch_char = char[batch_start_index:batch_end_index]
+            # each batch holds queries of similar length and is cut to the length of its bucket
+            batches = self._get_batches(seq_len, batch_size, shuffle=True)
+            for batch, (indices, time_length) in enumerate(batches):
+                batch_examples = X[indices, :time_length]
+                batch_labels = y[indices, :time_length]
+                batch_gaz = self._densify_gaz_features(
+                    self.gaz_features_arr, indices, time_length)
+                batch_seq_len = seq_len[indices]
+                if self.use_char_embeddings:
+                    batch_char = self.char_features_arr[indices, :time_length]
+                else:
+                    batch_char = []
 
                 if batch % int(self.display_epoch) == 0:
                     output, loss, _ = self.session.run([self.lstm_output_tf,
@@ -755,11 +994,11 @@ class LstmModel(Tagger):
                     score = self._calculate_score(output, batch_labels, batch_seq_len)
                     accuracy = score / (len(batch_examples) * 1.0)
 
-                    logger.info("Trained batch from index {} to {}, "
+                    logger.info("Trained batch {} of {} with padded length {}, "
                                 "Mini-batch loss: {:.5f}, "
-                                "Training sequence accuracy: {:.5f}".format(batch * batch_size,
-                                                                            (batch * batch_size) +
-                                                                            batch_size, loss,
+                                "Training sequence accuracy: {:.5f}".format(batch + 1,
+                                                                            len(batches),
+                                                                            time_length, loss,
                                                                             accuracy))
                 else:
                     self.session.run(self.optimizer_tf,
@@ -780,63 +1019,114 @@ class LstmModel(Tagger):
         Returns:
             (list): A list of decoded labelled predicted by the model
         """
-        seq_len_arr = np.array(self.sequence_lengths)
+        return self._decode_outputs(self._get_softmax_outputs(
+            X, self.char_features_arr, self.gaz_features_arr, self.sequence_lengths))
 
-        # During predict time, we make sure no nodes are dropped out
-        self.dense_keep_probability = 1.0
-        self.lstm_input_keep_prob = 1.0
-        self.lstm_output_keep_prob = 1.0
+    def _predict_proba(self, X):
+        """Predict tags for query sequence with their confidence scores
 
-        output = self.session.run(
-            [self.lstm_output_softmax_tf],
-            feed_dict=self.construct_feed_dictionary(
-                X, self.char_features_arr, self.gaz_features_arr, seq_len_arr))
+        Args:
+            X (list of list of list of str): a list of input representations
 
-        output = np.reshape(output, [-1, int(self.padding_length), self.output_dimension])
-        output = np.argmax(output, 2)
+        Returns:
+            (list): A list of decoded labelled predicted by the model with confidence scores
+        """
+        return self._decode_outputs(self._get_softmax_outputs(
+            X, self.char_features_arr, self.gaz_features_arr, self.sequence_lengths),
+            with_proba=True)
 
-        decoded_queries = []
-        for idx, encoded_predict in enumerate(output):
-            decoded_query = []
-            for tag in encoded_predict[:self.sequence_lengths[idx]]:
-                decoded_query.append(self.label_encoder.classes_[tag])
-            decoded_queries.append(decoded_query)
+    def _predict_examples(self, examples):
+        """Extracts the features of the examples and runs the network on them. Unlike
+        :meth:`extract_features`, this does not store the features on the model, so it can be
+        called from concurrent threads.
 
-        return decoded_queries
+        Args:
+            examples (list of mindmeld.core.Query): a list of queries
 
-    def _predict_proba(self, X):
-        """Predict tags for query sequence with their confidence scores
+        Returns:
+            (list of ndarray): The softmax output for each token of each example
+        """
+        x_feats_array, gaz_feats_array, char_feats_array = self._get_features(examples)
+        seq_lengths = self._extract_seq_length(examples)
+
+        if not self.use_micro_batching:
+            return self._get_softmax_outputs(
+                x_feats_array, char_feats_array, gaz_feats_array, seq_lengths)
+
+        items = [(x_feats_array[idx], gaz_feats_array[idx],
+                  char_feats_array[idx] if self.use_char_embeddings else None,
+                  seq_lengths[idx]) for idx in range(len(examples))]
+        return self._get_micro_batcher().submit(items)
+
+    def _get_micro_batcher(self):
+        if getattr(self, '_micro_batcher', None) is None:
+            self._micro_batcher = _MicroBatcher(self._run_micro_batch,
+                                                int(self.micro_batch_size),
+                                                self.micro_batch_wait_ms / 1000.0)
+        return self._micro_batcher
+
+    def _run_micro_batch(self, items):
+        x_feats, gaz_feats, char_feats, seq_lengths = zip(*items)
+        char_feats_array = np.stack(char_feats) if self.use_char_embeddings else []
+        return self._get_softmax_outputs(
+            np.stack(x_feats), char_feats_array, scipy.sparse.vstack(gaz_feats, format='csr'),
+            list(seq_lengths))
+
+    def _get_softmax_outputs(self, X, char_features, gaz_features, sequence_lengths):
+        """Runs the network on the examples, one batch per length bucket.
 
         Args:
-            X (list of list of list of str): a list of input representations
+            X (ndarray): The padded word embeddings of the examples
+            char_features (ndarray): The padded character embeddings of the examples
+            gaz_features (scipy.sparse.csr_matrix): The sparse gazetteer encodings of the
+                examples
+            sequence_lengths (list): The sequence length of each example
 
         Returns:
-            (list): A list of decoded labelled predicted by the model with confidence scores
+            (list of ndarray): The softmax output for each token of each example
         """
+        X = np.asarray(X, dtype='float32')
+        seq_len_arr = np.array(sequence_lengths, dtype=int)
 
-        seq_len_arr = np.array(self.sequence_lengths)
+        outputs = [None] * len(seq_len_arr)
+        for indices, time_length in self._get_batches(seq_len_arr):
+            batch_char = char_features[indices, :time_length] if len(char_features) else []
+            feed_dict = self.construct_feed_dictionary(
+                X[indices, :time_length], batch_char,
+                self._densify_gaz_features(gaz_features, indices, time_length),
+                seq_len_arr[indices])
 
-        # During predict time, we make sure no nodes are dropped out
-        self.dense_keep_probability = 1.0
-        self.lstm_input_keep_prob = 1.0
-        self.lstm_output_keep_prob = 1.0
+            if self.dense_keep_prob_tf is not None:
+                # During predict time, we make sure no nodes are dropped out
+                feed_dict.update({self.dense_keep_prob_tf: 1.0,
+                                  self.lstm_input_keep_prob_tf: 1.0,
+                                  self.lstm_output_keep_prob_tf: 1.0})
 
-        output = self.session.run(
-            [self.lstm_output_softmax_tf],
-            feed_dict=self.construct_feed_dictionary(
-                X, self.char_features_arr, self.gaz_features_arr, seq_len_arr))
+            output = self.session.run(self.lstm_output_softmax_tf, feed_dict=feed_dict)
+            for index, example_output in zip(indices, output):
+                outputs[index] = example_output[:seq_len_arr[index]]
 
-        output = np.reshape(output, [-1, int(self.padding_length), self.output_dimension])
-        class_output = np.argmax(output, 2)
+        return outputs
 
-        decoded_queries = []
-        for idx, encoded_predict in enumerate(class_output):
-            decoded_query = []
-            for token_idx, tag in enumerate(encoded_predict[:self.sequence_lengths[idx]]):
-                decoded_query.append([self.label_encoder.classes_[tag],
-                                      output[idx][token_idx][tag]])
-            decoded_queries.append(decoded_query)
+    def _decode_outputs(self, outputs, with_proba=False):
+        """Decodes the softmax outputs of the network into tags
+
+        Args:
+            outputs (list of ndarray): The softmax output for each token of each example
+            with_proba (bool, optional): Whether to return the confidence score of each tag
 
+        Returns:
+            (list): A list of decoded labelled predicted by the model, with confidence scores
+                if requested
+        """
+        decoded_queries = []
+        for output in outputs:
+            tags = np.argmax(output, axis=1) if len(output) else []
+            if with_proba:
+                decoded_queries.append([[self.label_encoder.classes_[tag], output[idx][tag]]
+                                        for idx, tag in enumerate(tags)])
+            else:
+                decoded_queries.append([self.label_encoder.classes_[tag] for tag in tags])
         return decoded_queries
 
     def dump(self, path, config):
@@ -860,23 +1150,90 @@ class LstmModel(Tagger):
             return
 
         self.saver.save(self.session, os.path.join(path, 'lstm_model'))
+        self._export_inference_graph(path)
 
         # Save feature extraction variables
         variables_to_dump = {
             'resources': self.resources,
             'gaz_dimension': self.gaz_dimension,
             'output_dimension': self.output_dimension,
-            'gaz_features': self.gaz_features_arr,
-            'sequence_lengths': self.sequence_lengths,
+            'length_buckets': self.length_buckets,
             'gaz_encoder': self.gaz_encoder,
             'label_encoder': self.label_encoder
         }
 
-        joblib.dump(variables_to_dump, os.path.join(path, '.feature_extraction_vars'))
+        serialization.dump(variables_to_dump, os.path.join(path, '.feature_extraction_vars'))
+
+    def _export_inference_graph(self, path):
+        """Writes a frozen inference graph next to the checkpoint. The graph is rebuilt
+        without dropout, labels and optimizer, its variables are converted to constants, it is
+        pruned to the softmax output and, when TensorFlow provides graph transforms, its constant
+        subgraphs are folded.
+
+        Args:
+            path (str): the folder path for the entity model folder
+        """
+        inference_model = copy.copy(self)
+        inference_model.graph = tf.Graph()
+        inference_model.construct_tf_variables(inference=True)
+
+        with tf.Session(graph=inference_model.graph) as session:
+            inference_model.saver.restore(session, os.path.join(path, 'lstm_model'))
+            graph_def = tf.graph_util.convert_variables_to_constants(
+                session, inference_model.graph.as_graph_def(), [INFERENCE_OUTPUT_NAME])
+
+        try:
+            from tensorflow.tools.graph_transforms import TransformGraph
+        except ImportError:
+            logger.info('Graph transforms are not available in this version of TensorFlow. '
+                        'Exporting the inference graph without folding constants.')
+        else:
+            input_names = ['query_input_tf', 'gaz_input_tf', 'batch_sequence_lengths_tf']
+            if self.use_char_embeddings:
+                input_names.append('char_input_tf')
+            graph_def = TransformGraph(graph_def, input_names, [INFERENCE_OUTPUT_NAME],
+                                       ['fold_constants(ignore_errors=true)'])
+
+        graph_path = os.path.join(path, INFERENCE_GRAPH_FILE_NAME)
+        with open(graph_path + '.tmp', 'wb') as graph_file:
+            graph_file.write(graph_def.SerializeToString())
+        os.replace(graph_path + '.tmp', graph_path)
+
+    def _load_inference_graph(self, graph_path):
+        """Loads a frozen inference graph written by :meth:`_export_inference_graph`
+
+        Args:
+            graph_path (str): the path of the graph file
+        """
+        graph_def = tf.GraphDef()
+        with open(graph_path, 'rb') as graph_file:
+            graph_def.ParseFromString(graph_file.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+        self.session = tf.Session(graph=self.graph, config=self._get_session_config())
+
+        self.dense_keep_prob_tf = None
+        self.lstm_input_keep_prob_tf = None
+        self.lstm_output_keep_prob_tf = None
+        self.label_tf = None
+        self.batch_sequence_mask_tf = None
+        self.lstm_output_tf = None
+
+        self.query_input_tf = self.graph.get_tensor_by_name('query_input_tf:0')
+        self.gaz_input_tf = self.graph.get_tensor_by_name('gaz_input_tf:0')
+        self.batch_sequence_lengths_tf = \
+            self.graph.get_tensor_by_name('batch_sequence_lengths_tf:0')
+        self.lstm_output_softmax_tf = \
+            self.graph.get_tensor_by_name(INFERENCE_OUTPUT_NAME + ':0')
+        if self.use_char_embeddings:
+            self.char_input_tf = self.graph.get_tensor_by_name('char_input_tf:0')
 
     def load(self, path):
         """
-        Loads the Tensorflow model
+        Loads the Tensorflow model. The frozen inference graph is preferred, the full
+        training graph is restored for models saved without one.
 
         Args:
             path (str): the folder path for the entity model folder
@@ -888,8 +1245,21 @@ class LstmModel(Tagger):
             # for this.
             return
 
+        if os.path.exists(os.path.join(path, INFERENCE_GRAPH_FILE_NAME)):
+            self._load_inference_graph(os.path.join(path, INFERENCE_GRAPH_FILE_NAME))
+        else:
+            self._restore_training_graph(path)
+
+        self._load_feature_extraction_vars(path)
+
+    def _restore_training_graph(self, path):
+        """Restores the full training graph from the checkpoint
+
+        Args:
+            path (str): the folder path for the entity model folder
+        """
         self.graph = tf.Graph()
-        self.session = tf.Session(graph=self.graph)
+        self.session = tf.Session(graph=self.graph, config=self._get_session_config())
 
         with self.graph.as_default():
             saver = tf.train.import_meta_graph(os.path.join(path, 'lstm_model.meta'))
@@ -925,12 +1295,19 @@ class LstmModel(Tagger):
             if self.use_char_embeddings:
                 self.char_input_tf = self.session.graph.get_tensor_by_name('char_input_tf:0')
 
-        # Load feature extraction variables
-        variables_to_load = joblib.load(os.path.join(path, '.feature_extraction_vars'))
+    def _load_feature_extraction_vars(self, path):
+        """Loads the feature extraction variables
+
+        Args:
+            path (str): the folder path for the entity model folder
+        """
+        variables_to_load = serialization.load(os.path.join(path, '.feature_extraction_vars'))
         self.resources = variables_to_load['resources']
         self.gaz_dimension = variables_to_load['gaz_dimension']
         self.output_dimension = variables_to_load['output_dimension']
-        self.gaz_features = variables_to_load['gaz_features']
-        self.sequence_lengths = variables_to_load['sequence_lengths']
+        self.length_buckets = variables_to_load.get('length_buckets')
+        if self.query_input_tf.shape[1].value is not None:
+            # models trained before length bucketing have a fixed time dimension
+            self.length_buckets = [self.query_input_tf.shape[1].value]
         self.gaz_encoder = variables_to_load['gaz_encoder']
         self.label_encoder = variables_to_load['label_encoder']
@@ -20,13 +20,25 @@ from sklearn.feature_selection import SelectFromModel, SelectPercentile
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder as SKLabelEncoder, MaxAbsScaler, StandardScaler
 import numpy as np
+from scipy.special import expit
 from .taggers import Tagger, START_TAG, extract_sequence_features
 
 logger = logging.getLogger(__name__)
 
+# The maximum number of queries decoded together
+DECODE_BATCH_SIZE = 500
+
 
 class MemmModel(Tagger):
-    """A maximum-entropy Markov model."""
+    """A maximum-entropy Markov model.
+
+    Sequences are decoded with a beam search over the tags. The size of the beam can be set with
+    the ``beam_size`` model setting. By default the beam includes every tag, which makes the
+    search an exact Viterbi search. A beam size of 1 corresponds to greedy decoding.
+    """
+    # The number of tags kept at each position during decoding. None keeps all tags.
+    _beam_size = None
+
     @staticmethod
     def _predict_proba(X):
         del X
@@ -104,44 +116,110 @@ class MemmModel(Tagger):
         return X, y, groups
 
     def extract_and_predict(self, examples, config, resources):
-        return [self._predict_example(example, config, resources) for example in examples]
+        return [[tag for tag, _ in tags_probas]
+                for tags_probas in self.predict_proba(examples, config, resources)]
 
     def _predict_example(self, example, config, resources):
-        features_by_segment = self.extract_example_features(example, config, resources)
-        if len(features_by_segment) == 0:
-            return []
-
-        predicted_tags = []
-        prev_tag = START_TAG
-        for features in features_by_segment:
-            features['prev_tag'] = prev_tag
-            X, _ = self._preprocess_data([features])
-            prediction = self.predict(X)
-            predicted_tag = self.class_encoder.inverse_transform(prediction)[0]
-            predicted_tags.append(predicted_tag)
-            prev_tag = predicted_tag
-
-        return predicted_tags
+        return self.extract_and_predict([example], config, resources)[0]
 
     def predict_proba(self, examples, config, resources):
-        return [self._predict_proba_example(example, config, resources)
-                for example in examples]
+        predictions = []
+        for start in range(0, len(examples), DECODE_BATCH_SIZE):
+            features_by_example = [
+                self.extract_example_features(example, config, resources)
+                for example in examples[start:start + DECODE_BATCH_SIZE]]
+            predictions.extend(self._decode(features_by_example))
+        return predictions
 
     def _predict_proba_example(self, example, config, resources):
-        features_by_segment = self.extract_example_features(example, config, resources)
-        if len(features_by_segment) == 0:
-            return []
-
-        prev_tag = START_TAG
-        seq_log_probs = []
-        for features in features_by_segment:
-            features['prev_tag'] = prev_tag
-            X, _ = self._preprocess_data([features])
-            prediction = self._clf.predict_proba(X)[0]
-            predicted_tag = np.argmax(prediction)
-            prev_tag = self.class_encoder.inverse_transform(predicted_tag)
-            seq_log_probs.append([prev_tag, prediction[predicted_tag]])
-        return seq_log_probs
+        return self.predict_proba([example], config, resources)[0]
+
+    def _decode(self, features_by_example):
+        """Finds the most likely tag sequences for a batch of queries with a beam search.
+
+        The features of all segments in the batch are vectorized in a single pass without the
+        previous tag. Since the model is linear, the contribution of the previous tag is added to
+        the scores of each segment for every possible previous tag at once. The search then
+        advances all queries in lockstep, one position at a time.
+
+        Args:
+            features_by_example (list of list of dict): The features for each segment of each
+                query.
+
+        Returns:
+            (list of list): For each query, a list of ``[tag, probability]`` pairs, where the
+                probability is that of the tag given the previous tag.
+        """
+        lengths = np.array([len(features) for features in features_by_example], dtype=np.int64)
+        if not lengths.any():
+            return [[] for _ in features_by_example]
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        X, _ = self._preprocess_data([segment for features in features_by_example
+                                      for segment in features])
+        # shape: (num_segments, 1, num_scores)
+        scores = self._get_scores(X)[:, np.newaxis, :]
+        # shape: (num_segments, num_prev_tags, num_tags), where the first previous tag is the
+        # start tag and the others follow the order of the class encoder
+        with np.errstate(divide='ignore'):
+            log_probas = np.log(self._scores_to_proba(scores + self._get_transition_scores()))
+
+        num_segments, _, num_tags = log_probas.shape
+        beam_size = self._beam_size or num_tags
+        backpointers = np.zeros((num_segments, num_tags), dtype=np.int64)
+        has_segments = lengths > 0
+        path_scores = np.full((len(lengths), num_tags), -np.inf)
+        path_scores[has_segments] = log_probas[offsets[has_segments], 0]
+        for position in range(1, lengths.max()):
+            active = np.flatnonzero(lengths > position)
+            rows = offsets[active] + position
+            active_scores = path_scores[active]
+            if beam_size < num_tags:
+                pruned = np.argsort(active_scores, axis=1)[:, :num_tags - beam_size]
+                active_scores[np.arange(len(active))[:, np.newaxis], pruned] = -np.inf
+            # shape: (num_active, num_prev_tags, num_tags)
+            candidate_scores = active_scores[:, :, np.newaxis] + log_probas[rows, 1:]
+            backpointers[rows] = np.argmax(candidate_scores, axis=1)
+            path_scores[active] = np.max(candidate_scores, axis=1)
+
+        tags = np.zeros(num_segments, dtype=np.int64)
+        last_rows = offsets[has_segments] + lengths[has_segments] - 1
+        tags[last_rows] = np.argmax(path_scores[has_segments], axis=1)
+        for position in range(lengths.max() - 1, 0, -1):
+            rows = offsets[lengths > position] + position
+            tags[rows - 1] = backpointers[rows, tags[rows]]
+
+        prev_tags = np.concatenate([[0], tags[:-1] + 1])
+        prev_tags[offsets[has_segments]] = 0
+        probas = np.exp(log_probas[np.arange(num_segments), prev_tags, tags])
+        decoded_tags = self.class_encoder.inverse_transform(tags)
+        return [[[tag, proba] for tag, proba in zip(decoded_tags[offset:offset + length],
+                                                    probas[offset:offset + length])]
+                for offset, length in zip(offsets, lengths)]
+
+    def _get_scores(self, X):
+        """Returns the decision scores of the linear model, with one column per row of its
+        coefficient matrix."""
+        return X.dot(self._clf.coef_.T) + self._clf.intercept_
+
+    def _get_transition_scores(self):
+        """Returns the contribution of each possible previous tag to the decision scores of the
+        linear model, with the start tag in the first row."""
+        prev_tags = [START_TAG] + list(self.class_encoder.classes_)
+        X, _ = self._preprocess_data([{'prev_tag': tag} for tag in prev_tags])
+        return X.dot(self._clf.coef_.T)
+
+    def _scores_to_proba(self, scores):
+        """Converts the decision scores of the linear model to class probabilities in the same way
+        as ``LogisticRegression.predict_proba``."""
+        if scores.shape[-1] == 1:
+            proba = expit(scores)
+            return np.concatenate([1 - proba, proba], axis=-1)
+        if self._clf.multi_class == 'multinomial':
+            scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        else:
+            scores = expit(scores)
+        return scores / scores.sum(axis=-1, keepdims=True)
 
     @staticmethod
     def _get_feature_selector(selector_type):
@@ -167,9 +245,15 @@ class MemmModel(Tagger):
         if config.model_settings is None:
             selector_type = None
             scale_type = None
+            beam_size = None
         else:
             selector_type = config.model_settings.get('feature_selector')
             scale_type = config.model_settings.get('feature_scaler')
+            beam_size = config.model_settings.get('beam_size')
+        if beam_size is not None and (not isinstance(beam_size, int) or beam_size < 1):
+            raise ValueError('Invalid beam size {!r}, expected a positive integer'.format(
+                beam_size))
+        self._beam_size = beam_size
         self.class_encoder = SKLabelEncoder()
         self.feat_vectorizer = DictVectorizer()
         self._feat_selector = self._get_feature_selector(selector_type)
@@ -14,10 +14,13 @@
 """
 This module contains all code required to perform sequence tagging.
 """
+from bisect import bisect_left
+from itertools import accumulate
 import logging
 import copy
+import re
 
-from ...core import QueryEntity, Span, TEXT_FORM_RAW, \
+from ...core import Entity, QueryEntity, Span, TEXT_FORM_RAW, TEXT_FORMS, \
     TEXT_FORM_NORMALIZED, _sort_by_lowest_time_grain
 from ...ser import resolve_system_entity, SystemEntityResolutionError
 from ..helpers import get_feature_extractor, ENABLE_STEMMING
@@ -205,6 +208,75 @@ class Tagger:
         pass
 
 
+_TOKEN_PATTERN = re.compile(r'\S+')
+
+
+class _QueryOffsets:
+    """The character offsets of the normalized tokens of a query, and the token boundaries of
+    each of its text forms. They are computed once per query, so that entities can be built
+    from token indices without rescanning the query text for every entity.
+
+    Args:
+        query (Query): The query
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.normalized_tokens = query.normalized_tokens
+        # tokens are joined by single spaces in the normalized text
+        self.token_starts = [0] + list(accumulate(len(token) + 1
+                                                  for token in self.normalized_tokens))
+        self._form_token_starts = {}
+
+    def get_normalized_span(self, token_start, tokens):
+        """Returns the normalized text span of a sequence of tokens
+
+        Args:
+            token_start (int): The index of the first token
+            tokens (list of str): The tokens
+
+        Returns:
+            (Span): The span
+        """
+        start = self.token_starts[token_start]
+        return Span(start, start - 1 + len(' '.join(tokens)))
+
+    def _count_tokens_before(self, form, index):
+        """Counts the whitespace-separated tokens of a text form which start before an index,
+        i.e. ``len(text[:index].split())``.
+        """
+        starts = self._form_token_starts.get(form)
+        if starts is None:
+            starts = [match.start() for match in
+                      _TOKEN_PATTERN.finditer(self.query.get_text_form(form))]
+            self._form_token_starts[form] = starts
+        return bisect_left(starts, index)
+
+    def create_entity(self, normalized_span, entity_type):
+        """Creates a query entity from its normalized text span. This is equivalent to
+        ``QueryEntity.from_query(query, normalized_span=normalized_span,
+        entity_type=entity_type)``.
+
+        Args:
+            normalized_span (Span): The span of the entity in the normalized text
+            entity_type (str): The entity type
+
+        Returns:
+            (QueryEntity): The entity
+        """
+        texts, spans, token_spans = [], [], []
+        for form in TEXT_FORMS:
+            span = self.query.transform_span(normalized_span, TEXT_FORM_NORMALIZED, form)
+            text = span.slice(self.query.get_text_form(form))
+            token_start = self._count_tokens_before(form, span.start)
+            texts.append(text)
+            spans.append(span)
+            token_spans.append(Span(token_start, token_start - 1 + len(text.split())))
+
+        return QueryEntity(tuple(texts), tuple(spans), tuple(token_spans),
+                           Entity(texts[0], entity_type))
+
+
 def get_tags_from_entities(query, entities, scheme='IOB'):
     """Get joint app and system IOB tags from a query's entities.
 
@@ -226,27 +298,24 @@ def get_tags_from_entities(query, entities, scheme='IOB'):
 
 
 def _get_tags_from_entities(query, entities, scheme='IOB'):
-    normalized_tokens = query.normalized_tokens
-    iobs = [O_TAG for _ in normalized_tokens]
-    types = ['' for _ in normalized_tokens]
+    num_tokens = len(query.normalized_tokens)
+    iobs = [O_TAG] * num_tokens
+    types = [''] * num_tokens
+    token_spans = [(entity.normalized_token_span.start, entity.normalized_token_span.end)
+                   for entity in entities]
 
     # tag I and type for all tag schemes
-    for entity in entities:
-
-        for i in entity.normalized_token_span:
-            iobs[i] = I_TAG
-            types[i] = entity.entity.type
+    for entity, (start, end) in zip(entities, token_spans):
+        iobs[start:end + 1] = [I_TAG] * (end + 1 - start)
+        types[start:end + 1] = [entity.entity.type] * (end + 1 - start)
 
     # Replace I with B/E/S when appropriate
     if scheme in ('IOB', 'IOBES'):
-        for entity in entities:
-            iobs[entity.normalized_token_span.start] = B_TAG
+        for start, _ in token_spans:
+            iobs[start] = B_TAG
     if scheme == 'IOBES':
-        for entity in entities:
-            if len(entity.normalized_token_span) == 1:
-                iobs[entity.normalized_token_span.end] = S_TAG
-            else:
-                iobs[entity.normalized_token_span.end] = E_TAG
+        for start, end in token_spans:
+            iobs[end] = S_TAG if start == end else E_TAG
 
     return iobs, types
 
@@ -264,7 +333,8 @@ def get_entities_from_tags(query, tags):
     Returns:
         (list of QueryEntity) The tuple containing the list of entities.
     """
-    normalized_tokens = query.normalized_tokens
+    offsets = _QueryOffsets(query)
+    normalized_tokens = offsets.normalized_tokens
 
     entities = []
 
@@ -274,25 +344,16 @@ def get_entities_from_tags(query, tags):
         return False
 
     def _append_entity(token_start, entity_type, tokens):
-        prefix = ' '.join(normalized_tokens[:token_start])
-        # If there is a prefix, we have to add one for the whitespace
-        start = len(prefix) + 1 if len(prefix) else 0
-        end = start - 1 + len(' '.join(tokens))
-
-        norm_span = Span(start, end)
-        entity = QueryEntity.from_query(query, normalized_span=norm_span, entity_type=entity_type)
+        norm_span = offsets.get_normalized_span(token_start, tokens)
+        entity = offsets.create_entity(norm_span, entity_type)
         entities.append(entity)
         logger.debug("Appended %s.", entity)
 
     def _append_system_entity(token_start, token_end, entity_type):
         msg = "Looking for '%s' between %s and %s."
         logger.debug(msg, entity_type, token_start, token_end)
-        prefix = ' '.join(normalized_tokens[:token_start])
-        # If there is a prefix, we have to add one for the whitespace
-        start = len(prefix) + 1 if len(prefix) else 0
-        end = start - 1 + len(' '.join(normalized_tokens[token_start:token_end]))
-
-        norm_span = Span(start, end)
+        norm_span = offsets.get_normalized_span(
+            token_start, normalized_tokens[token_start:token_end])
 
         span = query.transform_span(norm_span, TEXT_FORM_NORMALIZED, TEXT_FORM_RAW)
 
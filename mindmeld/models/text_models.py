@@ -15,12 +15,15 @@
 This module contains all code required to perform multinomial classification
 of text.
 """
+import copy
 import logging
 import operator
 import random
 
 import numpy as np
 import pandas as pd
+import scipy.sparse
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction import DictVectorizer
 from sklearn.feature_selection import SelectFromModel, SelectPercentile
@@ -32,6 +35,7 @@ from sklearn.tree import DecisionTreeClassifier
 from .helpers import (QUERY_FREQ_RSC, WORD_FREQ_RSC, WORD_NGRAM_FREQ_RSC,
                       CHAR_NGRAM_FREQ_RSC, register_model)
 from .model import EvaluatedExample, Model, StandardModelEvaluation
+from ..serialization import FrozenStringMap, StringArray
 from ..tokenizer import Tokenizer
 
 _NEG_INF = -1e10
@@ -47,6 +51,10 @@ BASE_MODEL_TYPES = [LOG_REG_TYPE, DECISION_TREE_TYPE, RANDOM_FOREST_TYPE, SVM_TY
 # default model scoring type
 ACCURACY_SCORING = "accuracy"
 
+# the saga solver, which supports initial coefficients for both l1 and l2 penalties, was added
+# in scikit-learn 0.19
+SAGA_SOLVER_AVAILABLE = tuple(int(v) for v in sklearn.__version__.split('.')[:2]) >= (0, 19)
+
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +71,7 @@ class TextModel(Model):
         self._base_clfs = {}
         self.cv_loss_ = None
         self.train_acc_ = None
+        self.warm_started_ = False
 
     def __getstate__(self):
         """Returns the information needed pickle an instance of this class.
@@ -74,8 +83,53 @@ class TextModel(Model):
         attributes['_resources'] = {rname: self._resources.get(rname, {})
                                     for rname in [WORD_FREQ_RSC, QUERY_FREQ_RSC,
                                                   WORD_NGRAM_FREQ_RSC, CHAR_NGRAM_FREQ_RSC]}
+        attributes['_feat_vectorizer'] = self._get_frozen_vectorizer()
         return attributes
 
+    def _get_frozen_vectorizer(self):
+        """Returns a copy of the feature vectorizer whose vocabulary is stored in flat arrays, so
+        that it is stored compactly on disk and can be memory-mapped when the model is loaded."""
+        vectorizer = self._feat_vectorizer
+        if not hasattr(vectorizer, 'vocabulary_') or \
+                isinstance(vectorizer.vocabulary_, FrozenStringMap):
+            return vectorizer
+        vectorizer = copy.copy(vectorizer)
+        vectorizer.vocabulary_ = FrozenStringMap(vectorizer.vocabulary_)
+        vectorizer.feature_names_ = StringArray(vectorizer.feature_names_)
+        return vectorizer
+
+    def _transform_features(self, feats):
+        """Transforms feature dicts into a feature matrix with the feature vectorizer. When the
+        vocabulary is a memory-mapped :class:`FrozenStringMap`, the features of all examples are
+        looked up in it at once.
+
+        Args:
+            feats (list of dict): The features of each example
+
+        Returns:
+            (scipy.sparse.csr_matrix): The feature matrix
+        """
+        vectorizer = self._feat_vectorizer
+        if not isinstance(getattr(vectorizer, 'vocabulary_', None), FrozenStringMap):
+            return vectorizer.transform(feats)
+
+        # string features are one-hot encoded as in DictVectorizer.transform
+        names, values, rows = [], [], []
+        for row, feat in enumerate(feats):
+            for name, value in feat.items():
+                if isinstance(value, str):
+                    name, value = '{}{}{}'.format(name, vectorizer.separator, value), 1
+                names.append(name)
+                values.append(value)
+                rows.append(row)
+        columns = vectorizer.vocabulary_.lookup(names)
+        known = columns >= 0
+        values = np.array(values, dtype=vectorizer.dtype)[known]
+        rows = np.array(rows, dtype=np.int64)[known]
+        return scipy.sparse.csr_matrix((values, (rows, columns[known])),
+                                       shape=(len(feats), len(vectorizer.vocabulary_)),
+                                       dtype=vectorizer.dtype)
+
     def _get_model_constructor(self):
         """Returns the class of the actual underlying model"""
         classifier_type = self.config.model_settings['classifier_type']
@@ -162,8 +216,170 @@ class TextModel(Model):
             self._clf = best_clf
             self._current_params = best_params
 
+        self._compact()
         return self
 
+    def fit_warm_start(self, examples, labels, previous_model):
+        """Trains this model using a previously trained model as the starting point.
+
+        The feature vocabulary of the previous model is extended with any new features, and its
+        coefficients are used to initialize the logistic regression. Cross-validation is skipped
+        and the parameters selected for the previous model are reused. If the previous model
+        cannot be used for a warm start, a full fit is performed instead.
+
+        Args:
+            examples (list): A list of examples.
+            labels (list): A parallel list to examples. The gold labels
+                for each example.
+            previous_model (TextModel): A previously trained model with the same configuration.
+
+        Returns:
+            (TextModel): Returns self to match classifier scikit-learn \
+                interfaces.
+        """
+        if not self._can_warm_start(previous_model, labels):
+            logger.info('Unable to warm start from the previous model. Fitting from scratch.')
+            return self.fit(examples, labels)
+
+        # Shuffle to prevent order effects
+        indices = list(range(len(labels)))
+        random.shuffle(indices)
+        examples = [examples[i] for i in indices]
+        labels = [labels[i] for i in indices]
+
+        y = self._label_encoder.encode(labels)
+        tokenizer = Tokenizer()
+        feats = [self._extract_features(example, tokenizer=tokenizer) for example in examples]
+
+        y = self._class_encoder.fit_transform(y)
+        self._feat_vectorizer = self._extend_feature_vectorizer(
+            previous_model._feat_vectorizer, feats)
+        X = self._feat_vectorizer.transform(feats)
+        if self._feat_scaler is not None:
+            X = self._feat_scaler.fit_transform(X)
+
+        # The previous model was compacted, so its coefficients apply to the unscaled features
+        # of its restricted vocabulary. Features it dropped had zero weight and are appended
+        # to the extended vocabulary like new features. Scaling the coefficients by the new
+        # feature scale keeps the decision function of the previous model as the starting point.
+        previous_clf = previous_model._clf
+        num_new_features = X.shape[1] - previous_clf.coef_.shape[1]
+        coef = np.hstack([previous_clf.coef_,
+                          np.zeros((previous_clf.coef_.shape[0], num_new_features))])
+        if self._feat_scaler is not None:
+            coef *= self._feat_scaler.scale_
+
+        params = self._convert_params(dict(previous_model._current_params), y, is_grid=False)
+        params = self._clean_params(LogisticRegression, params)
+        params['warm_start'] = True
+        if params.get('solver', 'liblinear') == 'liblinear':
+            # liblinear ignores the initial coefficients, saga supports both l1 and l2 penalties
+            params['solver'] = 'saga'
+
+        clf = LogisticRegression(**params)
+        clf.coef_ = coef
+        clf.intercept_ = previous_clf.intercept_
+        self._clf = clf.fit(X, y)
+        self._current_params = previous_model._current_params
+        self.cv_loss_ = previous_model.cv_loss_
+        self.warm_started_ = True
+        self._compact()
+        return self
+
+    def _compact(self):
+        """Folds the feature selector and scaler of a trained model into its feature vectorizer
+        and coefficients, so that inference only vectorizes the features the model actually uses.
+
+        For linear models the per-feature scaling is multiplied into the coefficient matrix and
+        every feature with zero weight for all classes is dropped from the vocabulary. For other
+        models only the features removed by the selector are dropped, and only when no scaler is
+        configured, since the scaler expects the full feature space.
+        """
+        if not hasattr(self._feat_vectorizer, 'vocabulary_'):
+            return
+        num_features = len(self._feat_vectorizer.feature_names_)
+
+        if isinstance(self._clf, LogisticRegression):
+            coef = np.zeros((self._clf.coef_.shape[0], num_features))
+            if self._feat_selector is not None:
+                coef[:, self._feat_selector.get_support()] = self._clf.coef_
+            else:
+                coef[:] = self._clf.coef_
+            if self._feat_scaler is not None:
+                coef /= self._feat_scaler.scale_
+            support = np.any(coef != 0, axis=0)
+            self._clf.coef_ = coef[:, support]
+            self._feat_scaler = None
+        elif self._feat_selector is not None and self._feat_scaler is None:
+            support = self._feat_selector.get_support()
+        else:
+            return
+
+        self._feat_vectorizer = self._restrict_feature_vectorizer(self._feat_vectorizer, support)
+        self._feat_selector = None
+        logger.debug('Compacted feature vocabulary from %d to %d features',
+                     num_features, len(self._feat_vectorizer.feature_names_))
+
+    @staticmethod
+    def _restrict_feature_vectorizer(vectorizer, support):
+        """Creates a copy of the feature vectorizer restricted to the supported features.
+
+        Args:
+            vectorizer (DictVectorizer): A fitted feature vectorizer.
+            support (numpy.array): A boolean mask over the features of the vectorizer.
+
+        Returns:
+            (DictVectorizer): The restricted vectorizer.
+        """
+        feature_names = [name for name, keep in zip(vectorizer.feature_names_, support) if keep]
+        restricted = copy.copy(vectorizer)
+        restricted.feature_names_ = feature_names
+        restricted.vocabulary_ = {name: index for index, name in enumerate(feature_names)}
+        return restricted
+
+    def _can_warm_start(self, previous_model, labels):
+        """Checks whether the previous model can be used to warm start this model."""
+        model_settings = self.config.model_settings or {}
+        if model_settings.get('classifier_type') != LOG_REG_TYPE:
+            return False
+        if self._feat_selector is not None:
+            # The selected feature subset changes from fit to fit
+            return False
+        if not isinstance(getattr(previous_model, '_clf', None), LogisticRegression):
+            return False
+        if not previous_model._current_params:
+            return False
+        if previous_model._current_params.get('solver', 'liblinear') == 'liblinear' and \
+                not SAGA_SOLVER_AVAILABLE:
+            # Warm starts from liblinear models use the saga solver
+            return False
+        previous_classes = set(previous_model._class_encoder.classes_)
+        return previous_classes == set(self._label_encoder.encode(labels))
+
+    @staticmethod
+    def _extend_feature_vectorizer(previous_vectorizer, feats):
+        """Creates a feature vectorizer which keeps the vocabulary indices of the previous
+        vectorizer and appends any features that are new in the given feature dicts.
+
+        Args:
+            previous_vectorizer (DictVectorizer): The vectorizer of the previous model.
+            feats (list of dict): The extracted features for the training examples.
+
+        Returns:
+            (DictVectorizer): The extended vectorizer.
+        """
+        new_vectorizer = DictVectorizer().fit(feats)
+        feature_names = list(previous_vectorizer.feature_names_)
+        vocabulary = dict(previous_vectorizer.vocabulary_)
+        for feat_name in new_vectorizer.feature_names_:
+            if feat_name not in vocabulary:
+                vocabulary[feat_name] = len(feature_names)
+                feature_names.append(feat_name)
+
+        new_vectorizer.feature_names_ = feature_names
+        new_vectorizer.vocabulary_ = vocabulary
+        return new_vectorizer
+
     def select_params(self, examples, labels, selection_settings=None):
         y = self._label_encoder.encode(labels)
         X, y, groups = self.get_feature_matrix(examples, y, fit=True)
@@ -351,7 +567,7 @@ class TextModel(Model):
             if self._feat_selector is not None:
                 X = self._feat_selector.fit_transform(X, y)
         else:
-            X = self._feat_vectorizer.transform(X)
+            X = self._transform_features(X)
             if self._feat_scaler is not None:
                 X = self._feat_scaler.transform(X)
             if self._feat_selector is not None:
@@ -48,6 +48,7 @@ ENTITY_MODEL_CHECKPOINT_PATH = os.path.join(GEN_INTENT_CHECKPOINT_FOLDER, 'entit
 ROLE_MODEL_PATH = os.path.join(GEN_INTENT_FOLDER, '{entity}-role.pkl')
 ROLE_MODEL_CHECKPOINT_PATH = os.path.join(GEN_INTENT_CHECKPOINT_FOLDER, '{entity}-role.pkl')
 GAZETTEER_PATH = os.path.join(GEN_FOLDER, 'gaz-{entity}.pkl')
+SYNONYM_INDEX_STATE_PATH = os.path.join(GEN_FOLDER, 'synonyms-{entity}.json')
 GEN_INDEXES_FOLDER = os.path.join(GEN_FOLDER, 'indexes')
 GEN_INDEX_FOLDER = os.path.join(GEN_INDEXES_FOLDER, '{index}')
 RANKING_MODEL_PATH = os.path.join(GEN_INDEX_FOLDER, 'ranking.pkl')
@@ -98,6 +99,7 @@ DUCKLING_PATH_TO_MD5_MAPPINGS = {
 
 EMBEDDINGS_FOLDER_PATH = os.path.join(MINDMELD_ROOT, 'data')
 EMBEDDINGS_FILE_PATH = os.path.join(EMBEDDINGS_FOLDER_PATH, 'glove.6B.zip')
+CUSTOM_EMBEDDINGS_FOLDER_PATH = os.path.join(EMBEDDINGS_FOLDER_PATH, 'custom')
 PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH = \
     os.path.join(EMBEDDINGS_FOLDER_PATH, 'previously_used_char_embeddings.pkl')
 PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH = \
@@ -399,6 +401,20 @@ def get_gazetteer_data_path(app_path, gaz_name, model_name=None):
     return _resolve_model_name(path, model_name)
 
 
+@safe_path
+def get_synonym_index_state_path(app_path, entity):
+    """Gets path to the saved state of the synonym index for an entity type.
+
+    Args:
+        app_path (str): The path to the app data.
+        entity (str): An entity under the application.
+
+    Returns:
+        (str) The path for the synonym index state.
+    """
+    return SYNONYM_INDEX_STATE_PATH.format(app_path=app_path, entity=entity)
+
+
 @safe_path
 def get_labeled_query_file_path(app_path, domain, intent, filename):
     """Gets path to a labeled query file corresponding to a specific domain and intent.
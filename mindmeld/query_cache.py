@@ -17,8 +17,8 @@ This module contains the query cache implementation.
 import os
 import shutil
 import logging
-from sklearn.externals import joblib
 
+from . import serialization
 from ._version import _get_mm_version
 from .path import QUERY_CACHE_PATH, QUERY_CACHE_TMP_PATH, GEN_FOLDER
 
@@ -103,7 +103,7 @@ class QueryCache:
             # We write to a new cache temp file and then rename it to prevent file corruption
             # due to the user cancelling the training operation midway during the
             # file write.
-            joblib.dump(self.versioned_data, self.tmp_cache_location)
+            serialization.dump(self.versioned_data, self.tmp_cache_location)
             if os.path.isfile(self.main_cache_location):
                 os.remove(self.main_cache_location)
             shutil.move(self.tmp_cache_location, self.main_cache_location)
@@ -124,7 +124,7 @@ class QueryCache:
         """
         file_location = QUERY_CACHE_PATH.format(app_path=self.app_path)
         try:
-            versioned_data = joblib.load(file_location)
+            versioned_data = serialization.load(file_location)
             if 'cached_queries' not in versioned_data:
                 # The old version of caching did not have versions
                 logger.warning('The cache contains deprecated versions of queries. Please '
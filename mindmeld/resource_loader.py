@@ -33,7 +33,7 @@ from .models.helpers import (GAZETTEER_RSC, QUERY_FREQ_RSC, SYS_TYPES_RSC, WORD_
                              ENABLE_STEMMING, CHAR_NGRAM_FREQ_RSC, WORD_NGRAM_FREQ_RSC,
                              mask_numerics)
 from .core import Entity
-from .constants import DEFAULT_TRAIN_SET_REGEX
+from .constants import DEFAULT_TRAIN_SET_REGEX, WARM_START_HASH_SUFFIX
 from .path import MODEL_CACHE_PATH
 
 logger = logging.getLogger(__name__)
@@ -89,6 +89,7 @@ class ResourceLoader:
         self._hasher = Hasher()
         self.query_cache = query_cache or QueryCache(app_path=self.app_path)
         self._hash_to_model_path = None
+        self._warm_start_hash_to_model_path = None
 
     @property
     def hash_to_model_path(self):
@@ -97,6 +98,14 @@ class ResourceLoader:
             self._load_cached_models()
         return self._hash_to_model_path
 
+    @property
+    def warm_start_hash_to_model_path(self):
+        """dict: A dictionary that maps warm start hashes to the file path of the most recently
+        cached classifier."""
+        if self._warm_start_hash_to_model_path is None:
+            self._load_cached_models()
+        return self._warm_start_hash_to_model_path
+
     def get_gazetteers(self, force_reload=False, **kwargs):
         """Gets gazetteers for all entities.
 
@@ -238,9 +247,12 @@ class ResourceLoader:
     def _load_cached_models(self):
         if not self._hash_to_model_path:
             self._hash_to_model_path = {}
+        if not self._warm_start_hash_to_model_path:
+            self._warm_start_hash_to_model_path = {}
 
         cache_path = MODEL_CACHE_PATH.format(app_path=self.app_path)
-        for dir_path, _, file_names in os.walk(cache_path):
+        # timestamp folders sort chronologically, so the latest model for a hash wins
+        for dir_path, _, file_names in sorted(os.walk(cache_path)):
             for filename in [f for f in file_names if f.endswith('.hash')]:
                 file_path = os.path.join(dir_path, filename)
                 hash_val = open(file_path, 'r').read()
@@ -250,6 +262,13 @@ class ResourceLoader:
                     continue
                 self._hash_to_model_path[hash_val] = classifier_file_path
 
+            for filename in [f for f in file_names if f.endswith(WARM_START_HASH_SUFFIX)]:
+                file_path = os.path.join(dir_path, filename)
+                hash_val = open(file_path, 'r').read()
+                classifier_file_path = file_path[:-len(WARM_START_HASH_SUFFIX)]
+                if os.path.exists(classifier_file_path):
+                    self._warm_start_hash_to_model_path[hash_val] = classifier_file_path
+
     def _gaz_needs_build(self, gaz_name):
         try:
             build_time = self._entity_files[gaz_name]['gazetteer']['modified']
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the on-disk format used to persist models, gazetteers and the query cache.
+
+Artifacts are written uncompressed with joblib inside a small versioned envelope. Large lookup
+structures such as vectorizer vocabularies and gazetteer indexes are stored as flat NumPy arrays
+(see :class:`FrozenStringMap`, :class:`FrozenStringSetMap` and :class:`StringArray`), so that
+loading an artifact with ``mmap_mode='r'`` maps them from disk instead of unpickling millions of
+Python objects. Lookups are served from the mapped arrays directly, so forked worker processes
+share the same pages.
+"""
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+import logging
+import os
+import zlib
+
+import numpy as np
+from sklearn.externals import joblib
+
+from .exceptions import ArtifactLoadError
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 2
+DEFAULT_MMAP_MODE = 'r'
+
+_FORMAT_KEY = 'mm_artifact_format'
+_PAYLOAD_KEY = 'payload'
+
+
+def dump(obj, path):
+    """Persists an object to disk in the versioned artifact format.
+
+    The artifact is first written to a temporary file and then moved into place, so that
+    processes which have the previous artifact memory-mapped keep a valid mapping.
+
+    Args:
+        obj: The object to persist
+        path (str): The location on disk where the artifact should be stored
+    """
+    tmp_path = path + '.tmp'
+    joblib.dump({_FORMAT_KEY: ARTIFACT_FORMAT_VERSION, _PAYLOAD_KEY: obj}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load(path, mmap_mode=DEFAULT_MMAP_MODE):
+    """Loads an object persisted with :func:`dump`. Plain joblib pickles written by previous
+    versions of MindMeld are also supported.
+
+    Args:
+        path (str): The location on disk where the artifact is stored
+        mmap_mode (str, optional): The mode used to memory-map the NumPy arrays in the artifact.
+            If None, arrays are read into memory.
+
+    Returns:
+        The persisted object
+    """
+    data = joblib.load(path, mmap_mode=mmap_mode)
+    if not isinstance(data, dict) or _FORMAT_KEY not in data:
+        # legacy joblib pickle
+        return data
+
+    version = data[_FORMAT_KEY]
+    if version > ARTIFACT_FORMAT_VERSION:
+        msg = 'Artifact at {!r} has format version {}, but only versions up to {} are ' \
+              'supported. Please upgrade MindMeld or run a clean build.'
+        raise ArtifactLoadError(msg.format(path, version, ARTIFACT_FORMAT_VERSION))
+    return data[_PAYLOAD_KEY]
+
+
+def _encode(strings):
+    return [string.encode('utf-8') for string in strings]
+
+
+def _build_hash_index(encoded_keys):
+    """Builds an open addressing hash table over a list of keys, which is stored with them so
+    that a key is found without a search over all keys. The table is at most half full and
+    collisions are resolved with linear probing.
+
+    Args:
+        encoded_keys (list of bytes): The UTF-8 encoded keys
+
+    Returns:
+        numpy.array: The position of the key in each slot of the table, or -1 for empty slots
+    """
+    num_slots = 1 << (2 * len(encoded_keys)).bit_length()
+    mask = num_slots - 1
+    slots = [-1] * num_slots
+    for position, key in enumerate(encoded_keys):
+        slot = zlib.crc32(key) & mask
+        while slots[slot] >= 0:
+            slot = (slot + 1) & mask
+        slots[slot] = position
+    return np.array(slots, dtype=np.int64)
+
+
+class StringArray(Sequence):
+    """An immutable sequence of strings stored as a single UTF-8 byte buffer and an offsets
+    array.
+    """
+
+    def __init__(self, strings=()):
+        encoded = _encode(strings)
+        self._offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=self._offsets[1:])
+        self._buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _get_bytes(self, index):
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._buffer[start:end].tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('StringArray index out of range')
+        return self._get_bytes(index).decode('utf-8')
+
+    def copy(self):
+        """Returns a mutable copy of this sequence.
+
+        Returns:
+            list: The strings in this sequence
+        """
+        return list(self)
+
+
+class _FrozenStringKeys(Mapping):
+    """Base class for immutable mappings with string keys. The keys are stored in a
+    :class:`StringArray` in the order they were given, and are found through a hash table over
+    them.
+    """
+
+    def __init__(self, keys, default_factory=None):
+        self._keys = StringArray(keys)
+        self._slots = _build_hash_index(_encode(keys))
+        self.default_factory = default_factory
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not isinstance(self._keys, StringArray):
+            # format version 1 stored the keys as a sorted fixed width byte array
+            keys = [key.decode('utf-8') for key in self._keys]
+            self._keys = StringArray(keys)
+            self._slots = _build_hash_index(_encode(keys))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_views', None)
+        return state
+
+    def _get_views(self):
+        """Returns memoryviews of the hash table, the key offsets and the key buffer. Indexing them
+        returns Python objects directly, which is much faster than indexing the arrays."""
+        views = self.__dict__.get('_views')
+        if views is None:
+            views = (memoryview(self._slots), memoryview(self._keys._offsets),
+                     memoryview(self._keys._buffer))
+            self._views = views
+        return views
+
+    def _find(self, key):
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode('utf-8')
+        slots, offsets, buffer = self._get_views()
+        mask = len(slots) - 1
+        slot = zlib.crc32(encoded) & mask
+        position = slots[slot]
+        while position >= 0:
+            start = offsets[position]
+            if offsets[position + 1] - start == len(encoded) and \
+                    buffer[start:start + len(encoded)].tobytes() == encoded:
+                return position
+            slot = (slot + 1) & mask
+            position = slots[slot]
+        return -1
+
+    def _get_value(self, index):
+        raise NotImplementedError
+
+    def _copy_value(self, value):
+        return value
+
+    def __getitem__(self, key):
+        index = self._find(key)
+        if index < 0:
+            if self.default_factory is None:
+                raise KeyError(key)
+            return self.default_factory()
+        return self._get_value(index)
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def get(self, key, default=None):
+        index = self._find(key)
+        return default if index < 0 else self._get_value(index)
+
+    def _find_all(self, keys):
+        """Finds the positions of many keys.
+
+        Returns:
+            numpy.array: The position of each key, or -1 if it is missing
+        """
+        return np.array([self._find(key) for key in keys], dtype=np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def copy(self):
+        """Returns a mutable copy of this mapping. If the mapping has a default factory, the copy
+        is a ``defaultdict``.
+
+        Returns:
+            dict: The items of this mapping
+        """
+        items = ((key, self._copy_value(self._get_value(index)))
+                 for index, key in enumerate(self))
+        if self.default_factory is None:
+            return dict(items)
+        return defaultdict(self.default_factory, items)
+
+
+class FrozenStringMap(_FrozenStringKeys):
+    """An immutable mapping from strings to numbers, stored in flat arrays.
+
+    Args:
+        mapping (dict): The mapping to freeze
+        default_factory (callable, optional): Called to produce the value for missing keys, as
+            with ``defaultdict``. Missing keys are not inserted.
+        dtype (numpy.dtype, optional): The type of the values
+    """
+
+    def __init__(self, mapping, default_factory=None, dtype=np.int64):
+        keys = list(mapping.keys())
+        super().__init__(keys, default_factory)
+        self._values = np.array([mapping[key] for key in keys], dtype=dtype)
+
+    def _get_value(self, index):
+        return self._values[index].item()
+
+    def lookup(self, keys, default=-1):
+        """Looks up the values of many keys at once.
+
+        Args:
+            keys (list of str): The keys to look up
+            default (int, optional): The value for missing keys
+
+        Returns:
+            numpy.array: The value of each key
+        """
+        positions = self._find_all(keys)
+        values = np.full(len(positions), default, dtype=self._values.dtype)
+        found = positions >= 0
+        values[found] = self._values[positions[found]]
+        return values
+
+
+class FrozenStringSetMap(_FrozenStringKeys):
+    """An immutable mapping from strings to sets of integers, stored in compressed sparse row
+    layout.
+
+    Args:
+        mapping (dict): The mapping to freeze
+        default_factory (callable, optional): Called to produce the value for missing keys, as
+            with ``defaultdict``. Missing keys are not inserted.
+    """
+
+    def __init__(self, mapping, default_factory=None):
+        keys = list(mapping.keys())
+        super().__init__(keys, default_factory)
+        values = [sorted(mapping[key]) for key in keys]
+        self._indptr = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in values], out=self._indptr[1:])
+        self._indices = np.array([item for value in values for item in value], dtype=np.int64)
+
+    def _get_value(self, index):
+        start, end = self._indptr[index], self._indptr[index + 1]
+        return frozenset(self._indices[start:end].tolist())
+
+    def _copy_value(self, value):
+        return set(value)
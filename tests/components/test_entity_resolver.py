@@ -8,6 +8,8 @@ test_entity_resolver
 Tests for `entity_resolver` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
+import json
+
 import pytest
 import mock
 
@@ -15,8 +17,8 @@ from mock import PropertyMock
 
 from mindmeld.core import Entity
 
-from mindmeld.components.entity_resolver import EntityResolver
-from mindmeld.components._elasticsearch_helpers import create_es_client
+from mindmeld.components.entity_resolver import EntityResolver, ResolutionCache
+from mindmeld.components._elasticsearch_helpers import create_es_client, get_es_client
 
 ENTITY_TYPE = 'store_name'
 APP_PATH = '../kwik_e_mart'
@@ -49,6 +51,40 @@ def resolver_text_rel(resource_loader, es_client):
         return resolver
 
 
+@pytest.fixture
+def resolver_local_text_rel(resource_loader):
+    """An entity resolver for 'location' on the Kwik-E-Mart app using the local text relevance
+    model"""
+    resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    resolver._er_config = dict(resolver._er_config, model_type='local_text_relevance')
+    resolver.fit()
+    return resolver
+
+
+def test_resolvers_share_es_client(resource_loader):
+    """Tests that the resolvers of all entity types share the Elasticsearch client of the
+    process"""
+    resolvers = [EntityResolver(APP_PATH, resource_loader, entity_type)
+                 for entity_type in (ENTITY_TYPE, 'sys_time')]
+    assert resolvers[0]._es_client is resolvers[1]._es_client is get_es_client()
+
+
+def test_load_batches_index_checks(resource_loader, resolver, es_client):
+    """Tests that loading many resolvers checks the existence of their indexes with a single
+    request"""
+    EntityResolver._index_names.clear()
+    resolvers = [EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE, es_client=es_client)
+                 for _ in range(3)]
+    with mock.patch.object(es_client.cat, 'indices', wraps=es_client.cat.indices) as indices, \
+            mock.patch.object(es_client.indices, 'exists') as exists, \
+            mock.patch.object(EntityResolver, 'fit') as fit:
+        for entity_resolver in resolvers:
+            entity_resolver.load()
+        assert indices.call_count == 1
+        assert not exists.called
+        assert not fit.called
+
+
 def test_canonical(resolver):
     """Tests that entity resolution works for a canonical entity in the map"""
     expected = {'id': '2', 'cname': 'Pine and Market'}
@@ -79,3 +115,177 @@ def test_synonym_text_rel(resolver_text_rel):
     predicted = resolver_text_rel.predict(Entity('Pine St', ENTITY_TYPE))[0]
     assert predicted['id'] == expected['id']
     assert predicted['cname'] == expected['cname']
+
+
+def test_predict_batch(resolver, es_client):
+    """Tests that a batch of entities is resolved with a single multi-search request and that
+    the results match resolving each entity separately"""
+    entities = [Entity('Pine and Market', ENTITY_TYPE), Entity('Pine St', ENTITY_TYPE),
+                [Entity('Pine St', ENTITY_TYPE), Entity('Pine Street', ENTITY_TYPE)]]
+    expected = [resolver.predict(entity) for entity in entities]
+    resolver.result_cache.clear()
+
+    with mock.patch.object(es_client, 'msearch', wraps=es_client.msearch) as msearch:
+        predicted = EntityResolver.predict_batch([(resolver, entity) for entity in entities])
+        assert msearch.call_count == 1
+
+    assert [[value['cname'] for value in values] for values in predicted] == \
+        [[value['cname'] for value in values] for values in expected]
+
+
+def test_predict_batch_exact_match(resolver_text_rel, es_client):
+    """Tests that exact match resolution does not query Elasticsearch"""
+    with mock.patch.object(es_client, 'msearch') as msearch:
+        predicted = EntityResolver.predict_batch(
+            [(resolver_text_rel, Entity('Pine St', ENTITY_TYPE))])
+        assert not msearch.called
+
+    assert predicted[0][0]['cname'] == 'Pine and Market'
+
+
+@pytest.mark.asyncio
+async def test_predict_async(resolver):
+    """Tests that the async resolver path returns the same values as the synchronous one"""
+    entity = Entity('Pine St', ENTITY_TYPE)
+    expected = resolver.predict(entity)
+    resolver.result_cache.clear()
+
+    predicted = await resolver.predict_async(entity)
+    assert [value['cname'] for value in predicted] == [value['cname'] for value in expected]
+
+
+@pytest.mark.parametrize("text,cname", [
+    ('Pine and Market', 'Pine and Market'),
+    ('Pine St', 'Pine and Market'),
+    ('pine streat', 'Pine and Market'),
+    ('23rd elm', '23 Elm Street'),
+    ('chinatwn', 'Chinatown Store')
+])
+def test_local_text_rel(resolver_local_text_rel, text, cname):
+    """Tests that the local text relevance model resolves canonical names, synonyms and
+    misspellings"""
+    predicted = resolver_local_text_rel.predict(Entity(text, ENTITY_TYPE))
+    assert predicted[0]['cname'] == cname
+    assert predicted[0]['id']
+
+
+@pytest.mark.parametrize("text", [
+    'Pine and Market', 'Pine St', 'elm street', '23rd elm', 'central plaza', 'fifth avenue',
+    'haverbrook', 'little italy store', 'russian district', 'springfield mall', 'pine streat',
+    'chinatwn', 'the elm-street store'
+])
+def test_local_text_rel_ranking_agreement(resolver, resolver_local_text_rel, text):
+    """Tests that the local text relevance model agrees with the ranking of the Elasticsearch
+    text relevance model"""
+    expected = resolver.predict(Entity(text, ENTITY_TYPE))
+    predicted = resolver_local_text_rel.predict(Entity(text, ENTITY_TYPE))
+    assert predicted[0]['cname'] == expected[0]['cname']
+    assert predicted[0]['top_synonym'] == expected[0]['top_synonym']
+
+
+def test_result_cache(resolver, resource_loader, es_client):
+    """Tests that resolution results are cached, shared across resolvers of the same entity type
+    and invalidated when the resolver is fit"""
+    other_resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE, es_client=es_client)
+    assert other_resolver.result_cache is resolver.result_cache
+    resolver.result_cache.clear()
+
+    expected = resolver.predict(Entity('Pine St', ENTITY_TYPE))
+    with mock.patch.object(es_client, 'msearch') as msearch:
+        predicted = other_resolver.predict(Entity('Pine St', ENTITY_TYPE))
+        # entities are cached by their normalized text
+        assert other_resolver.predict(Entity('pine st ', ENTITY_TYPE)) == expected
+        assert not msearch.called
+    assert predicted == expected
+    assert resolver.result_cache.info()['hits'] >= 1
+
+    # modifying the returned values does not change the cached values
+    predicted[0]['cname'] = 'modified'
+    assert resolver.predict(Entity('Pine St', ENTITY_TYPE)) == expected
+
+    resolver.fit()
+    assert resolver.result_cache.info()['size'] == 0
+
+
+def test_resolution_cache_eviction():
+    """Tests that the least recently used results are evicted from the cache"""
+    cache = ResolutionCache(max_size=2)
+    cache.set(('a',), [{'cname': 'A'}])
+    cache.set(('b',), [{'cname': 'B'}])
+    assert cache.get(('a',)) == [{'cname': 'A'}]
+    cache.set(('c',), [{'cname': 'C'}])
+
+    assert cache.get(('b',)) is None
+    assert cache.get(('c',)) == [{'cname': 'C'}]
+    assert cache.info() == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'size': 2, 'max_size': 2}
+
+
+def test_resolution_cache_expiry():
+    """Tests that cached results expire after the time to live"""
+    cache = ResolutionCache(max_size=2, ttl=60)
+    with mock.patch('mindmeld.components.entity_resolver.time.time', return_value=1000):
+        cache.set(('a',), [{'cname': 'A'}])
+    with mock.patch('mindmeld.components.entity_resolver.time.time', return_value=1059):
+        assert cache.get(('a',)) == [{'cname': 'A'}]
+    with mock.patch('mindmeld.components.entity_resolver.time.time', return_value=1061):
+        assert cache.get(('a',)) is None
+    assert cache.info()['size'] == 0
+
+
+def test_result_cache_per_host(resource_loader):
+    """Tests that resolvers for different Elasticsearch hosts do not share results"""
+    resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    other_resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE,
+                                    es_host='es.example.com:9200')
+    assert resolver.result_cache is not other_resolver.result_cache
+
+
+@pytest.mark.parametrize("phonetic_match_types", [[], ['double_metaphone']])
+def test_query_template(resource_loader, phonetic_match_types):
+    """Tests that the compiled query template renders the same query as the query builder"""
+    resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    resolver._er_config = dict(resolver._er_config, phonetic_match_types=phonetic_match_types)
+    entities = (Entity('Joe\'s "Pizza" café', ENTITY_TYPE), Entity('joes pizza', ENTITY_TYPE))
+
+    for nbest_size in range(1, len(entities) + 1):
+        template = resolver._get_query_template(nbest_size)
+        rendered = template.render([entity.text for entity in entities[:nbest_size]])
+        assert json.loads(rendered) == \
+            resolver._construct_text_relevance_query(entities[:nbest_size])
+
+
+def test_fit_unchanged_mapping(resolver):
+    """Tests that the synonym index is not updated when the entity map did not change"""
+    with mock.patch('mindmeld.components.entity_resolver.load_index') as load_index:
+        resolver.fit()
+        assert not load_index.called
+
+
+def test_synonym_index_state_includes_host(resource_loader, monkeypatch):
+    """Tests that the synonym index state of different Elasticsearch hosts differs"""
+    monkeypatch.delenv('MM_ES_HOST', raising=False)
+    default_resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    other_resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE,
+                                    es_host='es.example.com:9200')
+    entities = resource_loader.get_entity_map(ENTITY_TYPE)['entities']
+
+    default_state = default_resolver._get_synonym_index_state(entities)[1]
+    other_state = other_resolver._get_synonym_index_state(entities)[1]
+    assert default_state['settings']['es_host'] == 'localhost:9200'
+    assert other_state['settings']['es_host'] == 'es.example.com:9200'
+    assert default_state['doc_hashes'] == other_state['doc_hashes']
+
+
+def test_fit_changed_mapping(resolver, resource_loader):
+    """Tests that only changed entities are imported into the synonym index"""
+    entity_map = resource_loader.get_entity_map(ENTITY_TYPE)
+    entity_map['entities'][1]['whitelist'].append('Pine Mkt')
+    del entity_map['entities'][0]
+
+    with mock.patch.object(resource_loader, 'get_entity_map', return_value=entity_map), \
+            mock.patch.object(EntityResolver, 'ingest_synonym') as ingest_synonym, \
+            mock.patch.object(EntityResolver, '_delete_synonyms') as delete_synonyms:
+        resolver.fit()
+
+    assert ingest_synonym.call_args[1]['data'] == [entity_map['entities'][0]]
+    delete_synonyms.assert_called_once_with(['1'])
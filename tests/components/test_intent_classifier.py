@@ -70,3 +70,33 @@ def test_intent_classifier_random_forest(kwik_e_mart_app_path, caplog):
                features=features)
         mock.assert_any_call('Unexpected param `C`, dropping it from model config.')
         mock.assert_any_call('Unexpected param `fit_intercept`, dropping it from model config.')
+
+
+def test_intent_classifier_evaluate_full_retrain(kwik_e_mart_app_path):
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path)
+    ic = nlp.domains['store_info'].intent_classifier
+    ic.fit(model_settings={'classifier_type': 'logreg'})
+    ic._model.warm_started_ = True
+
+    with patch.object(ic, '_get_full_retrain_accuracy', return_value=0.5) as mock:
+        evaluation = ic.evaluate()
+        mock.assert_not_called()
+        assert evaluation.full_retrain_accuracy is None
+
+        evaluation = ic.evaluate(compare_full_retrain=True)
+        mock.assert_called_once()
+        assert evaluation.full_retrain_accuracy == 0.5
+
+
+def test_domain_evaluate_prints_full_retrain_accuracy(kwik_e_mart_app_path, capsys):
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path)
+    domain = nlp.domains['store_info']
+    domain.intent_classifier.fit(model_settings={'classifier_type': 'logreg'})
+    domain.intent_classifier._model.warm_started_ = True
+
+    with patch.object(domain.intent_classifier, '_get_full_retrain_accuracy', return_value=0.5):
+        domain._evaluate(print_stats=False)
+        assert 'full retrain' not in capsys.readouterr().out
+
+        domain._evaluate(print_stats=False, compare_full_retrain=True)
+        assert 'of a full retrain: 0.5' in capsys.readouterr().out
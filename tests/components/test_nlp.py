@@ -11,6 +11,8 @@ Tests for NaturalLanguageProcessor module.
 import pytest
 import math
 
+from mock import patch
+
 from mindmeld.exceptions import ProcessorError, AllowedNlpClassesKeyError
 from mindmeld.components import NaturalLanguageProcessor
 from mindmeld.query_factory import QueryFactory
@@ -67,6 +69,48 @@ def test_process(kwik_e_mart_nlp):
     }
 
 
+def test_lazy_load(kwik_e_mart_nlp, kwik_e_mart_app_path):
+    """Tests that intent models are loaded on first use and evicted when over budget"""
+    config = dict(kwik_e_mart_nlp.config)
+    config['lazy_load'] = {'max_loaded_intents': 1, 'preload_intents': ['store_info.help']}
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path, config=config)
+    nlp.load()
+
+    intents = nlp.domains['store_info'].intents
+    assert not intents['help']._models_pending
+    assert intents['greet']._models_pending
+    assert intents['get_store_hours']._models_pending
+
+    response = nlp.process('When does the Elm Street store close?')
+    assert response['intent'] == 'get_store_hours'
+    assert response['entities']
+    assert not intents['get_store_hours']._models_pending
+
+    nlp.process('Hello')
+    assert not intents['greet']._models_pending
+    # get_store_hours was evicted, help is pinned
+    assert intents['get_store_hours']._models_pending
+    assert not intents['help']._models_pending
+
+
+def test_models_acquired_once_per_query(kwik_e_mart_nlp, kwik_e_mart_app_path):
+    """Tests that the models of a lazily loaded intent are acquired once for a query rather than
+    once for each entity"""
+    config = dict(kwik_e_mart_nlp.config)
+    config['lazy_load'] = {'max_loaded_intents': 2}
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path, config=config)
+    nlp.load()
+
+    intent = nlp.domains['store_info'].intents['get_store_hours']
+    with patch('mindmeld.components.nlp.executor', None), \
+            patch.object(intent.model_cache, 'touch', wraps=intent.model_cache.touch) as touch:
+        response = nlp.process('When does the Elm Street store close on Saturday?')
+
+    assert response['intent'] == 'get_store_hours'
+    assert len(response['entities']) > 1
+    assert touch.call_count == 1
+
+
 test_data_1 = [
     (['store_info.find_nearest_store'], 'store near MG Road',
      'store_info', 'find_nearest_store'),
@@ -272,6 +316,54 @@ def test_process_verbose(kwik_e_mart_nlp):
     assert isinstance(response['confidences']['intents']['get_store_hours'], float)
 
 
+@pytest.mark.parametrize(
+    "stop_at,domain,intent",
+    [
+        ('domain', 'store_info', None),
+        ('intent', 'store_info', 'get_store_hours'),
+    ]
+)
+def test_process_stop_at_classification(kwik_e_mart_nlp, stop_at, domain, intent):
+    """Tests that processing stops after the requested classification stage"""
+    response = kwik_e_mart_nlp.process('is the elm street store open', stop_at=stop_at)
+
+    assert response['domain'] == domain
+    assert response['intent'] == intent
+    assert response['entities'] == []
+
+
+def test_process_stop_at_entities(kwik_e_mart_nlp):
+    """Tests that stopping after entity recognition skips entity resolution"""
+    response = kwik_e_mart_nlp.process('is the elm street store open', stop_at='entities')
+
+    assert response['domain'] == 'store_info'
+    assert response['intent'] == 'get_store_hours'
+    assert response['entities'][0]['text'] == 'elm street'
+    assert 'value' not in response['entities'][0]
+
+
+def test_process_stop_at_invalid(kwik_e_mart_nlp):
+    """Tests that an unknown stage is rejected"""
+    with pytest.raises(ValueError):
+        kwik_e_mart_nlp.process('is the elm street store open', stop_at='roles')
+
+
+def test_process_confidence_threshold(kwik_e_mart_nlp):
+    """Tests that deeper stages are skipped when the confidence is below the threshold"""
+    response = kwik_e_mart_nlp.process('is the elm street store open', verbose=True,
+                                       confidence_threshold=1.01)
+
+    assert response['domain'] == 'store_info'
+    assert response['intent'] is None
+    assert response['entities'] == []
+    assert 'intents' not in response['confidences']
+
+    response = kwik_e_mart_nlp.process('is the elm street store open',
+                                       confidence_threshold=0.0)
+    assert response['intent'] == 'get_store_hours'
+    assert response['entities'][0]['text'] == 'elm street'
+
+
 def test_process_verbose_long_tokens(kwik_e_mart_nlp):
     """Test confidence for entities that have lower raw tokens indices than normalized tokens"""
     text = 'Is the Kwik-E-Mart open tomorrow?'
@@ -8,11 +8,19 @@ test_question_answerer
 Tests for `question_answerer` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
-import pytest
+import asyncio
+import json
 import os
+import time
+
+import mock
+import pytest
 
-from mindmeld.components.question_answerer import QuestionAnswerer
-from mindmeld.components._elasticsearch_helpers import create_es_client
+from mindmeld.components.question_answerer import (QuestionAnswerer, FieldStatsCache,
+                                                   FIELD_STATS_TTL, _read_data_file)
+from mindmeld.components import _elasticsearch_helpers, question_answerer
+from mindmeld.components._elasticsearch_helpers import (create_es_client, get_es_client,
+                                                        get_es_host, get_scoped_index_name)
 
 ENTITY_TYPE = 'store_name'
 STORE_DATA_FILE_PATH = os.path.dirname(__file__) + "/../kwik_e_mart/data/stores.json"
@@ -25,14 +33,30 @@ def es_client():
     return create_es_client()
 
 
-@pytest.fixture
-def answerer(kwik_e_mart_app_path, es_client):
-    QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='store_name',
-                             data_file=STORE_DATA_FILE_PATH)
-    es_client.indices.flush(index='_all')
+@pytest.fixture(params=['elasticsearch', 'local'])
+def kb_backend(request):
+    """The knowledge base backend which stores the test indexes"""
+    return request.param
 
-    qa = QuestionAnswerer(kwik_e_mart_app_path)
-    return qa
+
+def _load_kb(app_namespace, index_name, data_file, kb_backend, es_client):
+    QuestionAnswerer.load_kb(app_namespace=app_namespace, index_name=index_name,
+                             data_file=data_file, backend=kb_backend)
+    if kb_backend == 'elasticsearch':
+        es_client.indices.flush(index='_all')
+
+
+def _unload_local_kb(app_namespace, index_name):
+    scoped_index_name = get_scoped_index_name(app_namespace, index_name)
+    QuestionAnswerer._local_kb.delete_index(scoped_index_name)
+    QuestionAnswerer._field_info_cache.pop((None, scoped_index_name), None)
+
+
+@pytest.fixture
+def answerer(kwik_e_mart_app_path, es_client, kb_backend):
+    _load_kb('kwik_e_mart', 'store_name', STORE_DATA_FILE_PATH, kb_backend, es_client)
+    yield QuestionAnswerer(kwik_e_mart_app_path)
+    _unload_local_kb('kwik_e_mart', 'store_name')
 
 
 @pytest.fixture
@@ -48,13 +72,10 @@ def relative_answerer(kwik_e_mart_app_path, es_client):
 
 
 @pytest.fixture
-def food_ordering_answerer(food_ordering_app_path, es_client):
-    QuestionAnswerer.load_kb(app_namespace='food_ordering', index_name='menu_items',
-                             data_file=DISH_DATA_FILE_PATH)
-    es_client.indices.flush(index='_all')
-
-    qa = QuestionAnswerer(food_ordering_app_path)
-    return qa
+def food_ordering_answerer(food_ordering_app_path, es_client, kb_backend):
+    _load_kb('food_ordering', 'menu_items', DISH_DATA_FILE_PATH, kb_backend, es_client)
+    yield QuestionAnswerer(food_ordering_app_path)
+    _unload_local_kb('food_ordering', 'menu_items')
 
 
 def test_basic_search(answerer):
@@ -184,3 +205,258 @@ def test_advanced_search_validation(answerer):
     with pytest.raises(ValueError):
         s = answerer.build_search(index='store_name')
         s.sort(field='location', sort_type='distance')
+
+
+@pytest.mark.parametrize("content", [
+    '[{"id": "1", "name": "Café"},\n {"id": "2", "name": "Store"}]',
+    '[\n  {"id": "1", "name": "Café"},\n  {"id": "2", "name": "Store"}\n]\n',
+    '{"id": "1", "name": "Café"}\n\n{"id": "2", "name": "Store"}\n'
+])
+def test_read_data_file(tmpdir, content):
+    """Tests that json and jsonl data files are read in a single pass with their progress"""
+    data_file = tmpdir.join('data.json')
+    data_file.write_text(content, encoding='utf-8')
+
+    docs, positions = zip(*_read_data_file(str(data_file)))
+    assert list(docs) == [{'id': '1', 'name': 'Café'}, {'id': '2', 'name': 'Store'}]
+    assert positions[0] < positions[1] <= os.path.getsize(str(data_file))
+
+
+def test_read_data_file_spanning_reads(tmpdir, monkeypatch):
+    """Tests that documents of a json list which span several reads are decoded"""
+    docs = [{'id': str(i), 'name': 'Café {}'.format(i), 'price': i / 3} for i in range(50)]
+    data_file = tmpdir.join('data.json')
+    data_file.write_text(json.dumps(docs, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    monkeypatch.setattr(question_answerer, 'DATA_FILE_READ_SIZE', 7)
+    read_docs, positions = zip(*_read_data_file(str(data_file)))
+    assert list(read_docs) == docs
+    assert list(positions) == sorted(positions)
+    assert positions[-1] <= os.path.getsize(str(data_file))
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_load_kb_restores_refresh_interval(answerer, es_client):
+    """Tests that the refresh interval of the index is restored after loading documents"""
+    index = get_scoped_index_name('kwik_e_mart', 'store_name')
+    settings = es_client.indices.get_settings(index=index, name='index.refresh_interval')
+    assert settings.get(index, {}).get('settings', {}).get(
+        'index', {}).get('refresh_interval') != '-1'
+
+    # all documents were loaded
+    assert len(answerer.get(index='store_name', size=30)) == 25
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_sort_uses_cached_field_stats(food_ordering_answerer):
+    """Tests that a sorted search sends a single request once the field statistics and field
+    information are cached"""
+    qa = food_ordering_answerer
+    qa.build_search(index='menu_items').sort(field='price', sort_type='asc').execute()
+
+    with mock.patch.object(qa._es_client, 'search', wraps=qa._es_client.search) as search, \
+            mock.patch.object(qa._es_client.indices, 'exists') as exists:
+        s = qa.build_search(index='menu_items')
+        res = s.sort(field='price', sort_type='asc').execute()
+        assert search.call_count == 1
+        assert not exists.called
+    assert len(res) > 0
+
+
+def test_load_kb_invalidates_field_caches(answerer, kb_backend):
+    """Tests that loading the knowledge base refreshes the cached field information"""
+    answerer.build_search(index='store_name')
+    key = (None if kb_backend == 'local' else get_es_host(), 'kwik_e_mart$store_name')
+    assert key in answerer._es_field_info
+
+    QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='store_name',
+                             data_file=STORE_DATA_FILE_PATH, backend=kb_backend)
+    assert key not in answerer._es_field_info
+
+
+def test_field_stats_cache_ttl():
+    """Tests that cached field statistics expire"""
+    cache = FieldStatsCache(ttl=60)
+    cache.set('localhost:9200', 'index', 'price', {'min_value': 1, 'max_value': 5})
+    assert cache.get('localhost:9200', 'index', 'price') == {'min_value': 1, 'max_value': 5}
+    # statistics are kept per Elasticsearch host
+    assert cache.get('es.example.com:9200', 'index', 'price') is None
+
+    with mock.patch('mindmeld.components.question_answerer.time.time',
+                    return_value=time.time() + 61):
+        assert cache.get('localhost:9200', 'index', 'price') is None
+
+    cache.set('localhost:9200', 'index', 'price', {'min_value': 1, 'max_value': 5})
+    cache.set('es.example.com:9200', 'index', 'price', {'min_value': 2, 'max_value': 3})
+    cache.invalidate('localhost:9200', 'index')
+    assert cache.get('localhost:9200', 'index', 'price') is None
+    assert cache.get('es.example.com:9200', 'index', 'price') == {'min_value': 2, 'max_value': 3}
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_question_answerer_load(kwik_e_mart_app_path, answerer):
+    """Tests that the field information of the app's indexes is loaded ahead of searches"""
+    QuestionAnswerer._field_info_cache.clear()
+    qa = QuestionAnswerer(kwik_e_mart_app_path)
+    es_client = qa._es_client
+    with mock.patch('mindmeld.components.question_answerer.path.get_indexes',
+                    return_value=['store_name', 'missing']), \
+            mock.patch.object(es_client.cat, 'indices', wraps=es_client.cat.indices) as indices, \
+            mock.patch.object(es_client.indices, 'exists') as exists:
+        qa.load()
+        # the existence of all indexes is checked with a single request
+        assert indices.call_count == 1
+        assert not exists.called
+    assert list(qa._es_field_info) == [(get_es_host(), 'kwik_e_mart$store_name')]
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_field_info_expires(answerer):
+    """Tests that the field information of an index expires, so that a deleted index is detected
+    when a search is built"""
+    answerer.build_search(index='store_name')
+    es_client = answerer._es_client
+    with mock.patch.object(es_client.indices, 'exists', return_value=False) as exists:
+        answerer.build_search(index='store_name')
+        assert not exists.called
+
+        expired = time.time() + FIELD_STATS_TTL
+        with mock.patch('mindmeld.components.question_answerer.time.time', return_value=expired):
+            with pytest.raises(ValueError):
+                answerer.build_search(index='store_name')
+    assert (get_es_host(), 'kwik_e_mart$store_name') not in answerer._es_field_info
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_field_info_per_host(kwik_e_mart_app_path, answerer):
+    """Tests that question answerers for different Elasticsearch hosts do not share the cached
+    field information"""
+    search = answerer.build_search(index='store_name')
+    assert search.es_host == get_es_host()
+    assert answerer._get_cached_field_info(get_es_host(), 'kwik_e_mart$store_name') is not None
+
+    other_answerer = QuestionAnswerer(kwik_e_mart_app_path, es_host='es.example.com:9200')
+    assert other_answerer._get_cached_field_info('es.example.com:9200',
+                                                 'kwik_e_mart$store_name') is None
+
+
+def test_get_es_client(kwik_e_mart_app_path, food_ordering_app_path):
+    """Tests that components connecting with the same settings share an Elasticsearch client"""
+    assert get_es_client() is get_es_client()
+    assert get_es_client(timeout=30) is not get_es_client()
+    assert QuestionAnswerer(kwik_e_mart_app_path)._es_client is \
+        QuestionAnswerer(food_ordering_app_path)._es_client
+
+
+def test_async_executor_pool_size(monkeypatch):
+    """Tests that the async executor has a thread for each connection of the pool"""
+    monkeypatch.setenv('MM_ES_POOL_SIZE', '40')
+    monkeypatch.setattr(_elasticsearch_helpers, '_async_executor', None)
+    assert _elasticsearch_helpers._get_async_executor()._max_workers == 40
+
+
+@pytest.mark.asyncio
+async def test_get_async(answerer):
+    """Tests that the async search API returns the same documents as the synchronous one"""
+    res = await answerer.get_async(index='store_name', store_name='peanut')
+    assert res == answerer.get(index='store_name', store_name='peanut')
+
+    s = answerer.build_search(index='store_name').query(store_name='peanut')
+    assert await s.execute_async() == s.execute()
+
+
+@pytest.mark.asyncio
+async def test_get_async_is_concurrent(answerer):
+    """Tests that concurrent async searches do not block each other"""
+    def _slow_get(*args, **kwargs):
+        time.sleep(0.2)
+        return []
+
+    with mock.patch.object(answerer, 'get', side_effect=_slow_get):
+        start = time.time()
+        await asyncio.gather(*[answerer.get_async(index='store_name', store_name='peanut')
+                               for _ in range(5)])
+        assert time.time() - start < 0.5
+
+
+def test_load_kb_invalid_backend():
+    """Tests that loading a knowledge base into an unknown backend fails"""
+    with pytest.raises(ValueError):
+        QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='store_name',
+                                 data_file=STORE_DATA_FILE_PATH, backend='nosuchbackend')
+
+
+@pytest.mark.parametrize('kb_backend', ['elasticsearch'])
+def test_local_backend_ranking_agreement(answerer, food_ordering_answerer):
+    """Tests that the local backend ranks documents like Elasticsearch"""
+    searches = [
+        (answerer, dict(index='store_name', store_name='peanut')),
+        (answerer, dict(index='store_name', store_name='Springfield Heights')),
+        (answerer, dict(index='store_name', _sort='location', _sort_type='distance',
+                        _sort_location='44.24,-123.12')),
+        (food_ordering_answerer, dict(index='menu_items', name='pad thai')),
+        (food_ordering_answerer, dict(index='menu_items', name='garlic fries'))
+    ]
+
+    def _top_names():
+        # different documents may have the same name, so the names of the top documents are
+        # compared
+        names = []
+        for qa, kwargs in searches:
+            top_doc = qa.get(**kwargs)[0]
+            names.append(top_doc.get('store_name') or top_doc.get('name'))
+        return names
+
+    expected = _top_names()
+
+    _load_kb('kwik_e_mart', 'store_name', STORE_DATA_FILE_PATH, 'local', None)
+    _load_kb('food_ordering', 'menu_items', DISH_DATA_FILE_PATH, 'local', None)
+    assert _top_names() == expected
+
+
+def test_local_backend_dates_and_synonyms(tmpdir, kwik_e_mart_app_path):
+    """Tests range filters and sorting on date fields and matching on synonyms with the local
+    backend"""
+    data_file = tmpdir.join('events.jsonl')
+    data_file.write('{"id": "1", "name": "Spring Sale", "start": "2018-03-01"}\n'
+                    '{"id": "2", "name": "Summer Sale", "start": "2018-06-01T10:00:00Z",'
+                    ' "name$whitelist": [{"name": "July Fourth"}]}\n'
+                    '{"id": "3", "name": "Fall Sale", "start": "2018-09-01"}\n')
+    QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='events',
+                             data_file=str(data_file), backend='local')
+    try:
+        qa = QuestionAnswerer(kwik_e_mart_app_path)
+        s = qa.build_search(index='events')
+        assert [doc['id'] for doc in s.filter(field='start', gte='2018-05-01').execute()] == \
+            ['2', '3']
+        assert s.sort(field='start', sort_type='asc').execute()[0]['id'] == '1'
+
+        res = qa.get(index='events', name='fourth of july')
+        assert [doc['id'] for doc in res] == ['2']
+        assert 'name$whitelist' not in res[0]
+    finally:
+        _unload_local_kb('kwik_e_mart', 'events')
+
+
+@pytest.mark.parametrize('bounds,expected', [
+    ({'gte': 2, 'lte': 3}, ['2', '3', '4']),
+    ({'gt': 2, 'lt': 4}, ['3', '4']),
+    ({'gt': 4}, ['5']),
+    ({'lt': 1}, []),
+    ({'gt': 3, 'lt': 2}, []),
+])
+def test_local_backend_number_ranges(tmpdir, kwik_e_mart_app_path, bounds, expected):
+    """Tests the bounds of range filters on number fields with the local backend, including
+    documents with duplicate and missing values"""
+    data_file = tmpdir.join('items.jsonl')
+    data_file.write('{"id": "1", "price": 1}\n{"id": "2", "price": 2}\n'
+                    '{"id": "3", "price": 3}\n{"id": "4", "price": 3}\n'
+                    '{"id": "5", "price": 5}\n{"id": "6", "name": "No Price"}\n')
+    QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='items',
+                             data_file=str(data_file), backend='local')
+    try:
+        qa = QuestionAnswerer(kwik_e_mart_app_path)
+        res = qa.build_search(index='items').filter(field='price', **bounds).execute()
+        assert sorted(doc['id'] for doc in res) == expected
+    finally:
+        _unload_local_kb('kwik_e_mart', 'items')
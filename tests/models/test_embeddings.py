@@ -1,4 +1,9 @@
-from mindmeld.models.taggers.embeddings import GloVeEmbeddingsContainer
+import os
+
+import numpy as np
+from mindmeld.models.taggers import embeddings as embeddings_module
+from mindmeld.models.taggers.embeddings import GloVeEmbeddingsContainer, EmbeddingStore, \
+    WordSequenceEmbedding, CharacterSequenceEmbedding
 from numpy import ndarray
 
 
@@ -6,5 +11,83 @@ def test_embedding_size_is_correct():
     """Tests the size and type of the embedding"""
     token_to_embedding_mapping = \
         GloVeEmbeddingsContainer(50, None).get_pretrained_word_to_embeddings_dict()
-    assert len(token_to_embedding_mapping[b'sandberger']) == 50
-    assert type(token_to_embedding_mapping[b'sandberger']) == ndarray
+    assert len(token_to_embedding_mapping['sandberger']) == 50
+    assert type(token_to_embedding_mapping['sandberger']) == ndarray
+
+
+def test_embedding_store_from_provided_file(tmpdir, monkeypatch):
+    """Tests that a provided GloVe file is converted to a memory-mapped store"""
+    monkeypatch.setattr(embeddings_module, 'CUSTOM_EMBEDDINGS_FOLDER_PATH', str(tmpdir))
+    glove_path = str(tmpdir.join('glove.txt'))
+    with open(glove_path, 'w') as glove_file:
+        glove_file.write('the 0.1 0.2 0.3\nstore -1 0.5 2\n')
+
+    mapping = GloVeEmbeddingsContainer(50, glove_path).get_pretrained_word_to_embeddings_dict()
+    assert isinstance(mapping, EmbeddingStore)
+    assert isinstance(mapping.matrix, np.memmap)
+    assert mapping.matrix.dtype == np.float32
+    assert set(mapping) == {'the', 'store'}
+    assert np.allclose(mapping['store'], [-1, 0.5, 2])
+    assert 'hours' not in mapping
+
+    # the store is written to the data folder and reused by later containers
+    assert not os.path.exists(glove_path + EmbeddingStore.VOCAB_SUFFIX)
+    assert EmbeddingStore.exists(embeddings_module._get_custom_store_path_prefix(glove_path))
+    mapping = GloVeEmbeddingsContainer(50, glove_path).get_pretrained_word_to_embeddings_dict()
+    assert np.allclose(mapping['the'], [0.1, 0.2, 0.3])
+
+
+def test_embeddings_in_memory_when_store_is_not_writable(tmpdir, monkeypatch):
+    """Tests that the embeddings are read into memory if the store cannot be written"""
+    glove_path = str(tmpdir.join('glove.txt'))
+    with open(glove_path, 'w') as glove_file:
+        glove_file.write('the 0.1 0.2 0.3\nstore -1 0.5 2\n')
+
+    def build(glove_file, path_prefix):
+        raise PermissionError('read-only file system')
+
+    monkeypatch.setattr(EmbeddingStore, 'build', build)
+    monkeypatch.setattr(embeddings_module, 'CUSTOM_EMBEDDINGS_FOLDER_PATH', str(tmpdir))
+    mapping = GloVeEmbeddingsContainer(50, glove_path).get_pretrained_word_to_embeddings_dict()
+    assert isinstance(mapping, dict)
+    assert np.allclose(mapping['store'], [-1, 0.5, 2])
+
+
+def test_word_sequence_embedding_batch(tmpdir, monkeypatch):
+    """Tests that batches of token sequences are padded, masked and embedded"""
+    monkeypatch.setattr(embeddings_module, 'CUSTOM_EMBEDDINGS_FOLDER_PATH', str(tmpdir))
+    glove_path = str(tmpdir.join('glove.txt'))
+    with open(glove_path, 'w') as glove_file:
+        glove_file.write('the 0.1 0.2 0.3\nstore -1 0.5 2\n')
+
+    encoder = WordSequenceEmbedding(4, 3, glove_path)
+    sequences = [['the', 'store'], ['store', 'qwzxv', 'the', 'store', 'the'], []]
+    embeddings, mask = encoder.encode_sequences(sequences)
+
+    assert embeddings.shape == (3, 4, 3)
+    assert embeddings.dtype == np.float32
+    assert mask.tolist() == [[True, True, False, False], [True] * 4, [False] * 4]
+    assert np.allclose(embeddings[0, 1], [-1, 0.5, 2])
+    assert np.allclose(embeddings[1, 2], [0.1, 0.2, 0.3])
+    assert not embeddings[~mask].any()
+    for index, sequence in enumerate(sequences):
+        assert np.allclose(encoder.encode_sequence_of_tokens(sequence), embeddings[index])
+
+    # unknown tokens are embedded deterministically
+    other_encoder = WordSequenceEmbedding(4, 3, glove_path)
+    assert np.allclose(other_encoder.encode_sequences([['qwzxv']])[0][0, 0], embeddings[1, 1])
+
+
+def test_character_sequence_embedding_batch():
+    """Tests that batches of token sequences are embedded character by character"""
+    encoder = CharacterSequenceEmbedding(3, 50, 4)
+    sequences = [['kwik', 'e', 'mart', 'store'], ['mart']]
+    embeddings, mask = encoder.encode_sequences(sequences)
+
+    assert embeddings.shape == (2, 3, 4, 50)
+    assert mask[0].sum(axis=1).tolist() == [4, 1, 4]
+    assert mask[1].sum(axis=1).tolist() == [4, 0, 0]
+    assert np.allclose(embeddings[0, 2], embeddings[1, 0])
+    assert np.allclose(embeddings[0, 0, 0], embeddings[0, 0, 3])
+    assert not embeddings[~mask].any()
+    assert np.allclose(encoder.encode_sequence_of_tokens(sequences[0]), embeddings[0])
@@ -8,9 +8,15 @@ test_tagger
 Tests for `tagger` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
 import pytest
+from sklearn.preprocessing import LabelBinarizer
 
-from mindmeld.models.taggers import taggers
+from mindmeld.core import QueryEntity
+from mindmeld.models.taggers import crf, lstm, taggers
 
 # This index is the start index of when the time section of the full time format. For example:
 # 2013-02-12T11:30:00.000-02:00, index 8 onwards slices 11:30:00.000-02:00 from the full time
@@ -122,6 +128,27 @@ def test_get_entities_from_tags_with_multi_token_entities(kwik_e_mart_nlp,
     assert len(res_entity) == 2
 
 
+@pytest.mark.parametrize("query,tags", [
+    ('order a gluten free burger and a salad',
+     ['O|', 'O|', 'B|dish', 'I|dish', 'I|dish', 'O|', 'O|', 'B|dish']),
+    ("I'd like the 156th  Street location, please",
+     ['O|', 'O|', 'O|', 'B|store_name', 'I|store_name', 'O|', 'O|']),
+    (' '.join(['find the Elm Street store'] * 50),
+     ['O|', 'O|', 'B|store_name', 'I|store_name', 'O|'] * 50)
+])
+def test_get_entities_from_tags_parity(kwik_e_mart_nlp, query, tags):
+    """Tests that entities built from token offsets match those built from the query text,
+    and that converting them back yields the same tags"""
+    processed_query = kwik_e_mart_nlp.create_query(query)
+    res_entity = taggers.get_entities_from_tags(processed_query, tags)
+    assert len(res_entity) == len([tag for tag in tags if tag.startswith('B')])
+    for entity in res_entity:
+        assert entity == QueryEntity.from_query(processed_query,
+                                                normalized_span=entity.normalized_span,
+                                                entity_type=entity.entity.type)
+    assert taggers.get_tags_from_entities(processed_query, res_entity) == tags
+
+
 @pytest.mark.parametrize("expected,predicted,expected_counts", [
     (['O|', 'O|', 'B|A', 'I|A', 'O|'],
      ['O|', 'O|', 'B|A', 'I|A', 'O|'],
@@ -225,6 +252,116 @@ def test_view_extracted_features(kwik_e_mart_nlp, model_type, params):
     assert extracted_features == expected_features
 
 
+def test_memm_decoding(kwik_e_mart_nlp):
+    """Tests that beam search decoding matches token by token greedy decoding with a beam of one,
+    and that the exact search finds a sequence that is at least as likely"""
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'memm',
+            'tag_scheme': 'IOB',
+            'feature_scaler': 'max-abs',
+            'beam_size': 1
+        },
+        'params': {'penalty': 'l2', 'C': 10000},
+        'features': {
+            'bag-of-words-seq': {
+                'ngram_lengths_to_start_positions': {
+                    1: [-1, 0, 1],
+                }
+            },
+            'in-gaz-span-seq': {},
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    model = er._model
+    memm = model._clf
+    query = kwik_e_mart_nlp.create_query('is the elm street store open on saturday')
+
+    expected_tags = []
+    prev_tag = taggers.START_TAG
+    for features in memm.extract_example_features(query, model.config, model._resources):
+        features['prev_tag'] = prev_tag
+        X, _ = memm._preprocess_data([features])
+        prev_tag = memm.class_encoder.inverse_transform(memm._clf.predict(X))[0]
+        expected_tags.append(prev_tag)
+    assert memm._predict_example(query, model.config, model._resources) == expected_tags
+
+    features_by_segment = memm.extract_example_features(query, model.config, model._resources)
+    greedy_probas = [proba for _, proba in memm._decode([features_by_segment])[0]]
+    memm._beam_size = None
+    viterbi_probas = [proba for _, proba in memm._decode([features_by_segment])[0]]
+    assert np.sum(np.log(viterbi_probas)) >= np.sum(np.log(greedy_probas)) - 1e-9
+
+    queries = [kwik_e_mart_nlp.create_query(text) for text in
+               ['is the elm street store open on saturday', 'hi',
+                'when does the store on 23rd street close']]
+    expected_tags = [memm._predict_example(query, model.config, model._resources)
+                     for query in queries]
+    assert memm.extract_and_predict(queries, model.config, model._resources) == expected_tags
+
+
+def test_crf_predict_proba(kwik_e_mart_nlp):
+    """Tests that the single pass crfsuite tagger agrees with sklearn-crfsuite"""
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'crf',
+            'tag_scheme': 'IOB',
+            'feature_scaler': 'max-abs'
+        },
+        'params': {'c1': 0.01, 'c2': 0.01},
+        'features': {
+            'bag-of-words-seq': {
+                'ngram_lengths_to_start_positions': {
+                    1: [-1, 0, 1],
+                }
+            },
+            'in-gaz-span-seq': {},
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    model = er._model
+    crf = model._clf
+    queries = [kwik_e_mart_nlp.create_query(text) for text in
+               ['is the elm street store open on saturday', 'hi',
+                'is the elm street store open on sunday']]
+
+    crf._feature_cache = {}
+    predictions = crf.predict_proba(queries, model.config, model._resources)
+    X, _, _ = crf.extract_features(queries, model.config, model._resources, fit=False)
+    expected_tags = crf._clf.predict(X)
+    expected_marginals = crf._clf.predict_marginals(X)
+    assert [[tag for tag, _ in tags] for tags in predictions] == expected_tags
+    for tags, marginals in zip(predictions, expected_marginals):
+        for i, (tag, marginal) in enumerate(tags):
+            assert marginal == pytest.approx(marginals[i][tag])
+
+    assert crf.extract_and_predict(queries, model.config, model._resources) == expected_tags
+    # tokens shared by the first and last queries are only converted once
+    assert len(crf._feature_cache) < sum(len(query.normalized_tokens) for query in queries)
+
+
+def test_feature_binner(monkeypatch):
+    """Tests that numerical features are bucketed by their mean and standard deviation"""
+    X = [[{'word': 'main', 'length': 4, 'score': 1.0}, {'word': 'st', 'length': 2}],
+         [{'word': '156th', 'length': 5, 'score': 3.0}]]
+    binner = crf.FeatureBinner()
+    binner.fit(X)
+
+    assert set(binner.features.keys()) == {'length', 'score'}
+    assert binner.features['score'].mean == pytest.approx(2.0)
+    assert binner.features['score'].std == pytest.approx(1.0)
+    assert binner.transform(X) == [
+        [{'word': 'main', 'length': 5, 'score': 2}, {'word': 'st', 'length': 2}],
+        [{'word': '156th', 'length': 7, 'score': 6}]]
+
+    monkeypatch.setattr(crf, 'MIN_SHARD_SIZE', 1)
+    assert binner.transform(X, num_workers=2) == binner.transform(X)
+
+
 def test_lstm_er_model(kwik_e_mart_nlp):
     config = {
         'model_type': 'tagger',
@@ -247,3 +384,127 @@ def test_lstm_er_model(kwik_e_mart_nlp):
     er.fit(**config)
     response = kwik_e_mart_nlp.process('Does the 156th location open on Saturday?')
     assert response['entities'][0]['value'][0]['cname'] == '156th Street'
+
+
+@pytest.mark.parametrize('micro_batch_size', [1, 64])
+def test_lstm_er_model_micro_batching(kwik_e_mart_nlp, micro_batch_size):
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'lstm',
+            'tag_scheme': 'IOB',
+            'feature_scaler': 'max-abs'
+        },
+        'params': {'number_of_epochs': 3, 'token_embedding_dimension': 50,
+                   'gaz_encoding_dimension': 50, 'token_lstm_hidden_state_dimension': 200,
+                   'use_micro_batching': True, 'micro_batch_size': micro_batch_size},
+        'features': {
+            'bag-of-words-seq': {
+                'ngram_lengths_to_start_positions': {
+                    1: [0],
+                }
+            },
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(
+            kwik_e_mart_nlp.process, ['Does the 156th location open on Saturday?'] * 4))
+    for response in responses:
+        assert response['entities'][0]['value'][0]['cname'] == '156th Street'
+
+
+def test_lstm_length_buckets():
+    model = lstm.LstmModel(padding_length=20, number_of_length_buckets=4)
+    sequence_lengths = [3, 4, 5, 3, 2, 8, 12, 20, 7, 6, 3, 4, 20]
+    model.length_buckets = model._compute_length_buckets(sequence_lengths)
+    assert model.length_buckets == [3, 5, 8, 20]
+
+    batches = model._get_batches(sequence_lengths, batch_size=2, shuffle=True)
+    assert sorted(index for indices, _ in batches for index in indices) == \
+        list(range(len(sequence_lengths)))
+    for indices, time_length in batches:
+        assert len(indices) <= 2
+        assert all(sequence_lengths[index] <= time_length for index in indices)
+        assert not any(sequence_lengths[index] <= smaller for index in indices
+                       for smaller in model.length_buckets if smaller < time_length)
+
+    mask = model._generate_boolean_mask([1, 3], 4)
+    assert mask == [True, False, False, False, True, True, True, False]
+
+
+def test_lstm_sparse_gaz_features(monkeypatch):
+    model = lstm.LstmModel(padding_length=4)
+    model.gaz_encoder = LabelBinarizer().fit(['O', 'city', 'store_name'])
+    model.gaz_dimension = 3
+    model._gaz_label_encodings = {}
+    model.example_type = model.features = model.resources = None
+
+    # the examples stand in for their extracted sequence features
+    monkeypatch.setattr(lstm, 'extract_sequence_features', lambda example, *args: example)
+    examples = [
+        [{'in-gaz|type:store_name|pos:start|p_fe': 1}, {}],
+        [{'in-gaz|type:store_name|pos:end|p_fe': 1, 'in-gaz|type:city|pos:start|p_fe': 1}]
+    ]
+    gaz_features = model._get_gaz_features(examples)
+    assert gaz_features.shape == (2, 12)
+    assert gaz_features.nnz == 9
+
+    dense = model._densify_gaz_features(gaz_features, np.array([1, 0]), 2)
+    assert dense.tolist() == [[[0, 1, 1], [1, 0, 0]],
+                              [[0, 0, 1], [1, 0, 0]]]
+
+
+def test_lstm_micro_batcher():
+    batch_sizes = []
+
+    def run_batch(items):
+        batch_sizes.append(len(items))
+        return [item * 10 for item in items]
+
+    batcher = lstm._MicroBatcher(run_batch, max_batch_size=100, max_wait=0.5)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda start: batcher.submit([start, start + 1]),
+                                    range(4)))
+
+    assert results == [[0, 10], [10, 20], [20, 30], [30, 40]]
+    assert sum(batch_sizes) == 8
+    assert len(batch_sizes) < 4
+
+
+def test_lstm_inference_graph(kwik_e_mart_nlp, tmpdir):
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'lstm',
+            'tag_scheme': 'IOB',
+            'feature_scaler': 'max-abs'
+        },
+        'params': {'number_of_epochs': 1, 'token_embedding_dimension': 50,
+                   'gaz_encoding_dimension': 50, 'token_lstm_hidden_state_dimension': 50,
+                   'intra_op_parallelism_threads': 1, 'inter_op_parallelism_threads': 1},
+        'features': {
+            'bag-of-words-seq': {
+                'ngram_lengths_to_start_positions': {
+                    1: [0],
+                }
+            },
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    query = 'Does the 156th location open on Saturday?'
+    expected = er.predict_proba(query)
+
+    model_path = str(tmpdir.join('lstm.pkl'))
+    er.dump(model_path)
+    assert os.path.isfile(str(tmpdir.join('lstm_model_files', lstm.INFERENCE_GRAPH_FILE_NAME)))
+
+    er.load(model_path)
+    clf = er._model._clf
+    assert clf.dense_keep_prob_tf is None
+    assert clf.label_tf is None
+    actual = er.predict_proba(query)
+    assert [entity for entity, _ in actual] == [entity for entity, _ in expected]
+    assert [proba for _, proba in actual] == pytest.approx([proba for _, proba in expected])
@@ -12,12 +12,13 @@ import os
 
 import pytest
 
-from mindmeld import markup
+from mindmeld import markup, serialization
 from mindmeld.models import ModelConfig, CLASS_LABEL_TYPE, QUERY_EXAMPLE_TYPE
 from mindmeld.models.text_models import TextModel
 from mindmeld.tokenizer import Tokenizer
 from mindmeld.query_factory import QueryFactory
 from mindmeld.resource_loader import ResourceLoader
+from mindmeld.serialization import FrozenStringMap
 
 APP_NAME = 'kwik_e_mart'
 APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), APP_NAME)
@@ -201,3 +202,131 @@ class TestTextModel:
                              'bag_of_words|length:1|ngram:there': 1}
         extracted_features = model.view_extracted_features(markup.load_query('hi there').query)
         assert extracted_features == expected_features
+
+    def test_fit_warm_start(self, resource_loader):
+        """Tests that a model can be warm started from a previously trained model"""
+        config = ModelConfig(**{
+            'model_type': 'text',
+            'example_type': QUERY_EXAMPLE_TYPE,
+            'label_type': CLASS_LABEL_TYPE,
+            'model_settings': {
+                'classifier_type': 'logreg'
+            },
+            'params': {
+                'fit_intercept': True,
+                'C': 100
+            },
+            'features': {
+                'bag-of-words': {
+                    'lengths': [1]
+                },
+                'length': {}
+            }
+        })
+        examples = [q.query for q in self.labeled_data]
+        labels = [q.intent for q in self.labeled_data]
+        previous_model = TextModel(config)
+        previous_model.initialize_resources(resource_loader, examples, labels)
+        previous_model.fit(examples, labels)
+
+        new_examples = examples + [markup.load_query('howdy').query,
+                                   markup.load_query('farewell').query]
+        new_labels = labels + ['greet', 'exit']
+        model = TextModel(config)
+        model.initialize_resources(resource_loader, new_examples, new_labels)
+        model.fit_warm_start(new_examples, new_labels, previous_model)
+
+        assert model.warm_started_
+        assert model._current_params == {'fit_intercept': True, 'C': 100}
+        previous_vocab = previous_model._feat_vectorizer.vocabulary_
+        vocab = model._feat_vectorizer.vocabulary_
+        assert all(vocab[name] == idx for name, idx in previous_vocab.items())
+        assert 'bag_of_words|length:1|ngram:howdy' in vocab
+        assert model.predict([markup.load_query('hi').query]) == 'greet'
+        assert model.predict([markup.load_query('bye').query]) == 'exit'
+
+    def test_fit_compacts_selected_features(self, resource_loader, monkeypatch):
+        """Tests that feature selection and scaling are folded into the fitted model"""
+        config = ModelConfig(**{
+            'model_type': 'text',
+            'example_type': QUERY_EXAMPLE_TYPE,
+            'label_type': CLASS_LABEL_TYPE,
+            'model_settings': {
+                'classifier_type': 'logreg',
+                'feature_selector': 'l1',
+                'feature_scaler': 'max-abs'
+            },
+            'params': {
+                'fit_intercept': True,
+                'C': 100
+            },
+            'features': {
+                'bag-of-words': {
+                    'lengths': [1, 2]
+                },
+                'length': {}
+            }
+        })
+        examples = [q.query for q in self.labeled_data]
+        labels = [q.intent for q in self.labeled_data]
+        model = TextModel(config)
+        model.initialize_resources(resource_loader, examples, labels)
+        monkeypatch.setattr(model, '_compact', lambda: None)
+        model.fit(examples, labels)
+        monkeypatch.undo()
+
+        test_queries = [markup.load_query(text).query
+                        for text in ['hi', 'bye', 'hey there', 'see you later']]
+        expected = model.predict_proba(test_queries)
+        num_features = len(model._feat_vectorizer.feature_names_)
+        model._compact()
+
+        assert model._feat_selector is None
+        assert model._feat_scaler is None
+        assert len(model._feat_vectorizer.feature_names_) < num_features
+        assert len(model._feat_vectorizer.vocabulary_) == model._clf.coef_.shape[1]
+        for (label, probas), (expected_label, expected_probas) in zip(
+                model.predict_proba(test_queries), expected):
+            assert label == expected_label
+            for name, proba in expected_probas.items():
+                assert probas[name] == pytest.approx(proba)
+
+    def test_dump_load_uses_frozen_vocabulary(self, resource_loader, tmpdir):
+        """Tests that a loaded model looks its features up in the memory-mapped vocabulary"""
+        config = ModelConfig(**{
+            'model_type': 'text',
+            'example_type': QUERY_EXAMPLE_TYPE,
+            'label_type': CLASS_LABEL_TYPE,
+            'model_settings': {
+                'classifier_type': 'logreg'
+            },
+            'params': {
+                'fit_intercept': True,
+                'C': 100
+            },
+            'features': {
+                'bag-of-words': {
+                    'lengths': [1, 2]
+                },
+                'length': {}
+            }
+        })
+        model = TextModel(config)
+        examples = [q.query for q in self.labeled_data]
+        labels = [q.intent for q in self.labeled_data]
+        model.initialize_resources(resource_loader, examples, labels)
+        model.fit(examples, labels)
+
+        test_queries = [markup.load_query(text).query
+                        for text in ['hi', 'bye', 'hey there', 'see you later']]
+        X, _, _ = model.get_feature_matrix(test_queries)
+
+        path = os.path.join(str(tmpdir), 'model.pkl')
+        serialization.dump(model, path)
+        loaded = serialization.load(path)
+        loaded.register_resources(**model._resources)
+
+        assert isinstance(loaded._feat_vectorizer.vocabulary_, FrozenStringMap)
+        loaded_X, _, _ = loaded.get_feature_matrix(test_queries)
+        assert (loaded_X != X).nnz == 0
+        assert loaded.predict(test_queries) == model.predict(test_queries)
@@ -10,7 +10,7 @@ Tests the generated query cache has to correct key value types.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
 import os
-from sklearn.externals import joblib
+from mindmeld import serialization
 from mindmeld.core import ProcessedQuery
 
 
@@ -19,7 +19,7 @@ QUERY_CACHE_RELATIVE_PATH = '.generated/query_cache.pkl'
 
 def test_query_cache_has_the_correct_format(kwik_e_mart_app_path):
     query_cache_location = os.path.join(kwik_e_mart_app_path, QUERY_CACHE_RELATIVE_PATH)
-    versioned_data = joblib.load(query_cache_location)
+    versioned_data = serialization.load(query_cache_location)
     if 'cached_queries' in versioned_data:
         query_cache = versioned_data['cached_queries']
     else:
@@ -74,3 +74,25 @@ def test_immutability_of_request_and_params():
     with pytest.raises(TypeError):
         request = Request()
         request.frame['a'] = 'b'
+
+
+def test_nlp_params():
+    """Test that the pipeline depth params are validated"""
+    params = FrozenParams(stop_at='intent', confidence_threshold=0.5)
+    nlp_params = params.nlp_params()
+    assert nlp_params['stop_at'] == 'intent'
+    assert nlp_params['confidence_threshold'] == 0.5
+
+    params = FrozenParams(stop_at='roles', confidence_threshold='high')
+    nlp_params = params.nlp_params()
+    assert nlp_params['stop_at'] is None
+    assert nlp_params['confidence_threshold'] is None
+
+
+@pytest.mark.parametrize('threshold,expected', [
+    (0, 0), (0.5, 0.5), (1, 1), (True, None), (False, None), (-0.1, None), (1.5, None)
+])
+def test_nlp_params_confidence_threshold(threshold, expected):
+    """Test that the confidence threshold must be a number between 0 and 1"""
+    params = FrozenParams(confidence_threshold=threshold)
+    assert params.nlp_params()['confidence_threshold'] == expected
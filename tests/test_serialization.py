@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_serialization
+----------------------------------
+
+Tests for the `serialization` module.
+"""
+# pylint: disable=locally-disabled,redefined-outer-name
+import os
+
+import numpy as np
+import pytest
+from sklearn.externals import joblib
+
+from mindmeld import serialization
+from mindmeld.exceptions import ArtifactLoadError
+from mindmeld.gazetteer import Gazetteer
+from mindmeld.serialization import FrozenStringMap, FrozenStringSetMap, StringArray
+
+
+def test_dump_load_memory_maps_arrays(tmpdir):
+    path = os.path.join(str(tmpdir), 'artifact.pkl')
+    serialization.dump({'coef': np.arange(10.0), 'name': 'model'}, path)
+
+    loaded = serialization.load(path)
+    assert loaded['name'] == 'model'
+    assert isinstance(loaded['coef'], np.memmap)
+    assert loaded['coef'].tolist() == list(np.arange(10.0))
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_load_legacy_pickle(tmpdir):
+    path = os.path.join(str(tmpdir), 'legacy.pkl')
+    joblib.dump({'roles': {'from', 'to'}}, path)
+    assert serialization.load(path) == {'roles': {'from', 'to'}}
+
+
+def test_load_newer_format_fails(tmpdir):
+    path = os.path.join(str(tmpdir), 'future.pkl')
+    joblib.dump({'mm_artifact_format': serialization.ARTIFACT_FORMAT_VERSION + 1,
+                 'payload': None}, path)
+    with pytest.raises(ArtifactLoadError):
+        serialization.load(path)
+
+
+def test_frozen_string_map():
+    frozen = FrozenStringMap({'pizza': 3, 'café': 1}, default_factory=int)
+    assert frozen['café'] == 1
+    assert frozen['pasta'] == 0
+    assert 'pasta' not in frozen
+    assert frozen.get('pasta', 5) == 5
+    assert dict(frozen) == {'pizza': 3, 'café': 1}
+    assert frozen.copy() == {'pizza': 3, 'café': 1}
+
+
+def test_frozen_string_map_many_keys():
+    mapping = {'key {}'.format(i): i for i in range(1000)}
+    mapping['a' * 500] = -2
+    frozen = FrozenStringMap(mapping)
+    assert all(frozen[key] == value for key, value in mapping.items())
+    assert 'key 1000' not in frozen
+    assert 'a' * 499 not in frozen
+    assert frozen.lookup(['key 7', 'missing', 'a' * 500]).tolist() == [7, -1, -2]
+    # keys are stored in a byte buffer, so a long key does not widen the others
+    assert frozen._keys._buffer.nbytes == sum(len(key) for key in mapping)
+
+
+def test_frozen_string_set_map():
+    frozen = FrozenStringSetMap({'pizza': {3, 1}, 'pasta': {2}}, default_factory=set)
+    assert frozen['pizza'] == {1, 3}
+    assert len(frozen['salad']) == 0
+    copied = frozen.copy()
+    copied['pizza'].add(4)
+    assert frozen['pizza'] == {1, 3}
+    assert copied['salad'] == set()
+
+
+def test_string_array():
+    strings = StringArray(['pizza', 'café', ''])
+    assert list(strings) == ['pizza', 'café', '']
+    assert strings[-2] == 'café'
+    assert strings.copy() == ['pizza', 'café', '']
+
+
+def test_gazetteer_round_trip(tmpdir):
+    gaz = Gazetteer('dish')
+    gaz._update_entity('pad thai', 0.8)
+    gaz._update_entity('pho', 0.5)
+    path = os.path.join(str(tmpdir), 'dish.pkl')
+    gaz.dump(path)
+
+    loaded = Gazetteer('dish')
+    loaded.load(path)
+    # the loaded structures are looked up in place
+    assert isinstance(loaded.pop_dict, FrozenStringMap)
+    assert isinstance(loaded.index, FrozenStringSetMap)
+    assert isinstance(loaded.entities, StringArray)
+    assert loaded.entity_count == 2
+    assert loaded.pop_dict['pad thai'] == 0.8
+    assert loaded.pop_dict['pizza'] == 0
+    assert loaded.index['pho'] == {1}
+    assert list(loaded.entities) == ['pad thai', 'pho']
+
+    merged = Gazetteer('dish')
+    merged.from_dict(loaded.to_dict())
+    assert isinstance(merged.pop_dict, dict)
+    merged._update_entity('pho', 0.9)
+    assert merged.pop_dict['pho'] == 0.9
+    assert loaded.pop_dict['pho'] == 0.5
@@ -31,6 +31,21 @@ def test_parse_endpoint(client):
         'request_id', 'response_time', 'request', 'directives', 'slots'}
 
 
+def test_parse_endpoint_stop_at(client):
+    test_request = {
+        'text': 'where is the restaurant on 12th ave',
+        'params': {'stop_at': 'intent'}
+    }
+    response = client.post('/parse', data=json.dumps(test_request),
+                           content_type='application/json',
+                           follow_redirects=True)
+    assert response.status == '200 OK'
+    request = json.loads(response.data.decode('utf8'))['request']
+    assert request['domain'] == 'store_info'
+    assert request['intent']
+    assert request['entities'] == []
+
+
 def test_parse_endpoint_fail(client):
     response = client.post('/parse')
     assert response.status == '415 UNSUPPORTED MEDIA TYPE'